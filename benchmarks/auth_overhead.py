@@ -0,0 +1,60 @@
+"""
+Аутентифицированные GET /api/users/profile/: JWTAuthentication против StatelessJWTAuthentication.
+
+    python -m benchmarks.auth_overhead --requests 2000
+"""
+import argparse
+import time
+
+from . import common
+
+AUTH_CLASSES = {
+    'jwt': 'rest_framework_simplejwt.authentication.JWTAuthentication',
+    'stateless': 'users.authentication.StatelessJWTAuthentication',
+}
+
+
+def run(auth_class, requests):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from users.models import User
+    from users.tokens import UserRefreshToken
+
+    user = User.objects.filter(email='bench@example.com').first() or User.objects.create_user(
+        email='bench@example.com', name='Bench', password='BenchPassword123'
+    )
+    token = UserRefreshToken.for_user(user).access_token
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+    url = reverse('profile-detail')
+
+    latencies = []
+    with common.no_throttling(), common.authentication(auth_class):
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content
+    stats = common.summary(latencies)
+    stats['queries_per_request'] = len(queries) / requests
+    stats['requests_per_sec'] = requests / sum(latencies)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    common.setup()
+    for name, auth_class in AUTH_CLASSES.items():
+        stats = run(auth_class, args.requests)
+        common.print_summary(f'profile GET ({name})', stats)
+        print(f"{'':<28} queries/request={stats['queries_per_request']:.1f} rps={stats['requests_per_sec']:.0f}")
+
+
+if __name__ == '__main__':
+    main()
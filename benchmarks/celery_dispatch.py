@@ -0,0 +1,94 @@
+"""
+Стоимость отправки задачи в разных CELERY_MODE: сколько занимает delay() в вызывающем
+потоке и, где результат доступен в процессе, пропускная способность на пачке задач
+и полный круг одной задачи до result.get().
+
+    python -m benchmarks.celery_dispatch --repeat 2000
+    python -m benchmarks.celery_dispatch --mode broker --output celery_dispatch.json
+
+broker отправляет в настоящий CELERY_BROKER_URL (нужен запущенный redis), круг не меряется:
+воркер в другом процессе. Каждый режим - отдельный процесс, настройки celery читаются при импорте.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from . import common
+
+MODES = ['memory', 'thread', 'eager', 'broker']
+ROUND_TRIP = {'thread', 'eager'}
+
+
+def probe(mode, repeat):
+    # Выполняется в дочернем процессе с CELERY_MODE=mode
+    import django
+    django.setup()
+    from benchmarks.tasks import ping
+
+    # первый вызов: соединение с брокером, для thread - запуск воркера
+    started = time.perf_counter()
+    ping.delay()
+    result = {'first_ms': (time.perf_counter() - started) * 1000}
+
+    latencies = []
+    burst_started = time.perf_counter()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        last = ping.delay()
+        latencies.append(time.perf_counter() - started)
+    result['delay'] = common.summary(latencies)
+
+    if mode in ROUND_TRIP:
+        # пачка целиком, пока воркер ее разбирает
+        last.get(timeout=600, interval=0.01)
+        result['tasks_per_sec'] = repeat / (time.perf_counter() - burst_started)
+        latencies = []
+        for _ in range(min(repeat, 200)):
+            started = time.perf_counter()
+            assert ping.delay().get(timeout=10, interval=0.001) == 'pong'
+            latencies.append(time.perf_counter() - started)
+        result['round_trip'] = common.summary(latencies)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', nargs='+', choices=MODES, default=MODES[:3])
+    parser.add_argument('--repeat', type=int, default=2000, help="Отправок на режим")
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    parser.add_argument('--probe', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.probe, args.repeat)))
+        return
+
+    results = {}
+    for mode in args.mode:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.celery_dispatch', '--probe', mode, '--repeat', str(args.repeat)],
+            env=dict(os.environ, CELERY_MODE=mode), capture_output=True, text=True, check=True,
+        ).stdout
+        stats = results[mode] = json.loads(output.splitlines()[-1])
+        line = (
+            f"{mode:<7} first {stats['first_ms']:7.2f} ms | delay() mean {stats['delay']['mean_ms'] * 1000:7.1f} us, "
+            f"p99 {stats['delay']['p99_ms'] * 1000:7.1f} us"
+        )
+        if 'round_trip' in stats:
+            line += (
+                f" | {stats['tasks_per_sec']:6.0f} tasks/s | round trip p50 {stats['round_trip']['p50_ms']:6.2f} ms,"
+                f" p99 {stats['round_trip']['p99_ms']:6.2f} ms"
+            )
+        print(line)
+
+    if args.output:
+        import django
+        django.setup()
+        common.write_results(args.output, 'celery_dispatch', results, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Общая обвязка для бенчмарков: поднимает django на отдельной тестовой БД
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_auth.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('DSN', '')
+
+import django
+
+
+def setup(test_db_name=None, db_options=None):
+    django.setup()
+    from django.db import connection
+    from user_auth.celery import app
+
+    # для sqlite можно указать файл вместо общей БД в памяти, чтобы потоки конкурировали честно
+    if test_db_name:
+        connection.settings_dict['TEST']['NAME'] = test_db_name
+    if db_options is not None:
+        connection.settings_dict['OPTIONS'] = db_options
+    connection.creation.create_test_db(verbosity=0)
+    # задачи кладем в память, чтобы не зависеть от redis
+    app.conf.update(CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://')
+
+
+def no_throttling():
+    # DRF читает классы из настроек при импорте APIView, override_settings тут не поможет
+    from rest_framework.views import APIView
+    return mock.patch.object(APIView, 'throttle_classes', [])
+
+
+def authentication(auth_class):
+    from django.utils.module_loading import import_string
+    from rest_framework.views import APIView
+    return mock.patch.object(APIView, 'authentication_classes', [import_string(auth_class)])
+
+
+def fast_hasher():
+    return {'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher']}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summary(values):
+    return {
+        'count': len(values),
+        'mean_ms': statistics.fmean(values) * 1000,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+    }
+
+
+def print_summary(name, stats):
+    print(
+        f"{name:<28} n={stats['count']:<5} mean={stats['mean_ms']:8.2f}ms "
+        f"p50={stats['p50_ms']:8.2f}ms p99={stats['p99_ms']:8.2f}ms"
+    )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+def wait_for_app(port, workers, timeout=60):
+    # порт открывает мастер, а django воркеры загружают лениво - ждем ответов приложения
+    import http.client
+
+    deadline = time.monotonic() + timeout
+    answered = 0
+    while answered < workers * 2 and time.monotonic() < deadline:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        try:
+            conn.request('GET', '/api/users/profile/')
+            conn.getresponse().read()
+            answered += 1
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+        finally:
+            conn.close()
+
+
+@contextmanager
+def gunicorn(app_args, workers, env):
+    # локальный gunicorn подпроцессом; gunicorn.conf.py подхватывается из корня проекта
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', *app_args],
+        env=env,
+    )
+    try:
+        wait_for_port(port, process)
+        wait_for_app(port, workers)
+        yield port
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def environment():
+    # с чем сравнивать: результаты на разном железе или настройках несопоставимы
+    from django.conf import settings
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'db_vendor': connection.vendor,
+        'password_hash_iterations': settings.PASSWORD_HASH_ITERATIONS,
+    }
+
+
+def write_results(path, kind, results, **meta):
+    payload = {'kind': kind, 'meta': {**environment(), **meta}, 'results': results}
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(payload, fp, indent=2, sort_keys=True)
@@ -0,0 +1,79 @@
+"""
+Сравнение двух JSON-результатов suite или load: помечает регрессии сверх порога.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+    python -m benchmarks.compare baseline.json current.json --metric p99_ms
+
+Код выхода 1, если есть регрессии - удобно для CI.
+"""
+import argparse
+import json
+import sys
+
+# Для латентности хуже - больше, для пропускной способности - меньше
+LOWER_IS_BETTER = ('mean_ms', 'p50_ms', 'p99_ms')
+HIGHER_IS_BETTER = ('ops_per_sec',)
+# Эти поля должны совпадать, иначе сравнение бессмысленно
+COMPARABLE_META = ('kind', 'db_vendor', 'cpu_count', 'password_hash_iterations', 'users', 'workers')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def change(metric, before, after) -> float:
+    # > 0 - стало хуже, в процентах
+    if not before:
+        return 0.0
+    delta = (after - before) / before * 100
+    return delta if metric in LOWER_IS_BETTER else -delta
+
+
+def compare(baseline, current, metric, threshold):
+    regressions = []
+    rows = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        before = baseline['results'].get(name, {}).get(metric)
+        after = current['results'].get(name, {}).get(metric)
+        if before is None or after is None:
+            rows.append((name, before, after, None, 'missing'))
+            continue
+        worse = change(metric, before, after)
+        verdict = 'REGRESSION' if worse > threshold else ('improved' if worse < -threshold else 'ok')
+        if verdict == 'REGRESSION':
+            regressions.append(name)
+        rows.append((name, before, after, worse, verdict))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--metric', choices=LOWER_IS_BETTER + HIGHER_IS_BETTER, default='p50_ms')
+    parser.add_argument('--threshold', type=float, default=10.0, help="Допустимое ухудшение, %%")
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    for key in COMPARABLE_META:
+        before = baseline.get(key, baseline['meta'].get(key))
+        after = current.get(key, current['meta'].get(key))
+        if before != after:
+            print(f"warning: {key} differs ({before} vs {after}), results may not be comparable")
+
+    rows, regressions = compare(baseline, current, args.metric, args.threshold)
+    print(f"{'benchmark':<24} {'baseline':>12} {'current':>12} {'worse %':>9}")
+    for name, before, after, worse, verdict in rows:
+        before_text = f'{before:.2f}' if before is not None else '-'
+        after_text = f'{after:.2f}' if after is not None else '-'
+        worse_text = f'{worse:+.1f}' if worse is not None else '-'
+        print(f"{name:<24} {before_text:>12} {after_text:>12} {worse_text:>9}  {verdict}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold}% in {args.metric}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Параллельные регистрации против настроенной БД: пропускная способность и ошибки блокировок.
+
+    python -m benchmarks.concurrent_registrations --threads 8 --requests 50
+    python -m benchmarks.concurrent_registrations --legacy-sqlite   # sqlite без WAL и IMMEDIATE
+    DB_ENGINE=postgres POSTGRES_HOST=localhost python -m benchmarks.concurrent_registrations
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from . import common
+
+
+def register_many(thread_id, requests, results, lock):
+    from django.db import OperationalError, connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    url = reverse('register')
+    counts = Counter()
+    for i in range(requests):
+        data = {'email': f'thread{thread_id}-{i}@example.com', 'name': 'Bench', 'password': 'BenchPassword123'}
+        try:
+            response = client.post(url, data, content_type='application/json')
+            counts['ok' if response.status_code == 201 else f'http_{response.status_code}'] += 1
+        except OperationalError as exc:
+            counts['lock_errors' if 'locked' in str(exc) else 'db_errors'] += 1
+    connection.close()
+    with lock:
+        results.update(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help="Регистраций на поток")
+    parser.add_argument('--legacy-sqlite', action='store_true', help="Старые настройки sqlite: без WAL, DEFERRED")
+    args = parser.parse_args()
+
+    test_db = None
+    if os.environ.get('DB_ENGINE', 'sqlite') == 'sqlite':
+        test_db = os.path.join(tempfile.mkdtemp(), 'concurrency.sqlite3')
+    common.setup(test_db_name=test_db, db_options={} if args.legacy_sqlite else None)
+
+    from django.db import connection
+    from django.test import override_settings
+
+    results, lock = Counter(), threading.Lock()
+    threads = [
+        threading.Thread(target=register_many, args=(n, args.requests, results, lock))
+        for n in range(args.threads)
+    ]
+    with common.no_throttling(), override_settings(**common.fast_hasher()):
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    total = args.threads * args.requests
+    print(f"{connection.vendor}: {total} registrations in {elapsed:.2f}s ({results['ok'] / elapsed:.0f} ok/s)")
+    for outcome, count in sorted(results.items()):
+        print(f"  {outcome}: {count}")
+
+
+if __name__ == '__main__':
+    main()
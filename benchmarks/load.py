@@ -0,0 +1,165 @@
+"""
+Сценарная нагрузка на локальный gunicorn, в духе locust: виртуальные пользователи
+регистрируются, входят и дальше ходят по профилю в заданной пропорции.
+
+    python -m benchmarks.load --users 16 --duration 30 --output load.json
+    DB_ENGINE=postgres POSTGRES_HOST=localhost python -m benchmarks.load   # отдельная БД для нагрузки!
+
+По умолчанию сервер работает на временной sqlite-БД. Случайность фиксирована --seed.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from . import common
+
+PASSWORD = 'LoadPassword123'
+NEW_PASSWORD = 'LoadPassword456'
+
+# Доли действий после входа - типичный мобильный клиент в основном опрашивает профиль
+PROFILE = {
+    'profile_get': 70,
+    'profile_update': 20,
+    'login': 5,
+    'change_password': 5,
+}
+
+
+class VirtualUser:
+    def __init__(self, port, number, rng, record):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.email = f'load-{number}@example.com'
+        self.password = PASSWORD
+        self.rng = rng
+        self.record = record
+        self.access = None
+
+    def request(self, name, method, path, payload=None, expected=200):
+        headers = {'Content-Type': 'application/json'}
+        if self.access:
+            headers['Authorization'] = f'Bearer {self.access}'
+        body = json.dumps(payload) if payload is not None else None
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.record(name, time.perf_counter() - started, ok=False)
+            return None
+        ok = response.status == expected
+        self.record(name, time.perf_counter() - started, ok=ok)
+        return json.loads(data) if ok and data else None
+
+    def register(self):
+        self.request('register', 'POST', '/api/users/register/', {
+            'email': self.email, 'name': 'Load', 'password': self.password,
+        }, expected=201)
+
+    def login(self):
+        self.access = None
+        tokens = self.request('login', 'POST', '/api/users/login/', {
+            'email': self.email, 'password': self.password,
+        })
+        if tokens:
+            self.access = tokens['access']
+
+    def profile_get(self):
+        self.request('profile_get', 'GET', '/api/users/profile/')
+
+    def profile_update(self):
+        self.request('profile_update', 'PATCH', '/api/users/profile/update/', {
+            'bio': f'bio {self.rng.random()}',
+        })
+
+    def change_password(self):
+        new_password = NEW_PASSWORD if self.password == PASSWORD else PASSWORD
+        if self.request('change_password', 'PUT', '/api/users/profile/change-password/', {
+            'old_password': self.password, 'new_password': new_password,
+        }) is not None:
+            self.password = new_password
+        # старый токен после смены пароля не действует
+        self.login()
+
+    def run(self, deadline):
+        self.register()
+        self.login()
+        actions, weights = zip(*PROFILE.items())
+        while time.monotonic() < deadline:
+            getattr(self, self.rng.choices(actions, weights)[0])()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=16, help="Виртуальных пользователей (потоков)")
+    parser.add_argument('--duration', type=float, default=30, help="Секунд нагрузки")
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=10000, help="PASSWORD_HASH_ITERATIONS")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        PASSWORD_HASH_ITERATIONS=str(args.iterations),
+        THROTTLE_ANON_RATE='1000000/minute',
+        THROTTLE_USER_RATE='1000000/minute',
+        # без redis: письма остаются в outbox, задачи никуда не уходят
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+    )
+    if env.get('DB_ENGINE', 'sqlite') == 'sqlite':
+        env['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'load.sqlite3')
+    os.environ.update(env)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+    latencies, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+
+    def record(name, seconds, ok):
+        with lock:
+            latencies[name].append(seconds)
+            if not ok:
+                errors[name] += 1
+
+    with common.gunicorn(['user_auth.wsgi:application'], args.workers, env) as port:
+        deadline = time.monotonic() + args.duration
+        users = [VirtualUser(port, n, random.Random(args.seed + n), record) for n in range(args.users)]
+        threads = [threading.Thread(target=user.run, args=(deadline,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in sorted(latencies):
+        stats = common.summary(latencies[name])
+        stats['ops_per_sec'] = len(latencies[name]) / elapsed
+        stats['errors'] = errors[name]
+        results[name] = stats
+        common.print_summary(name, stats)
+        print(f"{'':<28} {stats['ops_per_sec']:.1f} req/s, {errors[name]} errors")
+
+    if args.output:
+        common.write_results(
+            args.output, 'load', results,
+            users=args.users, duration=args.duration, workers=args.workers, seed=args.seed,
+        )
+
+
+if __name__ == '__main__':
+    main()
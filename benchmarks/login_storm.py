@@ -0,0 +1,148 @@
+"""
+Чтение профиля во время шторма логинов: хеширование в потоке запроса против пула
+хеширования с допуском (users/hashing.py).
+
+    python -m benchmarks.login_storm --workers 4 --storm 16 --duration 10
+    python -m benchmarks.login_storm --iterations 870000 --output login_storm.json
+
+Режимы:
+    inline - хеш считается в воркере gunicorn, ограничений нет (как было раньше)
+    pool   - процессы пула с PASSWORD_HASH_NICE, лишние логины сразу получают 503
+
+Профиль читается подряд в одном соединении --duration секунд без нагрузки, затем столько же
+под штормом из --storm потоков, которые шлют логины без пауз (после 503 ждут Retry-After,
+если не задан --no-retry-after). Сервер - gunicorn на временной sqlite-БД.
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from . import common
+
+EMAIL = 'storm@example.com'
+PASSWORD = 'StormPassword123'
+MODES = {
+    'inline': {'PASSWORD_HASH_POOL': 'inline', 'PASSWORD_HASH_MAX_PENDING': '1000000'},
+    'pool': {'PASSWORD_HASH_POOL': 'process'},
+}
+
+
+def read_profiles(port, token, duration):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        conn.request('GET', '/api/users/profile/', headers={'Authorization': f'Bearer {token}'})
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200, response.status
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    return latencies
+
+
+def storm(port, stop, statuses, latencies, lock, retry):
+    body = json.dumps({'email': EMAIL, 'password': PASSWORD})
+    local_statuses, local_latencies = Counter(), []
+    while not stop.is_set():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        started = time.perf_counter()
+        try:
+            conn.request('POST', '/api/users/login/', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            local_statuses[response.status] += 1
+            if response.status == 200:
+                local_latencies.append(time.perf_counter() - started)
+            elif response.status == 503 and retry:
+                # клиент, который соблюдает Retry-After
+                stop.wait(int(response.getheader('Retry-After', '1')))
+        except (OSError, http.client.HTTPException):
+            local_statuses['error'] += 1
+        finally:
+            conn.close()
+    with lock:
+        statuses.update(local_statuses)
+        latencies.extend(local_latencies)
+
+
+def run(mode, args, env, token):
+    env = dict(env, **MODES[mode], PASSWORD_HASH_SLOTS_DIR=tempfile.mkdtemp())
+    with common.gunicorn(['user_auth.wsgi:application'], args.workers, env) as port:
+        read_profiles(port, token, 1)
+        result = {'idle': common.summary(read_profiles(port, token, args.duration))}
+
+        stop, lock = threading.Event(), threading.Lock()
+        statuses, login_latencies = Counter(), []
+        threads = [
+            threading.Thread(target=storm, args=(port, stop, statuses, login_latencies, lock, args.retry))
+            for _ in range(args.storm)
+        ]
+        for thread in threads:
+            thread.start()
+        # шторм должен успеть занять воркеры
+        time.sleep(1)
+        result['storm'] = common.summary(read_profiles(port, token, args.duration))
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    result['logins'] = {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    result['logins_ok_per_sec'] = len(login_latencies) / (args.duration + 1)
+    if login_latencies:
+        result['login_ok'] = common.summary(login_latencies)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--storm', type=int, default=16, help="Потоков, шлющих логины")
+    parser.add_argument('--duration', type=float, default=10, help="Секунд на замер")
+    parser.add_argument('--no-retry-after', dest='retry', action='store_false',
+                        help="Клиенты шторма повторяют вход сразу, не дожидаясь Retry-After")
+    parser.add_argument('--iterations', type=int, default=300000, help="PASSWORD_HASH_ITERATIONS")
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        SQLITE_PATH=os.path.join(tempfile.mkdtemp(), 'login_storm.sqlite3'),
+        PASSWORD_HASH_ITERATIONS=str(args.iterations),
+        THROTTLE_ANON_RATE='1000000/minute',
+        THROTTLE_USER_RATE='1000000/minute',
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+    )
+    os.environ.update(env)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from users.models import User
+    from users.tokens import UserRefreshToken
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(email=EMAIL, name='Storm', password=PASSWORD)
+    token = str(UserRefreshToken.for_user(user).access_token)
+
+    results = {}
+    for mode in args.mode:
+        stats = results[mode] = run(mode, args, env, token)
+        common.print_summary(f'{mode} profile idle', stats['idle'])
+        common.print_summary(f'{mode} profile storm', stats['storm'])
+        print(f"{'':<28} logins {stats['logins']}, {stats['logins_ok_per_sec']:.1f} ok/s")
+
+    if args.output:
+        common.write_results(args.output, 'login_storm', results, workers=args.workers, storm=args.storm)
+
+
+if __name__ == '__main__':
+    main()
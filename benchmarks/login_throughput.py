@@ -0,0 +1,51 @@
+"""
+Логины в секунду на одно ядро при разной стоимости PBKDF2, отдельно для
+существующего email и промаха (время должно совпадать).
+
+    python -m benchmarks.login_throughput --requests 20 --iterations 100000 300000 870000
+"""
+import argparse
+import time
+
+from . import common
+
+
+def run(iterations, requests):
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from users.models import User
+
+    client = Client()
+    url = reverse('login')
+    email = f'bench-{iterations}@example.com'
+    results = {}
+    with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+        User.objects.create_user(email=email, name='Bench', password='BenchPassword123')
+        for case, login in (('hit', email), ('miss', f'missing-{iterations}@example.com')):
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.post(url, {'email': login, 'password': 'BenchPassword123'}, content_type='application/json')
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == (200 if case == 'hit' else 400), response.content
+            results[case] = common.summary(latencies)
+            results[case]['logins_per_sec'] = requests / sum(latencies)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 300000, 870000])
+    args = parser.parse_args()
+
+    common.setup()
+    with common.no_throttling():
+        for iterations in args.iterations:
+            for case, stats in run(iterations, args.requests).items():
+                common.print_summary(f'login {case} ({iterations})', stats)
+                print(f"{'':<28} logins/sec/core={stats['logins_per_sec']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
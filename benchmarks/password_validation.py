@@ -0,0 +1,137 @@
+"""
+Проверка пароля по списку утечек: CommonPasswordValidator Django (gzip в set в каждом
+процессе) против BreachedPasswordValidator (индекс в mmap).
+
+    python -m benchmarks.password_validation
+    python -m benchmarks.password_validation --synthetic 100000000 --output password_validation.json
+
+Каждый вариант меряется в отдельном процессе: прирост RSS после первой проверки (anon -
+память только этого процесса, file - страницы индекса из page cache, общие для всех
+процессов) и среднее время одной проверки. synthetic - индекс из --synthetic случайных
+ключей вместо выгрузки утечек такого же размера.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import common
+
+CASES = ['django', 'index', 'synthetic']
+PASSWORDS = ['password', 'Qwerty123', 'TestPassword123', 'correct horse battery staple', 'Tr0ub4dor&3', 'letmein']
+
+
+def memory():
+    fields = {}
+    with open('/proc/self/status') as fp:
+        for line in fp:
+            key, _, value = line.partition(':')
+            if key in ('RssAnon', 'RssFile'):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+
+def probe(case, index_path, repeat):
+    # Выполняется в дочернем процессе
+    os.environ['PASSWORD_INDEX_PATH'] = index_path
+    import django
+    django.setup()
+    from django.contrib.auth.password_validation import CommonPasswordValidator, ValidationError
+    from users.password_validation import BreachedPasswordValidator
+
+    before = memory()
+    started = time.perf_counter()
+    validator = CommonPasswordValidator() if case == 'django' else BreachedPasswordValidator()
+    try:
+        validator.validate(PASSWORDS[0])
+    except ValidationError:
+        pass
+    first_ms = (time.perf_counter() - started) * 1000
+
+    rng = random.Random(1)
+    candidates = PASSWORDS + [f'{rng.getrandbits(64):x}' for _ in range(1000)]
+    latencies = []
+    for i in range(repeat):
+        password = candidates[i % len(candidates)]
+        started = time.perf_counter()
+        try:
+            validator.validate(password)
+        except ValidationError:
+            pass
+        latencies.append(time.perf_counter() - started)
+    after = memory()
+
+    stats = common.summary(latencies)
+    return {
+        'first_ms': first_ms,
+        'mean_us': stats['mean_ms'] * 1000,
+        'p99_us': stats['p99_ms'] * 1000,
+        'rss_anon_mb': after['RssAnon'] - before['RssAnon'],
+        'rss_file_mb': after['RssFile'] - before['RssFile'],
+    }
+
+
+def synthetic_keys(count, seed=1):
+    # Отсортированные случайные ключи без сортировки в памяти: равномерные шаги
+    rng = random.Random(seed)
+    step = 2 ** 64 // count
+    key = 0
+    for _ in range(count):
+        key += rng.randint(1, 2 * step - 1)
+        yield min(key, 2 ** 64 - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20000, help="Проверок на вариант")
+    parser.add_argument('--synthetic', type=int, default=10_000_000, help="Ключей в синтетическом индексе")
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    parser.add_argument('--probe', choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument('--index', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(args.probe, args.index, args.repeat)))
+        return
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from users.password_validation import write_index
+
+    directory = tempfile.mkdtemp()
+    indexes = {
+        'django': os.path.join(directory, 'missing.idx'),
+        'index': os.path.join(directory, 'common.idx'),
+        'synthetic': os.path.join(directory, 'synthetic.idx'),
+    }
+    call_command('build_password_index', output=indexes['index'], verbosity=0, stdout=open(os.devnull, 'w'))
+    started = time.perf_counter()
+    write_index(synthetic_keys(args.synthetic), indexes['synthetic'])
+    print(f"synthetic index: {args.synthetic} keys, {os.path.getsize(indexes['synthetic']) / 2 ** 20:.0f} MB, "
+          f"built in {time.perf_counter() - started:.1f}s")
+
+    results = {}
+    for case in CASES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.password_validation', '--probe', case,
+             '--index', indexes[case], '--repeat', str(args.repeat)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        stats = results[case] = json.loads(output)
+        print(
+            f"{case:<10} first {stats['first_ms']:7.2f} ms | mean {stats['mean_us']:6.2f} us, "
+            f"p99 {stats['p99_us']:6.2f} us | rss anon +{stats['rss_anon_mb']:5.2f} MB, "
+            f"file +{stats['rss_file_mb']:5.2f} MB"
+        )
+
+    if args.output:
+        common.write_results(args.output, 'password_validation', results, synthetic=args.synthetic)
+
+
+if __name__ == '__main__':
+    main()
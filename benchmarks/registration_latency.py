@@ -0,0 +1,113 @@
+"""
+Латентность POST /api/users/register/ при медленном SMTP.
+
+inline - старое поведение: письмо отправляется прямо в запросе.
+outbox - текущее: в запросе только строка в EmailOutbox.
+
+    python -m benchmarks.registration_latency --requests 200 --smtp-delay 0.2
+"""
+import argparse
+import socketserver
+import threading
+import time
+from unittest import mock
+
+from . import common
+
+
+class SlowSMTPHandler(socketserver.StreamRequestHandler):
+    delay = 0.2
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        time.sleep(self.delay)
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith((b'EHLO', b'HELO')):
+                self.reply('250 stub')
+            elif command == b'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                time.sleep(self.delay)
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+def start_smtp_stub(delay):
+    SlowSMTPHandler.delay = delay
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SlowSMTPHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(mode, requests):
+    from django.core.mail import send_mail
+    from django.test import Client
+    from django.urls import reverse
+    from users import tasks
+
+    def send_inline(user_email):
+        send_mail(tasks.REGISTRATION_SUBJECT, tasks.REGISTRATION_BODY, None, [user_email])
+
+    client = Client()
+    url = reverse('register')
+    latencies = []
+    patcher = mock.patch('users.serializers.queue_registration_email', send_inline)
+    if mode == 'inline':
+        patcher.start()
+    try:
+        for i in range(requests):
+            data = {'email': f'{mode}-{i}@example.com', 'name': 'Bench', 'password': 'BenchPassword123'}
+            started = time.perf_counter()
+            response = client.post(url, data, content_type='application/json')
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.content
+    finally:
+        if mode == 'inline':
+            patcher.stop()
+    return common.summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--smtp-delay', type=float, default=0.2)
+    args = parser.parse_args()
+
+    common.setup()
+    from django.test import override_settings
+
+    smtp = start_smtp_stub(args.smtp_delay)
+    overrides = dict(
+        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+        EMAIL_HOST='127.0.0.1',
+        EMAIL_PORT=smtp.server_address[1],
+        EMAIL_USE_TLS=False,
+        EMAIL_HOST_USER='',
+        EMAIL_HOST_PASSWORD='',
+        **common.fast_hasher(),
+    )
+    with common.no_throttling(), override_settings(**overrides):
+        for mode in ('inline', 'outbox'):
+            common.print_summary(f'register ({mode})', run(mode, args.requests))
+
+        from users.tasks import drain_email_outbox
+        started = time.perf_counter()
+        sent = drain_email_outbox(batch_size=args.requests * 2)
+        print(f'outbox drain: {sent} emails in {time.perf_counter() - started:.2f}s over one connection')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Накладные расходы Sentry на запрос при разных настройках сэмплирования.
+
+    python -m benchmarks.sentry_overhead --requests 500
+    SENTRY_ROUTE_RATES="/api/users/profile/=0.5" python -m benchmarks.sentry_overhead
+
+Запросы идут через настоящий WSGIHandler (его оборачивает интеграция Sentry),
+события уходят в транспорт-заглушку, который только считает их.
+"""
+import argparse
+import io
+import json
+import time
+from wsgiref.util import setup_testing_defaults
+
+from . import common
+
+FAKE_DSN = 'https://public@sentry.invalid/1'
+
+
+def make_environ(method, path, body=b'', headers=None):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }
+    environ.update(headers or {})
+    setup_testing_defaults(environ)
+    return environ
+
+
+def configure(mode, envelopes):
+    import sentry_sdk
+    from user_auth.sentry import NullTransport, SamplingPolicy, init_sentry
+
+    class CountingTransport(NullTransport):
+        def capture_envelope(self, envelope):
+            envelopes.append(envelope)
+
+    if mode == 'off':
+        sentry_sdk.init(dsn=None)
+    elif mode == 'policy':
+        init_sentry(FAKE_DSN, transport=CountingTransport)
+    else:
+        init_sentry(FAKE_DSN, SamplingPolicy(1.0, 1.0, {}), transport=CountingTransport)
+
+
+def run(app, mode, endpoint, requests, token):
+    import sentry_sdk
+
+    envelopes = []
+    configure(mode, envelopes)
+    if endpoint == 'login':
+        body = json.dumps({'email': 'bench@example.com', 'password': 'BenchPassword123'}).encode()
+        make = lambda: make_environ('POST', '/api/users/login/', body)
+    else:
+        make = lambda: make_environ('GET', '/api/users/profile/', headers={'HTTP_AUTHORIZATION': f'Bearer {token}'})
+
+    latencies = []
+    for _ in range(requests):
+        environ = make()
+        started = time.perf_counter()
+        statuses = []
+        result = app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(result)
+        result.close()
+        latencies.append(time.perf_counter() - started)
+        assert statuses[0].startswith('200'), statuses
+    sentry_sdk.flush()
+    stats = common.summary(latencies)
+    stats['envelopes'] = len(envelopes)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--endpoint', choices=['login', 'profile'], default='profile')
+    args = parser.parse_args()
+
+    common.setup()
+    from django.core.wsgi import get_wsgi_application
+    from django.test import override_settings
+    from users.models import User
+    from users.tokens import UserRefreshToken
+
+    app = get_wsgi_application()
+    with override_settings(**common.fast_hasher()):
+        user = User.objects.create_user(email='bench@example.com', name='Bench', password='BenchPassword123')
+    token = UserRefreshToken.for_user(user).access_token
+
+    with common.no_throttling(), override_settings(**common.fast_hasher()):
+        for mode in ('off', 'policy', 'full'):
+            run(app, mode, args.endpoint, 20, token)  # прогрев
+            stats = run(app, mode, args.endpoint, args.requests, token)
+            common.print_summary(f'{args.endpoint} sentry={mode}', stats)
+            print(f"{'':<28} envelopes sent={stats['envelopes']}")
+
+
+if __name__ == '__main__':
+    main()
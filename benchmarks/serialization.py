@@ -0,0 +1,102 @@
+"""
+Сериализация и рендер одного ответа: ModelSerializer против CompiledRepresentation,
+JSONRenderer DRF (stdlib json) против FastJSONRenderer (orjson), плюс разбор тела запроса.
+
+    python -m benchmarks.serialization --repeat 20000
+    python -m benchmarks.serialization --batch 500 --output serialization.json
+
+Объекты создаются в памяти, БД не нужна.
+"""
+import argparse
+import io
+import json
+import time
+from datetime import timedelta
+
+from . import common
+
+SERIALIZERS = ['drf', 'compiled']
+RENDERERS = ['json', 'orjson']
+
+
+def measure(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10000, help="Замеров на вариант")
+    parser.add_argument('--batch', type=int, default=100, help="Пользователей в ответе пакетного чтения")
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.utils import timezone
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from users.models import Profile, User
+    from users.parsers import FastJSONParser
+    from users.renderers import FastJSONRenderer
+    from users.serializers import ProfileSerializer, UserSerializer, represent_profile, represent_user
+
+    now = timezone.now()
+    users = [
+        User(pk=i, email=f'user{i}@example.com', name=f'User {i}', created_at=now - timedelta(days=i), updated_at=now)
+        for i in range(1, args.batch + 1)
+    ]
+    profiles = [
+        Profile(user_id=user.pk, bio='Hello, I am a developer! ' * 4, phone_number='+1234567890',
+                profile_picture='http://example.com/profile-pic.jpg', location='New York',
+                created_at=now, updated_at=now)
+        for user in users
+    ]
+
+    serialize = {
+        'drf': (lambda profile: dict(ProfileSerializer(profile).data), lambda user: UserSerializer(user).data),
+        'compiled': (represent_profile, represent_user),
+    }
+    render = {'json': JSONRenderer().render, 'orjson': FastJSONRenderer().render}
+
+    cases = {}
+    for serializer in SERIALIZERS:
+        profile_data, user_data = serialize[serializer]
+        for renderer in RENDERERS:
+            # GET профиля на промахе кеша: один профиль
+            cases[f'profile/{serializer}+{renderer}'] = (
+                lambda profile_data=profile_data, renderer=renderer: render[renderer](profile_data(profiles[0]))
+            )
+            # пакетное чтение: пользователь и профиль на каждый элемент
+            cases[f'batch{args.batch}/{serializer}+{renderer}'] = (
+                lambda profile_data=profile_data, user_data=user_data, renderer=renderer: render[renderer]({
+                    'results': [
+                        {'id': user.pk, **user_data(user), 'profile': profile_data(profile)}
+                        for user, profile in zip(users, profiles)
+                    ],
+                    'next_cursor': None,
+                })
+            )
+
+    body = json.dumps({'email': 'user@example.com', 'password': 'TestPassword123', 'name': 'User'}).encode()
+    for name, parser_class in (('json', JSONParser), ('orjson', FastJSONParser)):
+        cases[f'parse/{name}'] = lambda parser_class=parser_class: parser_class().parse(io.BytesIO(body))
+
+    results = {}
+    for name, func in cases.items():
+        measure(func, min(args.repeat, 1000))
+        stats = common.summary(measure(func, args.repeat if name.startswith(('profile', 'parse')) else args.repeat // 10))
+        stats['mean_us'] = stats['mean_ms'] * 1000
+        results[name] = stats
+        print(f"{name:<32} mean={stats['mean_us']:9.1f}us p50={stats['p50_ms'] * 1000:9.1f}us p99={stats['p99_ms'] * 1000:9.1f}us")
+
+    if args.output:
+        common.write_results(args.output, 'serialization', results, repeat=args.repeat, batch=args.batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Старт gunicorn и память воркеров с preload_app (и gc.freeze) и без него.
+
+    python -m benchmarks.startup --workers 4 --requests 400
+    python -m benchmarks.startup --role all --output startup.json
+
+Время до первого ответа - от запуска gunicorn до первого ответа приложения.
+Память - по /proc/<pid>/smaps_rollup каждого воркера после прогрева (только Linux):
+private - страницы только этого воркера, pss - с долей общих страниц.
+Профиль импорта отдельного процесса каждой роли - manage.py startup_profile.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import common
+
+MODES = {'no-preload': '0', 'preload': '1'}
+
+
+def smaps(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fp:
+        for line in fp:
+            key, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[key] = int(value.split()[0]) / 1024
+    return {
+        'rss_mb': fields['Rss'],
+        'pss_mb': fields['Pss'],
+        'private_mb': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def children(pid):
+    result = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as fp:
+                    # после "(имя)" идут состояние и ppid
+                    ppid = int(fp.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == pid:
+                result.append(int(entry))
+    return result
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        return conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def first_response(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            request(port, 'GET', '/api/users/profile/')
+            return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.01)
+    raise RuntimeError(f'server did not answer on port {port}')
+
+
+def run(mode, args, env):
+    port = common.free_port()
+    env = dict(env, GUNICORN_PRELOAD=MODES[mode])
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'user_auth.wsgi:application'],
+        env=env,
+    )
+    try:
+        first_response(port, process)
+        first_ms = (time.perf_counter() - started) * 1000
+        common.wait_for_app(port, args.workers)
+
+        # прогрев: анонимный 401 и неудачный вход (ORM, хешер), запросы расходятся по воркерам
+        login = json.dumps({'email': 'nobody@example.com', 'password': 'WrongPassword123'})
+        for i in range(args.requests):
+            if i % 2:
+                request(port, 'POST', '/api/users/login/', login)
+            else:
+                request(port, 'GET', '/api/users/profile/')
+        time.sleep(1)
+
+        workers = [smaps(pid) for pid in children(process.pid)]
+        result = {
+            'first_response_ms': first_ms,
+            'master': smaps(process.pid),
+            **{key: sum(worker[key] for worker in workers) / len(workers) for key in workers[0]},
+            'total_pss_mb': smaps(process.pid)['pss_mb'] + sum(worker['pss_mb'] for worker in workers),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--role', choices=['api', 'all'], default='api', help="APP_ROLE воркеров")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400, help="Запросов прогрева перед замером памяти")
+    parser.add_argument('--iterations', type=int, default=1000, help="PASSWORD_HASH_ITERATIONS")
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        APP_ROLE=args.role,
+        PASSWORD_HASH_ITERATIONS=str(args.iterations),
+        THROTTLE_ANON_RATE='1000000/minute',
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+        SQLITE_PATH=os.path.join(tempfile.mkdtemp(), 'startup.sqlite3'),
+    )
+    os.environ.update(env)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+
+    results = {}
+    for mode in MODES:
+        stats = results[mode] = run(mode, args, env)
+        print(
+            f"{mode:<12} first response {stats['first_response_ms']:7.0f} ms | per worker: "
+            f"rss {stats['rss_mb']:5.1f} MB, pss {stats['pss_mb']:5.1f} MB, private {stats['private_mb']:5.1f} MB"
+            f" | total pss {stats['total_pss_mb']:6.1f} MB"
+        )
+
+    if args.output:
+        common.write_results(args.output, 'startup', results, role=args.role, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Набор бенчмарков эндпоинтов и микробенчмарков в одном процессе, результат - JSON.
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --output current.json --only login profile_get
+    python -m benchmarks.compare baseline.json current.json
+
+Работает без сети: тестовая БД (sqlite в памяти или DB_ENGINE=postgres), celery в памяти.
+Стоимость хеширования фиксируется флагом --iterations и пишется в meta.
+"""
+import argparse
+import itertools
+import os
+import time
+
+from . import common
+
+PASSWORD = 'BenchPassword123'
+NEW_PASSWORD = 'BenchPassword456'
+
+
+def measure(func, repeat, prepare=None):
+    # prepare готовит аргументы вне замера (новый email, свежий токен и т.п.)
+    latencies = []
+    for i in range(repeat):
+        args = prepare(i) if prepare else ()
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def expect(response, status_code):
+    assert response.status_code == status_code, (response.status_code, response.content)
+
+
+class Benchmarks:
+    def __init__(self):
+        from django.test import Client
+        from users.models import User
+
+        self.client = Client()
+        self.counter = itertools.count()
+        self.user = User.objects.create_user(email='bench@example.com', name='Bench', password=PASSWORD)
+
+    def auth(self, user):
+        from users.tokens import UserRefreshToken
+        return {'HTTP_AUTHORIZATION': f'Bearer {UserRefreshToken.for_user(user).access_token}'}
+
+    # --- эндпоинты ---
+
+    def register(self, repeat):
+        def call(email):
+            expect(self.client.post('/api/users/register/', {
+                'email': email, 'name': 'Bench', 'password': PASSWORD,
+            }, content_type='application/json'), 201)
+        return measure(call, repeat, lambda i: (f'register-{next(self.counter)}@example.com',))
+
+    def login(self, repeat):
+        def call():
+            expect(self.client.post('/api/users/login/', {
+                'email': 'bench@example.com', 'password': PASSWORD,
+            }, content_type='application/json'), 200)
+        return measure(call, repeat)
+
+    def profile_get(self, repeat):
+        headers = self.auth(self.user)
+        return measure(lambda: expect(self.client.get('/api/users/profile/', **headers), 200), repeat)
+
+    def profile_update(self, repeat):
+        headers = self.auth(self.user)
+
+        def call(i):
+            expect(self.client.patch('/api/users/profile/update/', {'bio': f'bio {i}'},
+                                     content_type='application/json', **headers), 200)
+        return measure(call, repeat, lambda i: (i,))
+
+    def change_password(self, repeat):
+        # смена пароля отзывает токен, поэтому новый выдаем перед каждым замером
+        passwords = [(PASSWORD, NEW_PASSWORD), (NEW_PASSWORD, PASSWORD)]
+
+        def prepare(i):
+            self.user.refresh_from_db()
+            return self.auth(self.user), passwords[i % 2]
+
+        def call(headers, pair):
+            expect(self.client.put('/api/users/profile/change-password/', {
+                'old_password': pair[0], 'new_password': pair[1],
+            }, content_type='application/json', **headers), 200)
+        latencies = measure(call, repeat, prepare)
+        if repeat % 2:
+            self.user.set_password(PASSWORD)
+            self.user.save()
+        return latencies
+
+    # --- микробенчмарки ---
+
+    def register_serializer(self, repeat):
+        from users.serializers import RegisterSerializer
+
+        def call(email):
+            assert RegisterSerializer(data={'email': email, 'name': 'Bench', 'password': PASSWORD}).is_valid()
+        return measure(call, repeat, lambda i: (f'serializer-{i}@example.com',))
+
+    def profile_serializer(self, repeat):
+        from users.models import Profile
+        from users.serializers import ProfileSerializer
+
+        profile = Profile.objects.get(user=self.user)
+        return measure(lambda: ProfileSerializer(profile).data, repeat)
+
+    def check_password(self, repeat):
+        from django.contrib.auth.hashers import check_password
+
+        encoded = self.user.password
+        return measure(lambda: check_password(PASSWORD, encoded), repeat)
+
+    def make_password(self, repeat):
+        from django.contrib.auth.hashers import make_password
+        return measure(lambda: make_password(PASSWORD), repeat)
+
+
+ENDPOINTS = ['register', 'login', 'profile_get', 'profile_update', 'change_password']
+MICRO = ['register_serializer', 'profile_serializer', 'check_password', 'make_password']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', help="Куда записать JSON с результатами")
+    parser.add_argument('--repeat', type=int, default=200, help="Замеров на бенчмарк")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=10000, help="PASSWORD_HASH_ITERATIONS")
+    parser.add_argument('--only', nargs='+', choices=ENDPOINTS + MICRO)
+    args = parser.parse_args()
+
+    os.environ['PASSWORD_HASH_ITERATIONS'] = str(args.iterations)
+    common.setup()
+    benchmarks = Benchmarks()
+
+    results = {}
+    with common.no_throttling():
+        for name in args.only or ENDPOINTS + MICRO:
+            bench = getattr(benchmarks, name)
+            bench(args.warmup)
+            stats = common.summary(bench(args.repeat))
+            stats['ops_per_sec'] = 1000 / stats['mean_ms']
+            results[name] = stats
+            common.print_summary(name, stats)
+
+    if args.output:
+        common.write_results(args.output, 'suite', results, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+Задачи только для бенчмарков и тестов celery: в рабочем приложении их нет,
+регистрируются при импорте этого модуля.
+"""
+from celery import shared_task
+
+
+# результат ждут бенчмарк и тесты, поэтому сохраняем его явно (CELERY_TASK_IGNORE_RESULT)
+@shared_task(ignore_result=False)
+def ping():
+    return 'pong'
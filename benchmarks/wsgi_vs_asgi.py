@@ -0,0 +1,116 @@
+"""
+Один и тот же эндпоинт под gunicorn с sync-воркерами (WSGI) и с uvicorn-воркерами (ASGI).
+
+    python -m benchmarks.wsgi_vs_asgi --endpoint login --concurrency 32 --requests 20
+    python -m benchmarks.wsgi_vs_asgi --endpoint profile --workers 3
+
+Серверы запускаются подпроцессами на временной sqlite-БД, нагрузку дают потоки с http.client.
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+from . import common
+
+SERVERS = {
+    'wsgi': (['user_auth.wsgi:application'], '/api/users/'),
+    'asgi': (['-k', 'uvicorn.workers.UvicornWorker', 'user_auth.asgi:application'], '/api/async/users/'),
+}
+EMAIL = 'bench@example.com'
+PASSWORD = 'BenchPassword123'
+
+
+def make_request(endpoint, prefix, token):
+    if endpoint == 'login':
+        body = json.dumps({'email': EMAIL, 'password': PASSWORD})
+        return 'POST', f'{prefix}login/', body, {'Content-Type': 'application/json'}
+    return 'GET', f'{prefix}profile/', None, {'Authorization': f'Bearer {token}'}
+
+
+def drive(port, request, requests, latencies, errors, lock):
+    method, path, body, headers = request
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    local, failed = [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                failed += 1
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        local.append(time.perf_counter() - started)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def run(kind, args, env, token):
+    server_args, prefix = SERVERS[kind]
+    with common.gunicorn(server_args, args.workers, env) as port:
+        request = make_request(args.endpoint, prefix, token)
+        # прогрев: импорт, соединения с БД, кеш версии токена в каждом воркере
+        drive(port, request, args.workers * 2, [], [0], threading.Lock())
+
+        latencies, errors, lock = [], [0], threading.Lock()
+        threads = [
+            threading.Thread(target=drive, args=(port, request, args.requests, latencies, errors, lock))
+            for _ in range(args.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    stats = common.summary(latencies)
+    common.print_summary(f'{kind} {args.endpoint}', stats)
+    print(f"{'':<28} {len(latencies) / elapsed:.1f} rps, {errors[0]} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoint', choices=['login', 'profile'], default='login')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=20, help="Запросов на поток")
+    parser.add_argument('--iterations', type=int, default=100000, help="PASSWORD_HASH_ITERATIONS для логина")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'wsgi_vs_asgi.sqlite3')
+    env = dict(
+        os.environ,
+        SQLITE_PATH=db_path,
+        PASSWORD_HASH_ITERATIONS=str(args.iterations),
+        THROTTLE_ANON_RATE='1000000/minute',
+        THROTTLE_USER_RATE='1000000/minute',
+    )
+    os.environ.update(env)
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from users.models import User
+    from users.tokens import UserRefreshToken
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(email=EMAIL, name='Bench', password=PASSWORD)
+    token = str(UserRefreshToken.for_user(user).access_token)
+
+    for kind in SERVERS:
+        run(kind, args, env, token)
+
+
+if __name__ == '__main__':
+    main()
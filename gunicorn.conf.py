@@ -0,0 +1,63 @@
+# Читается gunicorn автоматически из рабочего каталога
+import gc
+import os
+import shutil
+import tempfile
+
+# Каталог для метрик всех воркеров. Переменная должна быть задана до импорта
+# prometheus_client, поэтому выставляем ее здесь, до форка воркеров
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'user_auth_metrics'))
+
+# С preload_app метрики создаются при импорте приложения, еще до on_starting
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+# Приложение импортируется один раз в мастере, воркеры получают его форком и делят
+# страницы памяти с мастером (copy-on-write). GUNICORN_PRELOAD=0 - каждый воркер
+# импортирует сам, как раньше (нужно, например, для --reload)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+if preload_app:
+    # Сборщик мусора пишет в заголовки всех объектов, которые обходит, и тем самым
+    # копирует общие страницы в каждый воркер. До форка он выключен, перед форком
+    # все объекты мастера замораживаются (gc.freeze), а в воркере сборщик снова включается
+    gc.disable()
+
+
+def on_starting(server):
+    # файлы от прошлого запуска исказили бы счетчики
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def when_ready(server):
+    # manage.py check под gunicorn не запускается: проверяем общие кеши для
+    # фактического числа воркеров (оно может быть задано и через --workers)
+    if not preload_app:
+        return
+    from django.conf import settings
+    from django.core import checks
+
+    settings.WEB_CONCURRENCY = server.cfg.workers
+    for message in checks.run_checks(tags=[checks.Tags.caches]):
+        server.log.error('%s', message)
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # соединения с БД не должны переходить в воркеры
+        from django.db import connections
+
+        connections.close_all()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
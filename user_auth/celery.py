@@ -1,6 +1,11 @@
 from __future__ import absolute_import, unicode_literals
 import os
+import threading
+
 from celery import Celery
+from celery.result import _set_task_join_will_block
+from celery.signals import before_task_publish
+from celery.worker import WorkController
 
 # Задаем настройки Django для celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_auth.settings')
@@ -16,4 +21,74 @@ app.autodiscover_tasks()
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+    print(f'Request: {self.request!r}')
+
+
+class LocalWorker(WorkController):
+    # Воркер celery в потоке процесса: тот же consumer, пул потоков вместо prefork
+    def __init__(self, *args, **kwargs):
+        self.ready = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def on_consumer_ready(self, consumer):
+        self.ready.set()
+
+
+_local_worker = None
+_local_worker_lock = threading.Lock()
+
+
+def _forget_local_worker():
+    global _local_worker, _local_worker_lock
+    _local_worker, _local_worker_lock = None, threading.Lock()
+
+
+# Потока воркера в дочернем процессе нет (gunicorn с preload_app)
+os.register_at_fork(after_in_child=_forget_local_worker)
+
+
+def start_local_worker(timeout: float = 10.0) -> LocalWorker:
+    # Запускается при первой отправке задачи: брокер в памяти виден только этому процессу
+    global _local_worker
+    with _local_worker_lock:
+        if _local_worker is None:
+            from django.conf import settings
+
+            worker = LocalWorker(
+                app=app,
+                pool='threads',
+                concurrency=settings.CELERY_LOCAL_CONCURRENCY,
+                # Других потребителей у очереди в памяти нет, а с лимитом prefetch
+                # транспорт в памяти ждет секунду после каждой выбранной порции
+                prefetch_multiplier=0,
+                without_heartbeat=True,
+                without_mingle=True,
+                without_gossip=True,
+                loglevel='WARNING',
+            )
+            worker.thread = threading.Thread(target=worker.start, name='celery-local', daemon=True)
+            worker.thread.start()
+            if not worker.ready.wait(timeout):
+                raise RuntimeError('Local celery worker did not start')
+            # Воркер помечает весь процесс как процесс задач, и result.get() запрещается
+            # везде; здесь это и веб-процесс, ждать результат из запроса можно
+            _set_task_join_will_block(False)
+            _local_worker = worker
+    return _local_worker
+
+
+def stop_local_worker(timeout: float = 10.0) -> None:
+    global _local_worker
+    with _local_worker_lock:
+        if _local_worker is not None:
+            _local_worker.stop(in_sighandler=False)
+            _local_worker.thread.join(timeout)
+            _local_worker = None
+
+
+@before_task_publish.connect
+def _ensure_local_worker(**kwargs):
+    from django.conf import settings
+
+    if settings.CELERY_MODE == 'thread' and _local_worker is None:
+        start_local_worker()
@@ -0,0 +1,44 @@
+"""
+OpenAPI-схема API: описание и генерация без запроса.
+
+Схема собирается один раз командой generate_openapi_schema в статический файл,
+который nginx отдает по /swagger.json. Динамический view - только запасной вариант.
+"""
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.utils import swagger_auto_schema
+
+from users.docs import SCHEMA_FACTORY_ATTR
+
+API_INFO = openapi.Info(
+    title="User Management API",
+    default_version='v1',
+    description="API for portfolio (for the User Management system)",
+    contact=openapi.Contact(email="stanko.11@mail.ru"),
+    license=openapi.License(name="MIT License"),
+)
+
+
+class SchemaGenerator(OpenAPISchemaGenerator):
+    # Описания из users.docs.swagger_schema строятся только здесь, при генерации схемы
+    def get_overrides(self, view, method):
+        action_method = getattr(view, getattr(view, 'action', method.lower()), None)
+        factory = getattr(action_method, SCHEMA_FACTORY_ATTR, None)
+        if factory is None:
+            return super().get_overrides(view, method)
+
+        def target():
+            pass
+        swagger_auto_schema(**factory(openapi))(target)
+        return target._swagger_auto_schema
+
+
+def render_schema(path: str) -> bytes:
+    # Хост не указываем: swagger-ui подставит тот, с которого открыт
+    schema = SchemaGenerator(info=API_INFO).get_schema(request=None, public=True)
+    codec = OpenAPICodecYaml if path.endswith(('.yaml', '.yml')) else OpenAPICodecJson
+    # pretty: файл лежит в репозитории, так его изменения читаются в диффе
+    if codec is OpenAPICodecJson:
+        return codec(validators=[], pretty=True).encode(schema)
+    return codec(validators=[]).encode(schema)
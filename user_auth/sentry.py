@@ -0,0 +1,100 @@
+"""
+Настройка Sentry: какие запросы трассировать и профилировать.
+
+Ошибки отправляются всегда, а трассировка и профилирование - выборочно, с долей
+по префиксу пути. Значения по умолчанию переопределяются переменными окружения:
+
+    SENTRY_TRACES_SAMPLE_RATE=0.1        # доля для путей без своего правила
+    SENTRY_PROFILES_SAMPLE_RATE=0.1      # доля профилируемых среди трассируемых
+    SENTRY_ROUTE_RATES="/api/users/login/=0.01:0,/swagger/=0"   # префикс=трассировка[:профили]
+    SENTRY_TRANSPORT=null                # ничего не отправлять (тесты, бенчмарки)
+"""
+import sentry_sdk
+from decouple import config
+from sentry_sdk.integrations.django import DjangoIntegration
+from sentry_sdk.transport import Transport
+
+# Логин и так дорогой из-за хеширования, трассировать его каждый раз незачем;
+# документация и статика не интересны вовсе
+DEFAULT_ROUTE_RATES = {
+    '/api/users/login/': (0.01, 0.0),
+    '/api/async/users/login/': (0.01, 0.0),
+    '/api/users/token/refresh/': (0.01, 0.0),
+    '/swagger/': (0.0, 0.0),
+    '/redoc/': (0.0, 0.0),
+    '/static/': (0.0, 0.0),
+}
+
+
+class NullTransport(Transport):
+    # Событие собирается как обычно, но никуда не уходит
+    def capture_envelope(self, envelope):
+        pass
+
+
+class SamplingPolicy:
+    def __init__(self, traces_rate: float, profiles_rate: float, route_rates: dict):
+        self.traces_rate = traces_rate
+        self.profiles_rate = profiles_rate
+        # Самый длинный префикс выигрывает
+        self.routes = sorted(route_rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    @classmethod
+    def from_env(cls) -> 'SamplingPolicy':
+        profiles_rate = config('SENTRY_PROFILES_SAMPLE_RATE', default=0.1, cast=float)
+        routes = dict(DEFAULT_ROUTE_RATES)
+        routes.update(parse_route_rates(config('SENTRY_ROUTE_RATES', default=''), profiles_rate))
+        return cls(config('SENTRY_TRACES_SAMPLE_RATE', default=0.1, cast=float), profiles_rate, routes)
+
+    def rates_for(self, sampling_context: dict) -> tuple[float, float]:
+        path = request_path(sampling_context)
+        if path is not None:
+            for prefix, rates in self.routes:
+                if path.startswith(prefix):
+                    return rates
+        return self.traces_rate, self.profiles_rate
+
+    def traces_sampler(self, sampling_context: dict) -> float:
+        # Решение вызывающего сервиса соблюдаем, чтобы распределенный трейс не рвался
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return float(parent_sampled)
+        return self.rates_for(sampling_context)[0]
+
+    def profiles_sampler(self, sampling_context: dict) -> float:
+        return self.rates_for(sampling_context)[1]
+
+
+def parse_route_rates(value: str, profiles_rate: float) -> dict:
+    routes = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        prefix, _, rates = item.partition('=')
+        traces, _, profiles = rates.partition(':')
+        routes[prefix.strip()] = (float(traces), float(profiles) if profiles else profiles_rate)
+    return routes
+
+
+def request_path(sampling_context: dict) -> str | None:
+    if 'wsgi_environ' in sampling_context:
+        return sampling_context['wsgi_environ'].get('PATH_INFO')
+    if 'asgi_scope' in sampling_context:
+        return sampling_context['asgi_scope'].get('path')
+    return None
+
+
+def init_sentry(dsn: str, policy: SamplingPolicy | None = None, profiling: bool = True, **options) -> SamplingPolicy:
+    policy = policy or SamplingPolicy.from_env()
+    if config('SENTRY_TRANSPORT', default='') == 'null':
+        options.setdefault('transport', NullTransport)
+    if profiling:
+        options.setdefault('profiles_sampler', policy.profiles_sampler)
+    sentry_sdk.init(
+        dsn=dsn,
+        integrations=[DjangoIntegration()],
+        # ошибки не сэмплируются: каждая попадает в Sentry
+        sample_rate=1.0,
+        traces_sampler=policy.traces_sampler,
+        send_default_pii=True,
+        **options,
+    )
+    return policy
@@ -12,23 +12,19 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from datetime import timedelta
 from pathlib import Path
-from decouple import config, Config
+from decouple import config, Config, Choices
 import os
-import sentry_sdk
-from sentry_sdk.integrations.django import DjangoIntegration
-
-sentry_sdk.init(
-    dsn=config('DSN'),
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for tracing.
-    integrations=[DjangoIntegration()],
-    traces_sample_rate=1.0,
-    send_default_pii=True,
-    # Set profiles_sample_rate to 1.0 to profile 100%
-    # of sampled transactions.
-    # We recommend adjusting this value in production.
-    profiles_sample_rate=1.0,
-)
+import tempfile
+from .sentry import init_sentry
+
+# Роль процесса: api - gunicorn, worker и beat - celery, all - все сразу
+# (разработка, тесты, migrate и прочие manage.py). Роль решает, какие приложения
+# и middleware загружаются, см. README "Роли процессов"
+APP_ROLE = config('APP_ROLE', default='all', cast=Choices(['all', 'api', 'worker', 'beat']))
+
+# Политика сэмплирования трассировок и профилей - в user_auth/sentry.py.
+# Профилируются только HTTP-запросы, celery-процессам профайлер не нужен
+init_sentry(config('DSN'), profiling=APP_ROLE in ('all', 'api'))
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -75,6 +71,25 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
+# Первым: время запроса считается вместе со всеми остальными middleware
+MIDDLEWARE.insert(0, 'users.metrics.MetricsMiddleware')
+
+# Админка (и нужные ей сообщения) есть только в роли all: API-воркеры живут на JWT,
+# а celery-процессам не нужно ничего из веба
+if APP_ROLE != 'all':
+    INSTALLED_APPS.remove("django.contrib.admin")
+    INSTALLED_APPS.remove("django.contrib.messages")
+    MIDDLEWARE.remove("django.contrib.messages.middleware.MessageMiddleware")
+# Модели расписания (и timezone_field, cron_descriptor) нужны только планировщику
+if APP_ROLE not in ('all', 'beat'):
+    INSTALLED_APPS.remove('django_celery_beat')
+
+# Откуда можно читать /metrics (адрес клиента без учета X-Forwarded-For)
+METRICS_ALLOWED_NETWORKS = config(
+    'METRICS_ALLOWED_NETWORKS',
+    default='127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16',
+    cast=lambda value: [net.strip() for net in value.split(',') if net.strip()],
+)
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.example.com')
@@ -84,17 +99,73 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='user@example.com')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='your-password')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@example.com')
 
+# outbox для писем: батч на одно SMTP-соединение, ретраи с экспоненциальной задержкой
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_BACKOFF = config('EMAIL_OUTBOX_RETRY_BACKOFF', default=30, cast=int)  # секунды
+EMAIL_OUTBOX_RETRY_BACKOFF_MAX = config('EMAIL_OUTBOX_RETRY_BACKOFF_MAX', default=3600, cast=int)
+EMAIL_OUTBOX_LEASE = config('EMAIL_OUTBOX_LEASE', default=300, cast=int)
+
 #на будущее если буду делать фронт
 CORS_ALLOWED_ORIGINS = [
     'https://example.com',
     'https://sub.example.com',
 ]
 
-CELERY_BROKER_URL = 'redis://redis:6379/0'  # URL для подключения к Redis 'redis://localhost:6379/0'
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://redis:6379/0')  # URL для подключения к Redis 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0' # 'redis://redis:6379/0' для докера
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://redis:6379/0') # 'redis://redis:6379/0' для докера
+# Результаты задач никто не читает: по умолчанию они не пишутся в бэкенд.
+# Задача, чей результат нужен, включает это сама: @shared_task(ignore_result=False)
+CELERY_TASK_IGNORE_RESULT = True
+# Задачи почты ждут SMTP и БД, а не процессор: пул потоков вместо prefork.
+# Сообщений про запас - по одному на поток, чтобы пачка писем не застревала за одним долгим SMTP
+CELERY_WORKER_POOL = config('CELERY_WORKER_POOL', default='threads')
+CELERY_WORKER_CONCURRENCY = config('CELERY_WORKER_CONCURRENCY', default=16, cast=int)
+CELERY_WORKER_PREFETCH_MULTIPLIER = config('CELERY_WORKER_PREFETCH_MULTIPLIER', default=1, cast=int)
+# Порт, на котором воркер отдает метрики задач в формате Prometheus (0 - не отдавать)
+CELERY_METRICS_PORT = config('CELERY_METRICS_PORT', default=0, cast=int)
+# Как выполняются задачи (user_auth/celery.py):
+#   broker - через CELERY_BROKER_URL отдельным воркером (по умолчанию)
+#   memory - брокер и результаты в памяти процесса, задачи только копятся (тесты)
+#   thread - то же, плюс воркер celery в потоке этого процесса (один узел, разработка)
+#   eager  - сразу в вызывающем потоке (скрипты, отладка)
+CELERY_MODE = config('CELERY_MODE', default='broker', cast=Choices(['broker', 'memory', 'thread', 'eager']))
+if CELERY_MODE != 'broker':
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
+    # очередь в памяти опрашивается; по умолчанию раз в секунду
+    CELERY_BROKER_TRANSPORT_OPTIONS = {'polling_interval': 0.01}
+CELERY_TASK_ALWAYS_EAGER = CELERY_TASK_EAGER_PROPAGATES = CELERY_MODE == 'eager'
+# Потоков встроенного воркера при CELERY_MODE=thread
+CELERY_LOCAL_CONCURRENCY = config('CELERY_LOCAL_CONCURRENCY', default=2, cast=int)
+# django_celery_results нужен только с бэкендом результатов django-db/django-cache
+if APP_ROLE != 'all' and not CELERY_RESULT_BACKEND.startswith('django-'):
+    INSTALLED_APPS.remove('django_celery_results')
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    # страховка на случай, если задача не была поставлена после регистрации
+    'drain-email-outbox': {
+        'task': 'users.tasks.drain_email_outbox',
+        'schedule': 30.0,
+    },
+    # истекшие записи списка отозванных токенов (нужно только для DatabaseCache)
+    'purge-revoked-tokens': {
+        'task': 'users.tasks.purge_revoked_tokens',
+        'schedule': 3600.0,
+    },
+    # события аудита старше AUDIT_RETENTION_DAYS
+    'purge-audit-events': {
+        'task': 'users.tasks.purge_audit_events',
+        'schedule': 86400.0,
+    },
+    # истекшие сессии и сессии, завершенные "выйти везде"
+    'purge-sessions': {
+        'task': 'users.tasks.purge_sessions',
+        'schedule': 3600.0,
+    },
+}
 
 ROOT_URLCONF = "user_auth.urls"
 
@@ -116,16 +187,138 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "user_auth.wsgi.application"
 
+# Кеш: по умолчанию в памяти процесса, в докере - общий redis
+# (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://redis:6379/1)
+CACHES = {
+    "default": {
+        "BACKEND": config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": config('CACHE_LOCATION', default=''),
+    },
+    # LRU в памяти процесса с TTL - для одиночного воркера
+    "local": {
+        "BACKEND": 'django.core.cache.backends.locmem.LocMemCache',
+        "LOCATION": 'users-local',
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": config('LOCAL_CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+}
+
+# read-through кеш профилей (users/cache.py); "local" или "default".
+# "local" сбрасывается только в своем процессе - с несколькими воркерами нужен общий (users/checks.py)
+PROFILE_CACHE_ALIAS = config('PROFILE_CACHE_ALIAS', default='default')
+PROFILE_CACHE_TIMEOUT = config('PROFILE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Пакетное чтение профилей для сервисов: лимит ключей в запросе, страница и порог потоковой отдачи
+PROFILE_BATCH_MAX_KEYS = config('PROFILE_BATCH_MAX_KEYS', default=1000, cast=int)
+PROFILE_BATCH_PAGE_SIZE = config('PROFILE_BATCH_PAGE_SIZE', default=100, cast=int)
+PROFILE_BATCH_MAX_PAGE_SIZE = config('PROFILE_BATCH_MAX_PAGE_SIZE', default=500, cast=int)
+PROFILE_BATCH_STREAM_THRESHOLD = config('PROFILE_BATCH_STREAM_THRESHOLD', default=200, cast=int)
+
+# Справочник пользователей для сотрудников (users.views.UserDirectoryView)
+DIRECTORY_PAGE_SIZE = config('DIRECTORY_PAGE_SIZE', default=50, cast=int)
+DIRECTORY_MAX_PAGE_SIZE = config('DIRECTORY_MAX_PAGE_SIZE', default=200, cast=int)
+
+# Журнал аудита (users/audit.py): буфер в процессе, запись пачками
+AUDIT_FLUSH_MODE = config('AUDIT_FLUSH_MODE', default='thread', cast=Choices(['thread', 'celery', 'sync']))
+AUDIT_BATCH_SIZE = config('AUDIT_BATCH_SIZE', default=100, cast=int)
+AUDIT_FLUSH_INTERVAL = config('AUDIT_FLUSH_INTERVAL', default=2.0, cast=float)  # секунды
+AUDIT_MAX_BUFFER = config('AUDIT_MAX_BUFFER', default=10000, cast=int)
+AUDIT_DROP_POLICY = config('AUDIT_DROP_POLICY', default='oldest', cast=Choices(['oldest', 'newest']))
+AUDIT_RETENTION_DAYS = config('AUDIT_RETENTION_DAYS', default=90, cast=int)
+AUDIT_PURGE_BATCH_SIZE = config('AUDIT_PURGE_BATCH_SIZE', default=5000, cast=int)
+# Откуда брать адрес клиента; за nginx - HTTP_X_REAL_IP
+AUDIT_IP_HEADER = config('AUDIT_IP_HEADER', default='REMOTE_ADDR')
+
+# Сколько процессов обслуживают запросы. Из этой же переменной gunicorn берет число
+# воркеров по умолчанию. Больше одного - кеши ниже должны быть общими (users/checks.py)
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+# Счетчики троттлинга должны быть общими для всех воркеров - по умолчанию redis из "default"
+THROTTLE_CACHE_ALIAS = config('THROTTLE_CACHE_ALIAS', default='default')
+
+# Отозванные jti хранятся с TTL до истечения токена, тоже в общем кеше.
+# Версии токенов (users/tokens.py) - в "default", он тоже должен быть общим
+TOKEN_REVOCATION_CACHE_ALIAS = config('TOKEN_REVOCATION_CACHE_ALIAS', default='default')
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgres - основной вариант для докера и нескольких воркеров,
+# sqlite оставлен для одиночной установки и разработки
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    # пул psycopg внутри процесса несовместим с CONN_MAX_AGE: либо пул, либо постоянные соединения
+    DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=0, cast=int)
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config('POSTGRES_DB', default='user_auth'),
+            "USER": config('POSTGRES_USER', default='user_auth'),
+            "PASSWORD": config('POSTGRES_PASSWORD', default=''),
+            "HOST": config('POSTGRES_HOST', default='db'),
+            "PORT": config('POSTGRES_PORT', default=5432, cast=int),
+            "CONN_MAX_AGE": 0 if DB_POOL_MAX_SIZE else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            "CONN_HEALTH_CHECKS": True,
+            # за pgbouncer в режиме transaction серверные курсоры не работают
+            "DISABLE_SERVER_SIDE_CURSORS": config('DB_PGBOUNCER', default=False, cast=bool),
+            "OPTIONS": {
+                "connect_timeout": config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                **({"pool": {
+                    "min_size": config('DB_POOL_MIN_SIZE', default=1, cast=int),
+                    "max_size": DB_POOL_MAX_SIZE,
+                    "timeout": config('DB_POOL_TIMEOUT', default=10, cast=int),
+                }} if DB_POOL_MAX_SIZE else {}),
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config('SQLITE_PATH', default=str(BASE_DIR / "db.sqlite3")),
+            "OPTIONS": {
+                # WAL: чтения не блокируются записью; IMMEDIATE берет блокировку записи
+                # в начале транзакции, без deadlock-а при повышении read -> write
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA cache_size=-20000;"
+                ),
+                "transaction_mode": "IMMEDIATE",
+                # сколько ждать блокировку записи (busy_timeout), секунды; PRAGMA его не переопределяет
+                "timeout": config('SQLITE_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+
+
+# Стоимость хеширования задается через PASSWORD_HASH_ITERATIONS,
+# существующие хеши пересчитываются при входе
+PASSWORD_HASHERS = [
+    'users.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=870000, cast=int)
+# Где считаются хеши при входе, регистрации и смене пароля (users/hashing.py):
+# process - отдельные процессы с пониженным приоритетом, thread - потоки, inline - в запросе
+PASSWORD_HASH_POOL = config('PASSWORD_HASH_POOL', default='process', cast=Choices(['process', 'thread', 'inline']))
+# Процессов на каждый воркер gunicorn
+PASSWORD_HASH_PROCESSES = config('PASSWORD_HASH_PROCESSES', default=1, cast=int)
+PASSWORD_HASH_THREADS = config('PASSWORD_HASH_THREADS', default=os.cpu_count() or 1, cast=int)
+PASSWORD_HASH_NICE = config('PASSWORD_HASH_NICE', default=10, cast=int)
+# Хеширований в очереди и в работе на всю машину; остальные сразу получают 503
+PASSWORD_HASH_MAX_PENDING = config('PASSWORD_HASH_MAX_PENDING', default=(os.cpu_count() or 1) * 2, cast=int)
+PASSWORD_HASH_SLOTS_DIR = config(
+    'PASSWORD_HASH_SLOTS_DIR', default=os.path.join(tempfile.gettempdir(), 'user_auth_hash_slots')
+)
+# Сколько запрос ждет результат, секунды; Retry-After в ответе 503
+PASSWORD_HASH_TIMEOUT = config('PASSWORD_HASH_TIMEOUT', default=5.0, cast=float)
+PASSWORD_HASH_RETRY_AFTER = config('PASSWORD_HASH_RETRY_AFTER', default=1, cast=int)
 
 
 # Password validation
@@ -139,12 +332,15 @@ AUTH_PASSWORD_VALIDATORS = [
         "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
     },
     {
-        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+        # CommonPasswordValidator по индексу в mmap (users/password_validation.py)
+        "NAME": "users.password_validation.BreachedPasswordValidator",
     },
     {
         "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
     },
 ]
+# Собирается manage.py build_password_index (в образе - при сборке)
+PASSWORD_INDEX_PATH = config('PASSWORD_INDEX_PATH', default=str(BASE_DIR / 'data' / 'passwords.idx'))
 
 
 # Internationalization
@@ -164,6 +360,16 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_DIRS = [BASE_DIR / 'user_auth' / 'static']
+
+# Собранная заранее OpenAPI-схема (generate_openapi_schema); nginx отдает ее по /swagger.json
+OPENAPI_SCHEMA_PATH = BASE_DIR / 'user_auth' / 'static' / 'openapi.json'
+# Swagger UI и redoc; drf_yasg.views импортируется при первом обращении к ним
+API_DOCS = config('API_DOCS', default=True, cast=bool)
+if not API_DOCS:
+    INSTALLED_APPS.remove('drf_yasg')
+# Сколько кешируется схема, если ее все-таки генерирует django
+OPENAPI_SCHEMA_CACHE_TIMEOUT = config('OPENAPI_SCHEMA_CACHE_TIMEOUT', default=3600, cast=int)
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -173,31 +379,54 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# JSON запросов и ответов (users/fastjson.py): auto - orjson, если установлен, иначе json
+JSON_BACKEND = config('JSON_BACKEND', default='auto')
+
 # настройка рест и jwt фреймворк
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'users.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'users.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',  # Ограничение запросов для аутентифицированных пользователей
-        'rest_framework.throttling.AnonRateThrottle',  # Ограничение запросов для анонимных пользователей
+        'users.throttling.SharedUserRateThrottle',  # Ограничение запросов для аутентифицированных пользователей
+        'users.throttling.SharedAnonRateThrottle',  # Ограничение запросов для анонимных пользователей
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'user': '50/minute',  
-        'anon': '10/minute',  
+        'user': config('THROTTLE_USER_RATE', default='50/minute'),
+        'anon': config('THROTTLE_ANON_RATE', default='10/minute'),
     }
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-    'ROTATE_REFRESH_TOKENS': False,
+    # Ротацию и отзыв делает users.revocation (TTL в кеше), таблица token_blacklist не нужна
+    'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Сколько живет версия пользователя в кеше. С локальным кешем это окно,
+# в течение которого другие воркеры еще принимают отозванный токен
+JWT_AUTH_VERSION_CACHE_TIMEOUT = config('JWT_AUTH_VERSION_CACHE_TIMEOUT', default=300, cast=int)
+
+# Реестр сессий (users/sessions.py): сколько пользователей можно разлогинить одним запросом
+# администратора и какими пачками обновлять поколение токенов
+SESSION_REVOKE_MAX_USERS = config('SESSION_REVOKE_MAX_USERS', default=10000, cast=int)
+SESSION_REVOKE_BATCH_SIZE = config('SESSION_REVOKE_BATCH_SIZE', default=1000, cast=int)
+SESSION_PURGE_BATCH_SIZE = config('SESSION_PURGE_BATCH_SIZE', default=1000, cast=int)
+
 AUTH_USER_MODEL="users.User"
 
 SWAGGER_SETTINGS = {
@@ -210,4 +439,10 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,  # Отключаем базовую аутентификацию через сессии
+    # UI берет готовую схему, а не генерирует ее на каждый запрос
+    'SPEC_URL': '/swagger.json',
+}
+
+REDOC_SETTINGS = {
+    'SPEC_URL': '/swagger.json',
 }
\ No newline at end of file
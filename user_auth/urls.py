@@ -15,27 +15,50 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
+from django.conf import settings
 from django.urls import path, include
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework import permissions
+from users.metrics import metrics_view
+
+
+def docs_view(renderer=None):
+    # drf_yasg.views тянет генератор схем DRF и admindocs - это заметная часть импорта
+    # при старте воркера. Документацию открывают редко, поэтому view собирается
+    # при первом обращении
+    view = None
+
+    def lazy_view(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_yasg.views import get_schema_view
+            from .schema import API_INFO, SchemaGenerator
+
+            schema_view = get_schema_view(
+                API_INFO, public=True, generator_class=SchemaGenerator, permission_classes=(permissions.AllowAny,),
+            )
+            timeout = settings.OPENAPI_SCHEMA_CACHE_TIMEOUT
+            view = schema_view.with_ui(renderer, cache_timeout=timeout) if renderer else schema_view.without_ui(cache_timeout=timeout)
+        return view(request, *args, **kwargs)
+    return lazy_view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="User Management API",
-        default_version='v1',
-        description="API for portfolio (for the User Management system)",
-        contact=openapi.Contact(email="stanko.11@mail.ru"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,)
-)
 
 urlpatterns = [
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    path("admin/", admin.site.urls),
     path('api/users/', include('users.urls')),  # Подключение приложения
+    path('api/async/users/', include('users.async_urls')),  # Те же эндпоинты для ASGI
+    path('metrics', metrics_view, name='metrics'),  # Prometheus, только из внутренней сети
 ]
+
+if settings.API_DOCS:
+    urlpatterns += [
+        # Сама схема обычно приходит из статики через nginx, это запасной вариант
+        path('swagger.json', docs_view(), name='schema-json'),
+        path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+        path('redoc/', docs_view('redoc'), name='schema-redoc'),
+    ]
+
+# Админка подключена только в роли all (см. APP_ROLE в settings)
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
@@ -1,5 +1,81 @@
 from django.contrib import admin
-from .models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+from django.utils import timezone
+from .models import AuthEvent, User, EmailOutbox
+from .sessions import log_out_everywhere
 # Register your models here.
 
-admin.site.register(User)
+
+class EstimatedCountPaginator(Paginator):
+    # Без фильтров COUNT(*) читает всю таблицу; в postgres берем оценку планировщика.
+    # Для отфильтрованного списка и других баз - обычный count
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [query.model._meta.db_table])
+                    row = cursor.fetchone()
+                # reltuples = -1, пока таблицу ни разу не анализировали
+                if row and row[0] >= 0:
+                    return int(row[0])
+        return super().count
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('email', 'name', 'is_active', 'is_staff', 'created_at')
+    list_filter = ('is_active', 'is_staff')
+    search_fields = ('email',)
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    # Второй COUNT(*) ради "N total" на отфильтрованной странице не делаем
+    show_full_result_count = False
+    actions = ['log_out_everywhere']
+
+    @admin.action(description='Log out selected users everywhere')
+    def log_out_everywhere(self, request, queryset):
+        count = log_out_everywhere(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'{count} users logged out everywhere.')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по началу email через lower(email): попадает в индекс из миграции 0006,
+        # а стандартный icontains дал бы LIKE '%...%' по всей таблице
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        return queryset.alias(email_lower=Lower('email')).filter(email_lower__startswith=term), False
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email',)
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected emails')
+    def requeue(self, request, queryset):
+        queryset.update(status=EmailOutbox.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(AuthEvent)
+class AuthEventAdmin(admin.ModelAdmin):
+    # Журнал только для чтения; таблица большая, поэтому без точного COUNT(*)
+    list_display = ('created_at', 'event_type', 'user_id', 'email', 'ip')
+    list_filter = ('event_type',)
+    search_fields = ('=user_id', '=email')
+    ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -6,4 +6,6 @@ class UsersConfig(AppConfig):
     name = "users"
     # Подключил сигналы
     def ready(self):
-        import users.signals
\ No newline at end of file
+        import users.checks
+        import users.signals
+        import users.task_metrics
\ No newline at end of file
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('register/', async_views.register, name='async-register'),
+    path('login/', async_views.login, name='async-login'),
+    path('profile/', async_views.profile_detail, name='async-profile-detail'),
+    path('profile/update/', async_views.profile_update, name='async-profile-update'),
+]
@@ -0,0 +1,168 @@
+"""
+Асинхронные (ASGI) варианты входа, регистрации и профиля.
+
+Обычные Django async views без DRF: хеширование паролей уходит в пул хеширования
+(users.hashing), чтение версии токена и профиля - через async-кеш и async ORM.
+Формат ответов и ошибок совпадает с синхронными эндпоинтами.
+"""
+from functools import partial, wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+
+from . import audit, fastjson
+from .authentication import StatelessJWTAuthentication
+from .cache import aget_profile_data, aget_profile_updated_at, invalidate_profile
+from . import hashing
+from .hashing import run_hasher
+from .models import Profile, User
+from .preconditions import PreconditionFailed, profile_validators, set_profile_validators
+from .serializers import LoginSerializer, RegisterSerializer, UpdateProfileSerializer
+from .sessions import astart_session
+
+
+def async_api(*methods):
+    # Минимум от APIView: CSRF не нужен (JWT), ошибки DRF превращаются в JSON
+    def decorator(view):
+        @csrf_exempt
+        @require_http_methods(methods)
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _error_response(exc)
+        return wrapper
+    return decorator
+
+
+def _json_response(data, status: int = 200) -> HttpResponse:
+    # Тот же бэкенд и формат, что у рендерера синхронных views
+    return HttpResponse(fastjson.dumps(data), status=status, content_type='application/json')
+
+
+def _error_response(exc: exceptions.APIException) -> HttpResponse:
+    data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = _json_response(data, status=exc.status_code)
+    # Throttled и HashingUnavailable (503 при занятом пуле хеширования)
+    if getattr(exc, 'wait', None) is not None:
+        response['Retry-After'] = str(int(exc.wait))
+    return response
+
+
+def _parse_json(request) -> dict:
+    try:
+        data = fastjson.loads(request.body or b'{}')
+    except ValueError as exc:
+        raise exceptions.ParseError(f'JSON parse error - {exc}')
+    if not isinstance(data, dict):
+        raise exceptions.ParseError('Expected a JSON object')
+    return data
+
+
+async def _check_throttles(request, user=None) -> None:
+    # Те же троттлы, что у DRF views; им нужны только user и META.
+    # Общие троттлы ходят в кеш через async API, прочие - в потоке
+    throttle_request = SimpleNamespace(user=user or AnonymousUser(), META=request.META)
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        allow_request = getattr(throttle, 'aallow_request', None) or sync_to_async(throttle.allow_request)
+        if not await allow_request(throttle_request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+async def _authenticate(request):
+    result = await StatelessJWTAuthentication().aauthenticate(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    return result[0]
+
+
+@async_api('POST')
+async def login(request):
+    """
+    Вход пользователя (ASGI). Тело и ответ как у POST /api/users/login/.
+    """
+    await _check_throttles(request)
+    credentials = LoginSerializer().to_internal_value(_parse_json(request))
+    user = await User.objects.aget_by_credentials(credentials['email'], credentials['password'])
+    if user is None:
+        audit.emit(audit.LOGIN_FAILED, request, email=credentials['email'])
+        raise exceptions.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Invalid credentials']})
+    audit.emit(audit.LOGIN, request, user_id=user.pk)
+    return _json_response(await astart_session(user, request))
+
+
+@async_api('POST')
+async def register(request):
+    """
+    Регистрация пользователя (ASGI). Тело и ответ как у POST /api/users/register/.
+    """
+    await _check_throttles(request)
+    serializer = RegisterSerializer(data=_parse_json(request))
+    # Валидация проверяет уникальность email - это запрос в БД
+    if not await sync_to_async(serializer.is_valid)():
+        raise exceptions.ValidationError(serializer.errors)
+    # Хеш считаем в пуле, в транзакцию сериализатора он приходит готовым
+    serializer.context['password_hash'] = await run_hasher(
+        make_password, serializer.validated_data['password'], priority=hashing.LOW
+    )
+    await sync_to_async(serializer.save)()
+    return _json_response(serializer.data, status=201)
+
+
+@async_api('GET')
+async def profile_detail(request):
+    """
+    Профиль текущего пользователя (ASGI), как GET /api/users/profile/: с ETag и 304.
+    """
+    user = await _authenticate(request)
+    await _check_throttles(request, user)
+    updated_at = await aget_profile_updated_at(user.pk)
+    if updated_at is not None:
+        not_modified = get_conditional_response(request, **profile_validators(user.pk, updated_at))
+        if not_modified is not None:
+            return not_modified
+    response = _json_response(await aget_profile_data(user.pk))
+    set_profile_validators(response, user.pk, updated_at or await aget_profile_updated_at(user.pk))
+    return response
+
+
+def _update_profile(request, user_id, data) -> tuple[dict, Profile]:
+    # Как UpdateProfileView: строка заблокирована от проверки If-Match до записи,
+    # поэтому потерянное обновление получит 412. Транзакции в async ORM нет - это поток
+    with transaction.atomic():
+        profile, created = Profile.objects.select_for_update().get_or_create(user_id=user_id)
+        failed = get_conditional_response(request, **profile_validators(profile.user_id, profile.updated_at))
+        if failed is not None:
+            raise PreconditionFailed()
+        serializer = UpdateProfileSerializer(profile, data=data, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        transaction.on_commit(partial(invalidate_profile, user_id))
+        transaction.on_commit(partial(
+            audit.emit, audit.PROFILE_UPDATED, request, user_id=user_id, fields=sorted(serializer.validated_data),
+        ))
+    return serializer.data, profile
+
+
+@async_api('PUT', 'PATCH')
+async def profile_update(request):
+    """
+    Обновление профиля (ASGI), как PUT/PATCH /api/users/profile/update/: If-Match и 412.
+    """
+    user = await _authenticate(request)
+    await _check_throttles(request, user)
+    data, profile = await sync_to_async(_update_profile)(request, user.pk, _parse_json(request))
+    response = _json_response(data)
+    set_profile_validators(response, profile.user_id, profile.updated_at)
+    return response
@@ -0,0 +1,183 @@
+"""
+Журнал аудита: входы, неудачные входы, смена пароля, изменение профиля.
+
+emit() только кладет событие в буфер процесса - в запросе нет INSERT. Буфер уходит
+в таблицу AuthEvent одной пачкой, когда набралось AUDIT_BATCH_SIZE событий или прошло
+AUDIT_FLUSH_INTERVAL секунд. Кто пишет пачку, задает AUDIT_FLUSH_MODE:
+
+    thread - фоновый поток процесса через bulk_create (по умолчанию)
+    celery - тот же поток, но пачка уходит задачей write_audit_events
+    sync   - поток не запускается, пачку пишет тот emit(), на котором буфер заполнился
+             (тесты, скрипты)
+
+Если запись не удалась, события возвращаются в буфер. Буфер ограничен AUDIT_MAX_BUFFER:
+при переполнении AUDIT_DROP_POLICY решает, что выбросить - самые старые (oldest) или
+новые (newest). Потери видны в метрике user_auth_audit_events_total{outcome="dropped"}.
+"""
+import asyncio
+import atexit
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections
+from django.utils import timezone
+from kombu.exceptions import KombuError
+
+from .metrics import AUDIT_EVENTS
+from .models import AuthEvent
+
+logger = logging.getLogger(__name__)
+
+LOGIN = AuthEvent.LOGIN
+LOGIN_FAILED = AuthEvent.LOGIN_FAILED
+PASSWORD_CHANGED = AuthEvent.PASSWORD_CHANGED
+PROFILE_UPDATED = AuthEvent.PROFILE_UPDATED
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AuditBuffer:
+    def __init__(self):
+        self._reset()
+        # После форка (gunicorn с preload_app) у воркера свой буфер и свой поток
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._events = deque()
+        self._thread = None
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, event: dict) -> None:
+        with self._lock:
+            self._push([event])
+            due = (
+                len(self._events) >= settings.AUDIT_BATCH_SIZE
+                or time.monotonic() - self._last_flush >= settings.AUDIT_FLUSH_INTERVAL
+            )
+        if settings.AUDIT_FLUSH_MODE != 'sync':
+            self._ensure_thread()
+            if due:
+                self._wakeup.set()
+        # Из async-кода синхронный ORM нельзя: пачку допишет следующий emit или flush
+        elif due and not _in_event_loop():
+            self.flush()
+
+    def _push(self, events: list, front: bool = False) -> None:
+        # вызывается под self._lock
+        if front:
+            self._events.extendleft(reversed(events))
+        else:
+            self._events.extend(events)
+        overflow = len(self._events) - settings.AUDIT_MAX_BUFFER
+        if overflow > 0:
+            for _ in range(overflow):
+                if settings.AUDIT_DROP_POLICY == 'newest':
+                    self._events.pop()
+                else:
+                    self._events.popleft()
+            AUDIT_EVENTS.labels('dropped').inc(overflow)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='audit-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+            # соединение потока живет между пачками, но битое или старое закрываем
+            close_old_connections()
+
+    def flush(self) -> int:
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._last_flush = time.monotonic()
+        if not events:
+            return 0
+        try:
+            if settings.AUDIT_FLUSH_MODE == 'celery':
+                from .tasks import write_audit_events
+
+                write_audit_events.apply_async(args=[events], retry=False)
+            else:
+                write_events(events)
+        except (OperationalError, InterfaceError, KombuError, OSError):
+            # БД или брокер недоступны - попробуем со следующей пачкой
+            logger.warning('Could not write %d audit events, keeping them in the buffer', len(events), exc_info=True)
+            with self._lock:
+                self._push(events, front=True)
+            return 0
+        except Exception:
+            # Пачку, которую БД не принимает, повторять бессмысленно
+            logger.exception('Dropping %d audit events', len(events))
+            AUDIT_EVENTS.labels('dropped').inc(len(events))
+            return 0
+        AUDIT_EVENTS.labels('written').inc(len(events))
+        return len(events)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+
+
+def write_events(events: list[dict]) -> None:
+    AuthEvent.objects.bulk_create(
+        [AuthEvent(**event) for event in events], batch_size=settings.AUDIT_BATCH_SIZE,
+    )
+
+
+buffer = AuditBuffer()
+
+
+def client_ip(request) -> str | None:
+    # За nginx REMOTE_ADDR - адрес прокси; AUDIT_IP_HEADER=HTTP_X_REAL_IP берет адрес клиента
+    value = request.META.get(settings.AUDIT_IP_HEADER) or request.META.get('REMOTE_ADDR') or ''
+    try:
+        return str(ipaddress.ip_address(value.split(',')[0].strip()))
+    except ValueError:
+        return None
+
+
+def _clean(value, max_length: int) -> str:
+    # Значения от клиента: postgres не примет NUL в строке, а длина ограничена колонкой
+    return str(value).replace('\x00', '')[:max_length]
+
+
+def user_agent(request) -> str:
+    return _clean(request.META.get('HTTP_USER_AGENT', ''), 255)
+
+
+def emit(event_type: str, request=None, user_id=None, email: str = '', **data) -> None:
+    event = {
+        'event_type': event_type,
+        'user_id': user_id,
+        'email': _clean(email, 254),
+        'ip': client_ip(request) if request is not None else None,
+        'user_agent': user_agent(request) if request is not None else '',
+        'data': data,
+        # строкой: пачка может уйти в celery как JSON
+        'created_at': timezone.now().isoformat(),
+    }
+    buffer.add(event)
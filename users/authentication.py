@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .revocation import ais_revoked, is_revoked
+from .tokens import AUTH_VERSION_CLAIM, aauth_version_matches, auth_version_matches
+
+User = get_user_model()
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь, собранный из claims токена.
+    Полная модель загружается из БД только при обращении к полям, которых нет в токене.
+    """
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get('email', '')
+
+    @cached_property
+    def name(self) -> str:
+        return self.token.get('name', '')
+
+    @cached_property
+    def is_active(self) -> bool:
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def username(self) -> str:
+        return self.email
+
+    @cached_property
+    def instance(self) -> User:
+        return User.objects.get(pk=self.pk)
+
+    def __str__(self) -> str:
+        return self.email
+
+    def save(self, *args, **kwargs) -> None:
+        self.instance.save(*args, **kwargs)
+
+    def set_password(self, raw_password: str) -> None:
+        self.instance.set_password(raw_password)
+
+    def check_password(self, raw_password: str) -> bool:
+        return self.instance.check_password(raw_password)
+
+    def __getattr__(self, attr: str):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.instance, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без SELECT пользователя на каждый запрос.
+    Актуальность токена проверяется по версии из кеша; токены без версии
+    (выданные до ее появления) обрабатываются как в JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        if AUTH_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user_id = self._user_id(validated_token)
+        return self._claims_user(validated_token, auth_version_matches(user_id, validated_token[AUTH_VERSION_CLAIM]))
+
+    # Асинхронный вариант для view под ASGI: версия берется через async-кеш и ORM
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if await ais_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        if AUTH_VERSION_CLAIM not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+        user_id = self._user_id(validated_token)
+        return self._claims_user(
+            validated_token, await aauth_version_matches(user_id, validated_token[AUTH_VERSION_CLAIM])
+        )
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    def _claims_user(self, validated_token, version_matches: bool) -> ClaimsUser:
+        if not version_matches:
+            raise AuthenticationFailed('Token is no longer valid', code='token_not_valid')
+
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
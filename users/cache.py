@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Profile
+from .serializers import represent_profile
+
+
+def _cache():
+    # Бэкенд выбирается алиасом из CACHES: локальный LRU с TTL или общий redis
+    return caches[settings.PROFILE_CACHE_ALIAS]
+
+
+def _profile_key(user_id) -> str:
+    return f'users:profile:{user_id}'
+
+
+def _payload_key(user_id) -> str:
+    return f'users:profile-data:{user_id}'
+
+
+def _updated_at_key(user_id) -> str:
+    return f'users:profile-updated:{user_id}'
+
+
+def get_profile_updated_at(user_id) -> datetime | None:
+    # Валидатор для ETag/Last-Modified: одно поле, без загрузки и сериализации профиля
+    cache = _cache()
+    updated_at = cache.get(_updated_at_key(user_id))
+    if updated_at is None:
+        updated_at = Profile.objects.filter(user_id=user_id).values_list('updated_at', flat=True).first()
+        if updated_at is not None:
+            cache.set(_updated_at_key(user_id), updated_at, settings.PROFILE_CACHE_TIMEOUT)
+    return updated_at
+
+
+async def aget_profile_updated_at(user_id) -> datetime | None:
+    cache = _cache()
+    updated_at = await cache.aget(_updated_at_key(user_id))
+    if updated_at is None:
+        updated_at = await Profile.objects.filter(user_id=user_id).values_list('updated_at', flat=True).afirst()
+        if updated_at is not None:
+            await cache.aset(_updated_at_key(user_id), updated_at, settings.PROFILE_CACHE_TIMEOUT)
+    return updated_at
+
+
+def get_profile(user_id) -> Profile:
+    cache = _cache()
+    profile = cache.get(_profile_key(user_id))
+    if profile is None:
+        profile, created = Profile.objects.get_or_create(user_id=user_id)
+        cache.set(_profile_key(user_id), profile, settings.PROFILE_CACHE_TIMEOUT)
+    return profile
+
+
+def get_profile_data(user_id) -> dict:
+    cache = _cache()
+    data = cache.get(_payload_key(user_id))
+    if data is None:
+        data = represent_profile(get_profile(user_id))
+        cache.set(_payload_key(user_id), data, settings.PROFILE_CACHE_TIMEOUT)
+    return data
+
+
+def get_profile_data_many(user_ids) -> dict:
+    # Один get_many на все id, промахи - одним запросом в БД и одним set_many
+    cache = _cache()
+    keys = {_payload_key(user_id): user_id for user_id in user_ids}
+    found = {keys[key]: data for key, data in cache.get_many(list(keys)).items()}
+    misses = [user_id for user_id in user_ids if user_id not in found]
+    if misses:
+        fetched = {
+            profile.user_id: represent_profile(profile)
+            for profile in Profile.objects.filter(user_id__in=misses)
+        }
+        cache.set_many(
+            {_payload_key(user_id): data for user_id, data in fetched.items()}, settings.PROFILE_CACHE_TIMEOUT
+        )
+        found.update(fetched)
+    return found
+
+
+async def aget_profile_data(user_id) -> dict:
+    cache = _cache()
+    data = await cache.aget(_payload_key(user_id))
+    if data is None:
+        profile = await cache.aget(_profile_key(user_id))
+        if profile is None:
+            profile, created = await Profile.objects.aget_or_create(user_id=user_id)
+            await cache.aset(_profile_key(user_id), profile, settings.PROFILE_CACHE_TIMEOUT)
+        data = represent_profile(profile)
+        await cache.aset(_payload_key(user_id), data, settings.PROFILE_CACHE_TIMEOUT)
+    return data
+
+
+def _keys(user_id) -> list[str]:
+    return [_profile_key(user_id), _payload_key(user_id), _updated_at_key(user_id)]
+
+
+def invalidate_profile(user_id) -> None:
+    _cache().delete_many(_keys(user_id))
+
+
+async def ainvalidate_profile(user_id) -> None:
+    await _cache().adelete_many(_keys(user_id))
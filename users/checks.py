@@ -0,0 +1,58 @@
+"""
+Системные проверки настроек.
+
+Троттлинг, список отозванных токенов, версии токенов и кеш профилей работают только на кеше, общем
+для всех процессов. LocMemCache у каждого процесса свой: с несколькими воркерами
+лимиты, отзыв и сброс кеша действовали бы только в одном из них.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+
+
+def _process_local(alias: str) -> bool:
+    return isinstance(caches[alias], LocMemCache)
+
+
+def _shared_cache_error(setting: str, alias: str, what: str, id: str) -> list:
+    if settings.WEB_CONCURRENCY <= 1 or not _process_local(alias):
+        return []
+    return [Error(
+        f'{setting}={alias!r} is a process-local LocMemCache, but WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: '
+        f'{what} would not be shared between workers.',
+        hint='Point CACHE_BACKEND/CACHE_LOCATION at redis (or another shared cache) or run a single worker.',
+        id=id,
+    )]
+
+
+@register(Tags.caches)
+def check_throttle_cache(app_configs, **kwargs):
+    alias = settings.THROTTLE_CACHE_ALIAS
+    return _shared_cache_error('THROTTLE_CACHE_ALIAS', alias, 'rate limit counters', 'users.E001')
+
+
+@register(Tags.caches)
+def check_revocation_cache(app_configs, **kwargs):
+    # Отозванный jti и сброшенная версия токена (users/tokens.py, кеш "default")
+    # должны быть видны всем воркерам, иначе токен продолжит работать в соседнем
+    alias = settings.TOKEN_REVOCATION_CACHE_ALIAS
+    return [
+        *_shared_cache_error('TOKEN_REVOCATION_CACHE_ALIAS', alias, 'revoked tokens', 'users.E002'),
+        *_shared_cache_error('CACHES', DEFAULT_CACHE_ALIAS, 'token versions', 'users.E003'),
+    ]
+
+
+@register(Tags.caches)
+def check_profile_cache(app_configs, **kwargs):
+    # Сигналы сбрасывают профиль только в своем процессе; остальные отдают старый
+    # до PROFILE_CACHE_TIMEOUT - устаревшие данные, а не обход защиты, поэтому предупреждение
+    alias = settings.PROFILE_CACHE_ALIAS
+    if settings.WEB_CONCURRENCY <= 1 or not _process_local(alias):
+        return []
+    return [Warning(
+        f'PROFILE_CACHE_ALIAS={alias!r} is a process-local LocMemCache, but WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: '
+        f'other workers serve stale profiles for up to PROFILE_CACHE_TIMEOUT={settings.PROFILE_CACHE_TIMEOUT}s after a change.',
+        hint='Use a shared cache for PROFILE_CACHE_ALIAS or lower PROFILE_CACHE_TIMEOUT.',
+        id='users.W001',
+    )]
@@ -0,0 +1,28 @@
+"""
+Описания эндпоинтов для OpenAPI без импорта drf_yasg в процессе API.
+
+swagger_auto_schema строит объекты drf_yasg.openapi при импорте views, то есть при старте
+каждого воркера, хотя схема собирается заранее (generate_openapi_schema). swagger_schema
+только запоминает функцию с теми же аргументами: ее вызывает генератор схемы
+(user_auth.schema.SchemaGenerator), передавая модуль drf_yasg.openapi.
+"""
+SCHEMA_FACTORY_ATTR = '_swagger_schema_factory'
+
+
+def swagger_schema(factory):
+    # factory(openapi) -> аргументы swagger_auto_schema
+    def decorator(view_method):
+        setattr(view_method, SCHEMA_FACTORY_ATTR, factory)
+        return view_method
+    return decorator
+
+
+def auth_header(openapi):
+    return openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer {JWT token}", type=openapi.TYPE_STRING)
+
+
+def empty_body():
+    # drf_yasg.utils.no_body: у запроса нет тела, сериализатор view не описывается
+    from drf_yasg.utils import no_body
+
+    return no_body
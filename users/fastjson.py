@@ -0,0 +1,65 @@
+"""
+JSON для тел запросов и ответов: orjson, если установлен, иначе stdlib json.
+
+Бэкенд выбирается настройкой JSON_BACKEND: auto (orjson, если есть), orjson или json.
+Вывод совпадает с JSONRenderer DRF: компактный UTF-8, даты через его JSONEncoder
+(миллисекунды и Z), U+2028/U+2029 экранированы.
+"""
+import json
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson не обязателен
+    orjson = None
+
+# Разделители строк JS: валидный JSON, но не валидный JavaScript
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+_encoder = JSONEncoder()
+
+
+def _orjson_dumps(data) -> bytes:
+    # Даты, Decimal, ленивые строки и прочее отдаем кодировщику DRF, чтобы формат не менялся
+    content = orjson.dumps(
+        data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    )
+    for separator, escaped in _LINE_SEPARATORS:
+        if separator in content:
+            content = content.replace(separator, escaped)
+    return content
+
+
+def _json_dumps(data) -> bytes:
+    content = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+@cache
+def _backend(name: str):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise ImproperlyConfigured("JSON_BACKEND = 'orjson', but orjson is not installed")
+        return name, _orjson_dumps, orjson.loads
+    if name == 'json':
+        return name, _json_dumps, json.loads
+    raise ImproperlyConfigured(f"Unknown JSON_BACKEND {name!r}, expected auto, orjson or json")
+
+
+def backend_name() -> str:
+    return _backend(settings.JSON_BACKEND)[0]
+
+
+def dumps(data) -> bytes:
+    return _backend(settings.JSON_BACKEND)[1](data)
+
+
+def loads(content: bytes | str):
+    # Ошибки разбора в обоих бэкендах - подклассы ValueError
+    return _backend(settings.JSON_BACKEND)[2](content)
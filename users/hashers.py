@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Тот же pbkdf2_sha256, но стоимость задается в настройках.
+    # Хеши со старым числом итераций пересчитываются при следующем входе (must_update)
+    @property
+    def iterations(self) -> int:
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,264 @@
+"""
+Хеширование паролей вне потока запроса.
+
+Вход, регистрация и смена пароля отдают make_password/check_password в пул,
+вид пула задает PASSWORD_HASH_POOL:
+
+    process - PASSWORD_HASH_PROCESSES процессов на воркер с пониженным приоритетом
+              (PASSWORD_HASH_NICE): под нагрузкой ядро сначала достается остальным
+              запросам (по умолчанию)
+    thread  - PASSWORD_HASH_THREADS потоков текущего процесса (PBKDF2 в hashlib отпускает GIL)
+    inline  - в потоке запроса
+
+Допуск общий для всех процессов машины: в очереди и в работе не больше
+PASSWORD_HASH_MAX_PENDING хеширований. Слоты - файлы в PASSWORD_HASH_SLOTS_DIR под flock,
+их видят все воркеры gunicorn, а слот упавшего процесса освобождает ядро. Приоритет
+эндпоинта задает долю слотов, которую он может занять: регистрация упирается в лимит
+первой, смена пароля - последней. Без слота или через PASSWORD_HASH_TIMEOUT ожидания
+запрос сразу получает 503 с Retry-After.
+"""
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS, PASSWORD_HASH_WAIT_SECONDS
+
+HIGH = 'high'
+NORMAL = 'normal'
+LOW = 'low'
+# Доля PASSWORD_HASH_MAX_PENDING, доступная запросам с этим приоритетом
+PRIORITY_SHARES = {HIGH: 1.0, NORMAL: 0.75, LOW: 0.5}
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many password checks in progress, try again later.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, wait: int):
+        super().__init__()
+        # DRF и async views отдают wait в заголовке Retry-After
+        self.wait = wait
+
+
+class HashSlots:
+    # Дескрипторы файлов открываются один раз на процесс. flock того же дескриптора из
+    # того же процесса не блокируется, поэтому слоты, занятые своими потоками, помним отдельно
+    def __init__(self):
+        self._files = {}
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Унаследованные дескрипторы закрываем: блокировки родителя остаются за ним
+        for fd in self._files.values():
+            os.close(fd)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._held = set()
+
+    def _fd(self, path: str) -> int:
+        if path not in self._files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._files[path] = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        return self._files[path]
+
+    def acquire(self, priority: str) -> str | None:
+        limit = max(1, int(settings.PASSWORD_HASH_MAX_PENDING * PRIORITY_SHARES[priority]))
+        with self._lock:
+            for index in range(limit):
+                path = os.path.join(settings.PASSWORD_HASH_SLOTS_DIR, f'{index}.lock')
+                if path in self._held:
+                    continue
+                try:
+                    fcntl.flock(self._fd(path), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                self._held.add(path)
+                return path
+        return None
+
+    def release(self, path: str) -> None:
+        with self._lock:
+            fcntl.flock(self._files[path], fcntl.LOCK_UN)
+            self._held.discard(path)
+
+
+slots = HashSlots()
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _forget_executors():
+    _executors.clear()
+
+
+# Потоков и процессов пула после форка в дочернем процессе нет
+os.register_at_fork(after_in_child=_forget_executors)
+
+
+def get_executor(kind: str):
+    if kind not in _executors:
+        with _executors_lock:
+            if kind not in _executors:
+                if kind == 'process':
+                    _executors[kind] = ProcessPoolExecutor(
+                        max_workers=settings.PASSWORD_HASH_PROCESSES,
+                        # spawn: в воркере уже работают потоки (аудит, sentry), fork из него небезопасен
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_process,
+                        initargs=(settings.PASSWORD_HASH_NICE,),
+                    )
+                else:
+                    _executors[kind] = ThreadPoolExecutor(
+                        max_workers=settings.PASSWORD_HASH_THREADS, thread_name_prefix='password-hash'
+                    )
+    return _executors[kind]
+
+
+def _hash_config() -> tuple:
+    # Процессы пула не читают модуль настроек (там sentry и все приложение), им
+    # достаточно хешеров; с каждой задачей идет текущее значение, так работает и override_settings
+    return (
+        ('PASSWORD_HASHERS', tuple(settings.PASSWORD_HASHERS)),
+        ('PASSWORD_HASH_ITERATIONS', settings.PASSWORD_HASH_ITERATIONS),
+    )
+
+
+_process_config = None
+
+
+def _init_process(nice: int) -> None:
+    os.nice(nice)
+
+
+def _remote(name: str, args: tuple, config: tuple) -> tuple:
+    # Выполняется в процессе пула
+    global _process_config
+    if not settings.configured:
+        settings.configure(**dict(config))
+    elif config != _process_config:
+        for setting, value in config:
+            setattr(settings, setting, value)
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
+    _process_config = config
+    return _timed(getattr(hashers, name), *args)
+
+
+def _timed(func, *args) -> tuple:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _unavailable(priority: str, reason: str) -> HashingUnavailable:
+    PASSWORD_HASH_REJECTED.labels(priority, reason).inc()
+    return HashingUnavailable(settings.PASSWORD_HASH_RETRY_AFTER)
+
+
+def _submit(kind: str, func, args: tuple) -> Future:
+    if kind == 'inline':
+        future = Future()
+        try:
+            future.set_result(_timed(func, *args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    if kind == 'process':
+        # функция уходит в процесс по имени: make_password или check_password
+        return get_executor(kind).submit(_remote, func.__name__, args, _hash_config())
+    return get_executor(kind).submit(_timed, func, *args)
+
+
+def dispatch(func, *args, priority: str = NORMAL) -> Future:
+    """
+    Ставит func(*args) в пул, если есть свободный слот; результат future - пара
+    (значение, секунды хеширования). Без слота - HashingUnavailable.
+    """
+    slot = slots.acquire(priority)
+    if slot is None:
+        raise _unavailable(priority, 'busy')
+    kind = settings.PASSWORD_HASH_POOL
+    submitted = time.perf_counter()
+    try:
+        try:
+            future = _submit(kind, func, args)
+        except BrokenProcessPool:
+            # процесс пула убит (например, OOM) - пул не восстанавливается, создаем новый
+            _executors.pop(kind, None)
+            future = _submit(kind, func, args)
+    except BaseException:
+        slots.release(slot)
+        raise
+
+    held = [slot]
+    held_lock = threading.Lock()
+
+    def release():
+        # Ровно один раз: из callback пула или из ожидающего потока, кто первый.
+        # Callback вызывается уже после того, как ожидающий получил результат, а
+        # следующее хеширование того же запроса (пересчет хеша) не должно упереться в свой же слот
+        with held_lock:
+            if held:
+                slots.release(held.pop())
+
+    def done(future):
+        # Слот держится, пока хеш считается, даже если запрос перестал ждать
+        release()
+        # Метрики пишет этот процесс: из процесса пула они бы до /metrics не дошли
+        if not future.cancelled() and future.exception() is None:
+            hashed = future.result()[1]
+            PASSWORD_HASH_SECONDS.observe(hashed)
+            PASSWORD_HASH_WAIT_SECONDS.labels(priority).observe(max(time.perf_counter() - submitted - hashed, 0.0))
+
+    future.release_slot = release
+    future.add_done_callback(done)
+    return future
+
+
+def run(func, *args, priority: str = NORMAL):
+    future = dispatch(func, *args, priority=priority)
+    try:
+        result = future.result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise _unavailable(priority, 'timeout')
+    except BrokenProcessPool:
+        _executors.pop('process', None)
+        raise _unavailable(priority, 'broken')
+    future.release_slot()
+    return result[0]
+
+
+def make_password(password: str, priority: str = NORMAL) -> str:
+    return run(hashers.make_password, password, priority=priority)
+
+
+def check_password(password: str, encoded: str, priority: str = NORMAL) -> bool:
+    return run(hashers.check_password, password, encoded, priority=priority)
+
+
+async def run_hasher(func, *args, priority: str = NORMAL):
+    # То же для async views: event loop в это время обслуживает другие запросы
+    future = dispatch(func, *args, priority=priority)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        raise _unavailable(priority, 'timeout')
+    except BrokenProcessPool:
+        _executors.pop('process', None)
+        raise _unavailable(priority, 'broken')
+    future.release_slot()
+    return result[0]
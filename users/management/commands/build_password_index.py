@@ -0,0 +1,85 @@
+import gzip
+import heapq
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.password_validation import CommonPasswordValidator
+from django.core.management.base import BaseCommand, CommandError
+
+from users.password_validation import password_key, sha1_key, write_index
+
+
+def open_text(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def read_sha1(path: str, min_count: int):
+    """
+    Ключи из выгрузки SHA-1, отсортированной по хешу: файл со строками HASH[:COUNT] или
+    каталог файлов диапазонов HIBP (имя - первые 5 символов хеша, строки SUFFIX:COUNT).
+    Выгрузка не загружается в память, поэтому порядок обязателен.
+    """
+    if os.path.isdir(path):
+        files = [(name.split('.')[0], os.path.join(path, name)) for name in sorted(os.listdir(path))]
+    else:
+        files = [('', path)]
+    previous = -1
+    for prefix, file_path in files:
+        with open_text(file_path) as fp:
+            for line in fp:
+                digest, _, count = line.strip().partition(':')
+                if not digest or (count and int(count) < min_count):
+                    continue
+                key = sha1_key(prefix + digest)
+                if key < previous:
+                    raise CommandError(f'{file_path} is not sorted by hash')
+                previous = key
+                yield key
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает индекс паролей из утечек для BreachedPasswordValidator: список Django, "
+        "словари паролей и отсортированные выгрузки SHA-1 (Have I Been Pwned)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="По умолчанию PASSWORD_INDEX_PATH")
+        parser.add_argument('--no-common', action='store_true', help="Без списка CommonPasswordValidator")
+        parser.add_argument(
+            '--wordlist', action='append', default=[], help="Файл паролей по одному в строке (.gz тоже); можно несколько",
+        )
+        parser.add_argument(
+            '--sha1', action='append', default=[],
+            help="Выгрузка SHA-1, отсортированная по хешу: файл HASH[:COUNT] или каталог диапазонов HIBP",
+        )
+        parser.add_argument('--min-count', type=int, default=1, help="Только хеши, встреченные не реже")
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.PASSWORD_INDEX_PATH
+        started = time.perf_counter()
+
+        # Словари небольшие: хешируем и сортируем в памяти. Как у CommonPasswordValidator,
+        # слова без учета регистра и пробелов по краям, а выгрузки SHA-1 - точные пароли
+        keys = set()
+        if not options['no_common']:
+            keys.update(password_key(password) for password in CommonPasswordValidator().passwords)
+        for path in options['wordlist']:
+            try:
+                with open_text(path) as fp:
+                    keys.update(password_key(line.lower().strip()) for line in fp if line.strip())
+            except OSError as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+        for path in options['sha1']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist')
+
+        sources = [sorted(keys), *(read_sha1(path, options['min_count']) for path in options['sha1'])]
+        count = write_index(heapq.merge(*sources), output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} keys ({os.path.getsize(output) / 1024 / 1024:.1f} MB) to {output} "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,57 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from users.models import User
+
+FIELDS = (
+    'email', 'name', 'is_active', 'created_at',
+    'profile__bio', 'profile__phone_number', 'profile__profile_picture', 'profile__location',
+)
+
+
+class Command(BaseCommand):
+    help = "Потоковый экспорт пользователей с профилями в CSV/JSONL, память не растет с числом строк."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="Файл для записи, '-' - stdout")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--include-password-hash', action='store_true',
+            help="Добавить колонку password_hash (для переноса в import_users)",
+        )
+
+    def handle(self, *args, **options):
+        fields = FIELDS + (('password',) if options['include_password_hash'] else ())
+        # имена колонок совпадают с тем, что принимает import_users
+        columns = [field.removeprefix('profile__').replace('password', 'password_hash') for field in fields]
+        rows = (
+            User.objects.order_by('pk')
+            .values_list(*fields)
+            .iterator(chunk_size=options['chunk_size'])
+        )
+
+        stream = self.stdout if options['output'] == '-' else open(options['output'], 'w', newline='', encoding='utf-8')
+        started = time.perf_counter()
+        count = 0
+        try:
+            if options['format'] == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(columns)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            else:
+                for row in rows:
+                    stream.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n')
+                    count += 1
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"Exported {count} users in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)")
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user_auth.schema import render_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует OpenAPI-схему в статический файл (по умолчанию OPENAPI_SCHEMA_PATH). "
+        "С --check ничего не пишет и падает, если файл расходится с кодом."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Путь к .json или .yaml")
+        parser.add_argument('--check', action='store_true', help="Только сравнить с существующим файлом")
+
+    def handle(self, *args, **options):
+        path = Path(options['output'] or settings.OPENAPI_SCHEMA_PATH)
+        schema = render_schema(str(path))
+
+        if options['check']:
+            if not path.exists():
+                raise CommandError(f"{path} does not exist, run generate_openapi_schema")
+            if path.read_bytes() != schema:
+                raise CommandError(f"{path} is out of date, run generate_openapi_schema")
+            self.stdout.write(self.style.SUCCESS(f"{path} is up to date"))
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(schema)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path} ({len(schema)} bytes)"))
@@ -0,0 +1,144 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Profile, User
+
+PROFILE_FIELDS = ('bio', 'phone_number', 'profile_picture', 'location')
+# Валидаторы полей модели (EmailValidator, max_length, URLValidator): bulk_create их не вызывает
+VALIDATED_FIELDS = {
+    'email': User._meta.get_field('email'),
+    'name': User._meta.get_field('name'),
+    **{name: Profile._meta.get_field(name) for name in PROFILE_FIELDS},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковый импорт пользователей из CSV/JSONL. Колонки: email, name, "
+        "password (открытый) или password_hash (готовый хеш), is_active и поля профиля. "
+        "Отклоненные строки печатаются в stderr с номером строки файла."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл с пользователями, '-' - stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="По умолчанию определяется по расширению")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {options['path']}: {exc}")
+
+        totals = {'created': 0, 'skipped': 0, 'invalid': 0}
+        started = time.perf_counter()
+        try:
+            rows = self.read_rows(stream, fmt)
+            while chunk := list(islice(rows, chunk_size)):
+                created, skipped, invalid = self.import_chunk(chunk, chunk_size)
+                totals['created'] += created
+                totals['skipped'] += skipped
+                totals['invalid'] += invalid
+                processed = sum(totals.values())
+                self.stdout.write(
+                    f"{processed} rows, {totals['created']} created, "
+                    f"{processed / (time.perf_counter() - started):.0f} rows/s"
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['created']}, skipped {totals['skipped']} existing/duplicate, "
+            f"{totals['invalid']} invalid in {elapsed:.1f}s"
+        ))
+
+    def read_rows(self, stream, fmt):
+        # (номер строки файла, строка); для CSV - последняя строка записи
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+
+    def reject(self, line_number, reason) -> None:
+        self.stderr.write(f"line {line_number}: {reason}")
+
+    def row_errors(self, email, row) -> list[str]:
+        values = {**{name: row.get(name) for name in VALIDATED_FIELDS}, 'email': email}
+        errors = []
+        for name, value in values.items():
+            if value in (None, ''):
+                continue
+            try:
+                VALIDATED_FIELDS[name].run_validators(str(value))
+            except ValidationError as exc:
+                errors.append(f"{name}: {' '.join(exc.messages)}")
+        return errors
+
+    def import_chunk(self, chunk, batch_size):
+        invalid = 0
+        rows = {}
+        for line_number, row in chunk:
+            if row is None:
+                self.reject(line_number, "not a JSON object")
+                invalid += 1
+                continue
+            email = User.objects.normalize_email((row.get('email') or '').strip())
+            errors = self.row_errors(email, row) if email else ["email: missing"]
+            if errors:
+                self.reject(line_number, '; '.join(errors))
+                invalid += 1
+                continue
+            # дубликаты внутри файла - побеждает первая строка
+            rows.setdefault(email, (line_number, row))
+
+        existing = set(User.objects.filter(email__in=rows).values_list('email', flat=True))
+        users, profiles = [], []
+        for email, (line_number, row) in rows.items():
+            if email in existing:
+                continue
+            try:
+                password = self.get_password(row)
+            except ValueError:
+                self.reject(line_number, "password_hash: unknown hash format")
+                invalid += 1
+                continue
+            users.append(User(
+                email=email,
+                name=row.get('name') or '',
+                password=password,
+                is_active=str(row.get('is_active', True)).lower() not in ('0', 'false', 'no'),
+            ))
+            profiles.append({field: row[field] for field in PROFILE_FIELDS if row.get(field)})
+
+        User.objects.bulk_create_with_profiles(users, profiles, batch_size=batch_size)
+        skipped = len(chunk) - invalid - len(users)
+        return len(users), skipped, invalid
+
+    def get_password(self, row) -> str:
+        if row.get('password_hash'):
+            # готовый хеш должен быть в формате, который понимает один из PASSWORD_HASHERS
+            identify_hasher(row['password_hash'])
+            return row['password_hash']
+        if row.get('password'):
+            return make_password(row['password'])
+        return make_password(None)
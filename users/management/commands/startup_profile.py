@@ -0,0 +1,96 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ROLES = ['api', 'worker', 'beat', 'all']
+
+# Выполняется в отдельном интерпретаторе с нужной APP_ROLE: поднимает то же, что
+# процесс этой роли при старте, и для API обрабатывает первый запрос
+PROBE = """
+import io, json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_auth.settings')
+role = os.environ['APP_ROLE']
+if role in ('api', 'all'):
+    from user_auth.wsgi import application
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/users/profile/', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+    }
+    # без токена: 401 проходит middleware, URLconf, DRF и рендерер, но не трогает БД
+    b''.join(application(environ, lambda status, headers, exc_info=None: None))
+else:
+    import django
+    django.setup()
+    from user_auth.celery import app
+    app.loader.import_default_modules()
+    if role == 'beat':
+        from django_celery_beat.schedulers import DatabaseScheduler
+print(json.dumps({
+    'ready_ms': (time.perf_counter() - started) * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> Counter:
+    # "import time: self [us] | cumulative | name": собственное время по пакету верхнего уровня
+    packages = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line.split(':', 1)[1].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+    return packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Профиль старта процесса каждой роли (APP_ROLE): время до готовности (для API - до первого "
+        "ответа), пиковый RSS и самые дорогие по импорту пакеты (python -X importtime)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', nargs='+', choices=ROLES, default=ROLES)
+        parser.add_argument('--repeat', type=int, default=3, help="Запусков на роль, берется медиана")
+        parser.add_argument('--top', type=int, default=10, help="Сколько пакетов показать")
+        parser.add_argument('--json', dest='output', help="Куда записать результат в JSON")
+
+    def probe(self, role: str, importtime: bool = False) -> subprocess.CompletedProcess:
+        command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', PROBE]
+        env = {**os.environ, 'APP_ROLE': role}
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"{role}: probe failed\n{result.stderr[-2000:]}")
+        return result
+
+    def handle(self, *args, **options):
+        results = {}
+        for role in options['role']:
+            runs = [json.loads(self.probe(role).stdout) for _ in range(options['repeat'])]
+            # Отдельный запуск для разбивки: сам -X importtime замедляет старт
+            packages = parse_importtime(self.probe(role, importtime=True).stderr)
+            results[role] = {
+                'ready_ms': statistics.median(run['ready_ms'] for run in runs),
+                'rss_mb': statistics.median(run['rss_mb'] for run in runs),
+                'modules': runs[0]['modules'],
+                'top_imports_ms': {name: us / 1000 for name, us in packages.most_common(options['top'])},
+            }
+
+            stats = results[role]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{role}: ready {stats['ready_ms']:.0f} ms, RSS {stats['rss_mb']:.1f} MB, {stats['modules']} modules"
+            ))
+            for name, ms in stats['top_imports_ms'].items():
+                self.stdout.write(f"  {ms:8.1f} ms  {name}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump(results, fp, indent=2, sort_keys=True)
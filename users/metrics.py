@@ -0,0 +1,146 @@
+"""
+Метрики запросов и задач celery в формате Prometheus.
+
+Под gunicorn каждый воркер пишет значения в свои mmap-файлы в каталоге
+PROMETHEUS_MULTIPROC_DIR (его готовит gunicorn.conf.py), а /metrics собирает их
+вместе. Без этой переменной используется обычный реестр текущего процесса.
+Метрики задач пишет воркер celery (users/task_metrics.py) и сам отдает их на CELERY_METRICS_PORT.
+"""
+import ipaddress
+import os
+from contextlib import ExitStack
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+REQUEST_SECONDS = Histogram(
+    'user_auth_request_duration_seconds', 'Время обработки запроса', ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'user_auth_db_queries_per_request', 'Запросов к БД за запрос', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, float('inf')),
+)
+DB_SECONDS = Histogram(
+    'user_auth_db_duration_seconds', 'Суммарное время запросов к БД за запрос', ['view'],
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    'user_auth_password_hash_duration_seconds', 'Время одного хеширования пароля',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf')),
+)
+PASSWORD_HASH_WAIT_SECONDS = Histogram(
+    'user_auth_password_hash_wait_seconds', 'Ожидание хеширования в очереди пула', ['priority'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf')),
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'user_auth_password_hash_rejected', 'Хеширования, отклоненные с 503: нет слота, истекло ожидание или упал процесс пула',
+    ['priority', 'reason'],
+)
+RENDER_SECONDS = Histogram(
+    'user_auth_render_duration_seconds', 'Время сериализации ответа в JSON', ['view'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, float('inf')),
+)
+
+TASK_QUEUE_SECONDS = Histogram(
+    'user_auth_task_queue_seconds', 'Ожидание задачи celery: от отправки (или eta) до начала выполнения', ['task'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0, 300.0, float('inf')),
+)
+TASK_SECONDS = Histogram(
+    'user_auth_task_duration_seconds', 'Время выполнения задачи celery', ['task', 'state'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0, float('inf')),
+)
+TASK_RETRIES = Counter(
+    'user_auth_task_retries', 'Повторы задач celery', ['task'],
+)
+
+AUDIT_EVENTS = Counter(
+    'user_auth_audit_events', 'События аудита: записаны пачкой или потеряны', ['outcome'],
+)
+
+
+class QueryTimer:
+    # execute_wrapper: считает запросы и их время, не трогая сами запросы
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += perf_counter() - started
+
+
+def view_label(request) -> str:
+    # Имя маршрута, а не путь: число меток не растет от id в URL
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = perf_counter()
+        queries = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        self.observe(request, response, perf_counter() - started)
+
+        view = view_label(request)
+        DB_QUERIES.labels(view).observe(queries.count)
+        DB_SECONDS.labels(view).observe(queries.seconds)
+        return response
+
+    async def __acall__(self, request):
+        # async ORM выполняет запросы в другом потоке со своим соединением,
+        # поэтому для async views пишем только время запроса
+        started = perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, perf_counter() - started)
+        return response
+
+    def observe(self, request, response, seconds: float) -> None:
+        REQUEST_SECONDS.labels(view_label(request), request.method, response.status_code).observe(seconds)
+
+
+def _allowed(request) -> bool:
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(net) for net in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def collect_registry():
+    # Все процессы сразу, если они пишут в PROMETHEUS_MULTIPROC_DIR, иначе только текущий
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    # Внутренний эндпоинт: только из разрешенных сетей, снаружи закрыт в nginx
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(collect_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:22
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Поиск по префиксу (LIKE 'abc%') в postgres использует индекс только с *_pattern_ops,
+# если база не в локали C. В sqlite таких классов операторов нет
+PREFIX_INDEXES = [
+    ("users_user_email_prefix_idx", "email"),
+    ("users_user_name_prefix_idx", "name"),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "users_user" (LOWER("{column}") text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0005_email_outbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                name="users_user_email_lower_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["created_at", "id"], name="users_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["is_active", "created_at", "id"],
+                name="users_user_active_created_idx",
+            ),
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+# Очистка по сроку и выборки за период идут по created_at. Таблица только дописывается,
+# поэтому в postgres хватает компактного BRIN вместо B-tree на каждую строку
+def create_created_at_index(apps, schema_editor):
+    method = "USING brin " if schema_editor.connection.vendor == "postgresql" else ""
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS "users_authevent_created_idx" ON "users_authevent" {method}("created_at")'
+    )
+
+
+def drop_created_at_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS "users_authevent_created_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_user_directory_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        choices=[
+                            ("login", "Login"),
+                            ("login_failed", "Failed login"),
+                            ("password_changed", "Password changed"),
+                            ("profile_updated", "Profile updated"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("user_id", models.BigIntegerField(blank=True, null=True)),
+                ("email", models.CharField(blank=True, default="", max_length=254)),
+                ("ip", models.GenericIPAddressField(blank=True, null=True)),
+                (
+                    "user_agent",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("data", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user_id", "created_at"],
+                        name="users_authevent_user_idx",
+                    ),
+                    models.Index(
+                        fields=["event_type", "created_at"],
+                        name="users_authevent_type_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(create_created_at_index, drop_created_at_index),
+    ]
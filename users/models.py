@@ -1,22 +1,84 @@
 from __future__ import annotations
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
+
+from . import hashing
 
 class UserManager(BaseUserManager):
+    # Только то, что нужно для проверки пароля и claims токена
+    LOGIN_FIELDS = ('id', 'email', 'name', 'password', 'is_active', 'is_staff', 'is_superuser', 'token_generation')
+
     def create_user(self, email: str, password=None, **extra_fields) -> User:
+        return self.create_user_from_hash(email, make_password(password), **extra_fields)
+
+    def create_user_from_hash(self, email: str, password_hash: str, **extra_fields) -> User:
+        # для случаев, когда пароль уже захеширован вне потока запроса
         if not email:
             raise ValueError('The email field must be set')
         email = self.normalize_email(email)
-        user = self.model(email=email, **extra_fields)
-        user.set_password(password)
-        user.save(using=self._db)
+        user = self.model(email=email, password=password_hash, **extra_fields)
+        # пользователь и профиль (post_save) создаются в одной транзакции
+        with transaction.atomic(using=self._db):
+            user.save(using=self._db)
         return user
 
     def create_superuser(self, email: str, password=None, **extra_fields) -> User:
         extra_fields.setdefault("is_staff", True)
         extra_fields.setdefault("is_superuser", True)
         return self.create_user(email, password, **extra_fields)
+
+    def bulk_create_with_profiles(
+        self, users: list[User], profiles: list[dict] | None = None, batch_size: int = 1000
+    ) -> list[User]:
+        # bulk_create не шлет сигналы, поэтому профили создаем сами, тоже пачкой.
+        # profiles - поля профиля в том же порядке, что и users
+        profiles = profiles or [{}] * len(users)
+        with transaction.atomic(using=self._db):
+            users = self.bulk_create(users, batch_size=batch_size)
+            Profile.objects.using(self._db).bulk_create(
+                [Profile(user=user, **fields) for user, fields in zip(users, profiles)],
+                batch_size=batch_size,
+            )
+        return users
+
+    def get_by_credentials(self, email: str, password: str) -> User | None:
+        # Хеширование уходит в пул (users.hashing), без свободного слота - 503
+        try:
+            user = self.only(*self.LOGIN_FIELDS).get(email=self.normalize_email(email))
+        except self.model.DoesNotExist:
+            # Хешируем и на промахе, чтобы время ответа не выдавало существование email
+            hashing.make_password(password)
+            return None
+        if not hashing.check_password(password, user.password) or not user.is_active:
+            return None
+        if self._needs_rehash(user.password):
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user
+
+    async def aget_by_credentials(self, email: str, password: str) -> User | None:
+        # То же, что get_by_credentials, для async views
+        try:
+            user = await self.only(*self.LOGIN_FIELDS).aget(email=self.normalize_email(email))
+        except self.model.DoesNotExist:
+            await hashing.run_hasher(make_password, password)
+            return None
+        if not await hashing.run_hasher(check_password, password, user.password) or not user.is_active:
+            return None
+        if self._needs_rehash(user.password):
+            user.password = await hashing.run_hasher(make_password, password)
+            await user.asave(update_fields=['password'])
+        return user
+
+    @staticmethod
+    def _needs_rehash(encoded: str) -> bool:
+        # то же условие, что у check_password с setter: другой алгоритм или параметры
+        preferred = get_hasher()
+        return identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded)
     
     
 class Profile(models.Model):
@@ -34,6 +96,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)    
     is_active = models.BooleanField(default=True)
     is_staff  = models.BooleanField(default=False)
+    # Растет при "выйти везде" и смене пароля: входит в версию токена, старые токены перестают приниматься
+    token_generation = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -41,6 +105,121 @@ class User(AbstractBaseUser, PermissionsMixin):
     
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
+
+    class Meta:
+        indexes = [
+            # Регистронезависимый поиск по email
+            models.Index(Lower("email"), name="users_user_email_lower_idx"),
+            # Keyset-пагинация справочника (новые первыми), в том числе с фильтром по is_active
+            models.Index(fields=["created_at", "id"], name="users_user_created_idx"),
+            models.Index(fields=["is_active", "created_at", "id"], name="users_user_active_created_idx"),
+        ]
     
     def __str__(self) -> str:
-        return self.email
\ No newline at end of file
+        return self.email
+
+    def set_password(self, raw_password) -> None:
+        # Настоящая смена пароля (changepassword, админка): старые токены перестают действовать
+        super().set_password(raw_password)
+        self.token_generation += 1
+
+    def check_password(self, raw_password) -> bool:
+        # Перехеширование того же пароля с новыми параметрами - не смена пароля, поколение не трогаем
+        def setter(raw_password):
+            self.password = make_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return check_password(raw_password, self.password, setter)
+
+class EmailOutbox(models.Model):
+    # Очередь исходящих писем: запрос только пишет строку, отправкой занимается celery
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_DEAD = "dead"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_DEAD, "Dead"),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.to_email} ({self.status})"
+
+
+class AuthEvent(models.Model):
+    # Журнал аудита входов и изменений учетной записи. Пишется пачками из буфера
+    # (users/audit.py), поэтому без внешнего ключа: строка не ждет пользователя и
+    # переживает его удаление
+    LOGIN = "login"
+    LOGIN_FAILED = "login_failed"
+    PASSWORD_CHANGED = "password_changed"
+    PROFILE_UPDATED = "profile_updated"
+    TYPE_CHOICES = [
+        (LOGIN, "Login"),
+        (LOGIN_FAILED, "Failed login"),
+        (PASSWORD_CHANGED, "Password changed"),
+        (PROFILE_UPDATED, "Profile updated"),
+    ]
+
+    event_type = models.CharField(max_length=32, choices=TYPE_CHOICES)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    email = models.CharField(max_length=254, blank=True, default="")
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True, default="")
+    data = models.JSONField(default=dict, blank=True)
+    # Время события, а не записи: пачка может уйти в БД через несколько секунд
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Индекс по одному created_at (для очистки по сроку) создает миграция 0007:
+        # в postgres это BRIN - таблица только дописывается, время растет вместе с id
+        indexes = [
+            models.Index(fields=["user_id", "created_at"], name="users_authevent_user_idx"),
+            models.Index(fields=["event_type", "created_at"], name="users_authevent_type_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.event_type} {self.user_id or self.email} at {self.created_at}"
+
+
+class UserSession(models.Model):
+    # Устройство: одна строка на вход, обновляется при каждой ротации refresh-токена.
+    # id попадает в токены claim'ом sid. Сессии прошлых поколений (generation меньше
+    # token_generation пользователя) уже недействительны и удаляются задачей purge_sessions
+    id = models.CharField(primary_key=True, max_length=32)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sessions")
+    generation = models.PositiveIntegerField()
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+    # Текущая пара токенов: чтобы завершить одну сессию, их jti отзываются до истечения
+    refresh_jti = models.CharField(max_length=64)
+    expires_at = models.DateTimeField()
+    access_jti = models.CharField(max_length=64)
+    access_expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "expires_at"], name="users_session_user_idx"),
+            models.Index(fields=["expires_at"], name="users_session_expires_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.user_agent or self.ip} ({self.id})"
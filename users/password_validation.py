@@ -0,0 +1,158 @@
+"""
+Проверка пароля по индексу утечек, отображенному в память.
+
+Индекс (manage.py build_password_index) - заголовок и отсортированные 8-байтные префиксы
+SHA-1 паролей. Файл открывается через mmap только на чтение: страницы лежат в page cache
+и общие для всех воркеров, а поиск - бинарный, около log2(n) чтений по 8 байт. В тот же
+формат помещается и список Django (20 тысяч паролей), и выгрузка Have I Been Pwned
+(сотни миллионов SHA-1). Ложное совпадение по префиксу - порядка n / 2**64.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.auth.password_validation import CommonPasswordValidator
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext as _
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'UAPWIDX1'
+HEADER = struct.Struct('>8sQ')
+KEY = struct.Struct('>Q')
+
+
+def password_key(password: str) -> int:
+    return KEY.unpack_from(hashlib.sha1(password.encode()).digest())[0]
+
+
+def sha1_key(sha1_hex: str) -> int:
+    # HIBP отдает SHA-1 в hex, регистр не важен
+    return int(sha1_hex[:16], 16)
+
+
+class PasswordIndex:
+    # Последовательность ключей для bisect: элементы читаются прямо из mmap
+    def __init__(self, path: str):
+        with open(path, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._map) if len(self._map) >= HEADER.size else (None, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + count * KEY.size:
+            self._map.close()
+            raise ValueError(f'{path} is not a password index')
+        self._count = count
+        if hasattr(mmap, 'MADV_RANDOM'):
+            # бинарный поиск читает вразброс, упреждающее чтение только вытесняет кеш
+            self._map.madvise(mmap.MADV_RANDOM)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> int:
+        return KEY.unpack_from(self._map, HEADER.size + position * KEY.size)[0]
+
+    def __contains__(self, key: int) -> bool:
+        position = bisect_left(self, key)
+        return position < self._count and self[position] == key
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_index(keys, path: str) -> int:
+    """
+    Записывает отсортированные ключи (повторы пропускаются) и возвращает их число.
+    Файл подменяется атомарно: процессы со старым индексом дочитывают старый файл.
+    """
+    tmp_path = f'{path}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    count, previous, chunk = 0, None, bytearray()
+    try:
+        with open(tmp_path, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, 0))
+            for key in keys:
+                if key == previous:
+                    continue
+                if previous is not None and key < previous:
+                    raise ValueError('password index keys must be sorted')
+                chunk += KEY.pack(key)
+                count, previous = count + 1, key
+                if len(chunk) >= 1 << 20:
+                    fp.write(chunk)
+                    chunk.clear()
+            fp.write(chunk)
+            fp.seek(0)
+            fp.write(HEADER.pack(MAGIC, count))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def get_index(path: str) -> PasswordIndex | None:
+    """
+    Текущий индекс; вызывать под _lock. Пересобранный индекс - новый файл (os.replace),
+    он подхватывается без перезапуска, а mmap и дескриптор старого закрываются сразу.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns)
+    loaded = _loaded.get(path)
+    if loaded is None or loaded[0] != version:
+        index = PasswordIndex(path)
+        if loaded is not None:
+            loaded[1].close()
+        _loaded[path] = loaded = (version, index)
+    return loaded[1]
+
+
+def index_contains(path: str, keys) -> bool | None:
+    # None - индекса нет. Поиск под той же блокировкой, что и подмена: закрытый
+    # при пересборке mmap уже никто не читает
+    with _lock:
+        index = get_index(path)
+        return None if index is None else any(key in index for key in keys)
+
+
+class BreachedPasswordValidator:
+    """
+    Замена CommonPasswordValidator: пароль не должен быть в индексе PASSWORD_INDEX_PATH.
+    Пока индекс не собран, проверяет по списку Django, как CommonPasswordValidator.
+    """
+
+    def __init__(self):
+        self._fallback = None
+
+    def is_breached(self, password: str) -> bool:
+        # Утечки хранят пароль как есть, список Django - в нижнем регистре
+        keys = (password_key(candidate) for candidate in (password, password.lower().strip()))
+        found = index_contains(settings.PASSWORD_INDEX_PATH, keys)
+        if found is None:
+            if self._fallback is None:
+                logger.warning(
+                    'Password index %s not found, using the Django common password list; '
+                    'run manage.py build_password_index', settings.PASSWORD_INDEX_PATH,
+                )
+                self._fallback = CommonPasswordValidator()
+            return password.lower().strip() in self._fallback.passwords
+        return found
+
+    def validate(self, password: str, user=None) -> None:
+        if self.is_breached(password):
+            raise ValidationError(_('This password is too common.'), code='password_too_common')
+
+    def get_help_text(self) -> str:
+        return _('Your password can’t be a commonly used password.')
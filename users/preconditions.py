@@ -0,0 +1,30 @@
+"""
+Условные запросы к профилю: ETag/Last-Modified по updated_at, 304 и 412.
+Общие для синхронных (users.views) и async (users.async_views) эндпоинтов.
+"""
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Profile was modified by another request.'
+    default_code = 'precondition_failed'
+
+
+def profile_etag(user_id, updated_at) -> str:
+    # Профиль меняется только через save, а auto_now обновляет updated_at при каждом сохранении
+    return f'"{user_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
+def profile_validators(user_id, updated_at) -> dict:
+    return {'etag': profile_etag(user_id, updated_at), 'last_modified': int(updated_at.timestamp())}
+
+
+def set_profile_validators(response, user_id, updated_at) -> None:
+    response['ETag'] = profile_etag(user_id, updated_at)
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    # Клиент может хранить ответ, но каждый раз переспрашивает с If-None-Match
+    patch_cache_control(response, private=True, no_cache=True)
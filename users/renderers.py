@@ -0,0 +1,32 @@
+from time import perf_counter
+
+from rest_framework.renderers import JSONRenderer
+
+from . import fastjson
+from .metrics import RENDER_SECONDS, view_label
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Тот же JSON, что у JSONRenderer, но через быстрый бэкенд (users.fastjson)
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # С отступами (браузерный API, "; indent=" в Accept) и на stdlib - обычный путь DRF
+        indent = self.get_indent(accepted_media_type or '', renderer_context or {})
+        if indent or fastjson.backend_name() == 'json':
+            return super().render(data, accepted_media_type, renderer_context)
+        return fastjson.dumps(data)
+
+
+class TimedJSONRenderer(FastJSONRenderer):
+    # Плюс время сериализации ответа в метриках
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        if request is None:
+            # рендер по частям (users.views.stream_batch): время за весь ответ пишет вызывающий
+            return super().render(data, accepted_media_type, renderer_context)
+        started = perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            RENDER_SECONDS.labels(view_label(request)).observe(perf_counter() - started)
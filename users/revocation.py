@@ -0,0 +1,69 @@
+"""
+Список отозванных токенов по jti.
+
+Запись живет в кеше ровно до истечения самого токена, поэтому список не растет:
+после exp токен и так не пройдет проверку подписи/срока. Проверка - один get по ключу.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections, router
+from django.utils import timezone
+
+from rest_framework_simplejwt.settings import api_settings
+
+
+def _cache():
+    # Должен быть общим для всех воркеров, иначе отзыв увидит только один процесс
+    return caches[settings.TOKEN_REVOCATION_CACHE_ALIAS]
+
+
+def _revoked_key(jti) -> str:
+    return f'users:revoked:{jti}'
+
+
+def token_expires_at(token) -> datetime:
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+def _ttl(expires_at: datetime) -> int:
+    return max(int((expires_at - timezone.now()).total_seconds()) + 1, 1)
+
+
+def revoke(token) -> bool:
+    # cache.add атомарен: False значит, что токен уже был отозван (например, повторный refresh)
+    return revoke_jti(token[api_settings.JTI_CLAIM], token_expires_at(token))
+
+
+def revoke_jti(jti: str, expires_at: datetime) -> bool:
+    # Когда самого токена нет, только его jti и срок (завершение сессии по users.sessions)
+    return _cache().add(_revoked_key(jti), 1, _ttl(expires_at))
+
+
+def is_revoked(token) -> bool:
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and _cache().get(_revoked_key(jti)) is not None
+
+
+async def ais_revoked(token) -> bool:
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and await _cache().aget(_revoked_key(jti)) is not None
+
+
+def purge_expired() -> int:
+    # redis и memcached удаляют записи по TTL сами. DatabaseCache чистит таблицу
+    # только при переполнении, поэтому истекшие строки удаляем явно
+    store = _cache()
+    if not isinstance(store, DatabaseCache):
+        return 0
+    db = router.db_for_write(store.cache_model_class)
+    connection = connections[db]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(store._table)} WHERE {quote_name("expires")} < %s',
+            [connection.ops.adapt_datetimefield_value(timezone.now().replace(microsecond=0))],
+        )
+        return cursor.rowcount
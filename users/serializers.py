@@ -1,10 +1,23 @@
+import base64
+import binascii
+
+from django.conf import settings
 from rest_framework import serializers
+from rest_framework.fields import SkipField
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import AbstractUser
-from .models import Profile
+from . import hashing
+from .models import Profile, UserSession
 from django.contrib.auth.password_validation import validate_password
-from .tasks import send_registration_email
+from django.db import transaction
+from .tasks import queue_registration_email
+from .revocation import revoke
+from .sessions import forget_session, rotate_session, start_session
+from .tokens import AUTH_VERSION_CLAIM, CLAIM_FIELDS, SESSION_CLAIM, UserRefreshToken, auth_version, set_user_claims
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
 
 User = get_user_model()
 
@@ -20,13 +33,19 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['email', 'name', 'password', "created_at", "updated_at"]
         extra_kwargs = {'password': {'write_only': True, 'validators': [validate_password]}}
 
+    @transaction.atomic
     def create(self, validated_data: dict) -> AbstractUser:
-        user = User.objects.create_user(
+        # асинхронная регистрация передает хеш, посчитанный в пуле хеширования
+        password_hash = self.context.get('password_hash') or hashing.make_password(
+            validated_data['password'], priority=hashing.LOW
+        )
+        user = User.objects.create_user_from_hash(
             email=validated_data['email'],
             name=validated_data['name'],
-            password=validated_data['password']
+            password_hash=password_hash
         )
-        send_registration_email(validated_data['email'])
+        # Письмо уходит через outbox, SMTP в запросе не трогаем
+        queue_registration_email(user.email)
         return user
 
 class LoginSerializer(serializers.Serializer):
@@ -36,20 +55,195 @@ class LoginSerializer(serializers.Serializer):
     def validate(self, data: dict) -> None | dict:
         email = data.get('email')
         password = data.get('password')
-        user = User.objects.filter(email=email).first()
-
-        if user and user.check_password(password):
-            refresh = RefreshToken.for_user(user)
-            return {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+        user = User.objects.get_by_credentials(email, password)
+
+        if user:
+            self.user = user
+            # Каждый вход - новое устройство в реестре сессий
+            return start_session(user, self.context.get('request'))
         raise serializers.ValidationError('Invalid credentials')
     
+def _load_refresh(raw_token: str) -> UserRefreshToken:
+    try:
+        return UserRefreshToken(raw_token)
+    except TokenError as exc:
+        raise InvalidToken(exc.args[0])
+
+
+class RefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, data: dict) -> dict:
+        refresh = _load_refresh(data['refresh'])
+        # Claims новой пары собираются из строки в БД, а не копируются из старого токена
+        user = User.objects.only(*CLAIM_FIELDS).filter(pk=refresh[jwt_settings.USER_ID_CLAIM]).first()
+        if user is None or not user.is_active:
+            raise InvalidToken('Token is no longer valid')
+        # Смена пароля, прав или деактивация отзывают и refresh-токены
+        if AUTH_VERSION_CLAIM in refresh and refresh[AUTH_VERSION_CLAIM] != auth_version(user):
+            raise InvalidToken('Token is no longer valid')
+        # Ротация: старый refresh отзываем, повторное использование получит 401
+        if not revoke(refresh):
+            raise InvalidToken('Token has been revoked')
+
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        set_user_claims(refresh, user)
+        return rotate_session(refresh)
+
+
+def _header_access_token(request, user_id) -> AccessToken | None:
+    # Access-токен из заголовка, если он еще действует и выдан тому же пользователю.
+    # Истекший отзывать незачем, и выходу он не мешает: view без аутентификации
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    return token if token.get(jwt_settings.USER_ID_CLAIM) == user_id else None
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, data: dict) -> dict:
+        return {'refresh': _load_refresh(data['refresh'])}
+
+    def save(self, **kwargs) -> None:
+        refresh = self.validated_data['refresh']
+        revoke(refresh)
+        forget_session(refresh)
+        # access-токен текущего запроса тоже перестает приниматься
+        access = _header_access_token(self.context['request'], refresh[jwt_settings.USER_ID_CLAIM])
+        if access is not None:
+            revoke(access)
+
+
+class SessionSerializer(serializers.ModelSerializer):
+    current = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserSession
+        fields = ['id', 'ip', 'user_agent', 'created_at', 'last_seen_at', 'expires_at', 'current']
+
+    def get_current(self, session: UserSession) -> bool:
+        token = self.context['request'].auth
+        return token is not None and token.get(SESSION_CLAIM) == session.pk
+
+
+class SessionRevokeSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, default=list)
+
+    def validate(self, data: dict) -> dict:
+        total = len(data['ids']) + len(data['emails'])
+        if not total:
+            raise serializers.ValidationError('Pass at least one id or email.')
+        if total > settings.SESSION_REVOKE_MAX_USERS:
+            raise serializers.ValidationError(f'At most {settings.SESSION_REVOKE_MAX_USERS} ids and emails per request.')
+        data['emails'] = [User.objects.normalize_email(email) for email in data['emails']]
+        return data
+
+
+def encode_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(str(user_id).encode()).decode()
+
+
+class ProfileBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, default=list)
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_cursor(self, value: str) -> int:
+        # Курсор - последний отданный id, закодированный, чтобы клиент не собирал его сам
+        try:
+            return int(base64.urlsafe_b64decode(value.encode()).decode())
+        except (ValueError, binascii.Error):
+            raise serializers.ValidationError('Invalid cursor.')
+
+    def validate_page_size(self, value: int) -> int:
+        return min(value, settings.PROFILE_BATCH_MAX_PAGE_SIZE)
+
+    def validate(self, data: dict) -> dict:
+        total = len(data['ids']) + len(data['emails'])
+        if not total:
+            raise serializers.ValidationError('Pass at least one id or email.')
+        if total > settings.PROFILE_BATCH_MAX_KEYS:
+            raise serializers.ValidationError(f'At most {settings.PROFILE_BATCH_MAX_KEYS} ids and emails per request.')
+        data['emails'] = [User.objects.normalize_email(email) for email in data['emails']]
+        return data
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ["bio", "phone_number", "profile_picture", "location", "created_at", "updated_at"]
+
+class CompiledRepresentation:
+    """
+    Вывод ModelSerializer только на чтение, без создания сериализатора на каждый объект.
+
+    DRF для каждого экземпляра сериализатора заново строит поля: интроспекция модели
+    и deepcopy объявленных полей. Здесь поля строятся один раз при первом вызове,
+    а на объект остается только get_attribute и to_representation каждого поля.
+    Результат совпадает с dict(Serializer(instance).data).
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._fields = None
+
+    def __call__(self, instance) -> dict:
+        if self._fields is None:
+            self._fields = [
+                (field.field_name, field.get_attribute, field.to_representation)
+                for field in self.serializer_class()._readable_fields
+            ]
+        data = {}
+        for name, get_attribute, to_representation in self._fields:
+            try:
+                value = get_attribute(instance)
+            except SkipField:
+                continue
+            data[name] = None if value is None else to_representation(value)
+        return data
+
+
+represent_user = CompiledRepresentation(UserSerializer)
+represent_profile = CompiledRepresentation(ProfileSerializer)
+
+
+class DirectoryFilterSerializer(serializers.Serializer):
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    is_active = serializers.BooleanField(required=False)
+    email = serializers.CharField(required=False, help_text='Точное совпадение без учета регистра')
+    email_prefix = serializers.CharField(required=False)
+    name_prefix = serializers.CharField(required=False)
+
+    def validate(self, data: dict) -> dict:
+        if 'created_after' in data and 'created_before' in data and data['created_after'] > data['created_before']:
+            raise serializers.ValidationError('created_after must not be later than created_before.')
+        # Поиск идет по lower(...), так что и значения приводим к нижнему регистру
+        for field in ('email', 'email_prefix', 'name_prefix'):
+            if field in data:
+                data[field] = data[field].strip().lower()
+        return data
+
+
+class DirectoryUserSerializer(serializers.ModelSerializer):
+    profile = ProfileSerializer(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'name', 'is_active', 'created_at', 'profile']
+
         
 class UpdateProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,12 +256,17 @@ class ChangePasswordSerializer(serializers.Serializer):
 
     def validate_old_password(self, value: str) -> str:
         user: AbstractUser = self.context['request'].user
-        if not user.check_password(value):
+        # Смена пароля - у уже вошедшего пользователя, в пуле хеширования у нее высший приоритет
+        if not hashing.check_password(value, user.password, priority=hashing.HIGH):
             raise serializers.ValidationError('Old password is incorrect.')
         return value
 
     def save(self, **kwargs) -> AbstractUser:
         user = self.context['request'].user
-        user.set_password(self.validated_data['new_password'])
-        user.save()
+        # у ClaimsUser из токена пароль меняется у загруженной модели
+        instance = getattr(user, 'instance', user)
+        instance.password = hashing.make_password(self.validated_data['new_password'], priority=hashing.HIGH)
+        # Новое поколение: старые токены и сессии на других устройствах больше не действуют
+        instance.token_generation += 1
+        instance.save()
         return user
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Реестр устройств пользователя и "выйти везде".
+
+Каждый вход создает строку UserSession, ее id едет в токенах claim'ом sid. Действительность
+токенов определяет не реестр, а поколение пользователя (User.token_generation), которое входит
+в версию токена: его проверка при аутентификации - тот же один get из кеша, что и раньше.
+Поэтому "выйти везде" для любого числа пользователей - один UPDATE поколения и удаление
+версий из кеша, а строки сессий прошлых поколений просто перестают показываться в списке.
+"""
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .audit import client_ip, user_agent
+from .models import User, UserSession
+from .revocation import revoke_jti, token_expires_at
+from .tokens import SESSION_CLAIM, UserRefreshToken, forget_auth_versions
+
+
+def _issue(user, request) -> tuple[dict, UserSession]:
+    refresh = UserRefreshToken.for_user(user)
+    refresh[SESSION_CLAIM] = uuid.uuid4().hex
+    access = refresh.access_token
+    session = UserSession(
+        id=refresh[SESSION_CLAIM],
+        user_id=user.pk,
+        generation=user.token_generation,
+        ip=client_ip(request) if request is not None else None,
+        user_agent=user_agent(request) if request is not None else '',
+        **_token_fields(refresh, access),
+    )
+    return {'refresh': str(refresh), 'access': str(access)}, session
+
+
+def _token_fields(refresh, access) -> dict:
+    return {
+        'refresh_jti': refresh[jwt_settings.JTI_CLAIM],
+        'expires_at': token_expires_at(refresh),
+        'access_jti': access[jwt_settings.JTI_CLAIM],
+        'access_expires_at': token_expires_at(access),
+    }
+
+
+def start_session(user, request=None) -> dict:
+    # Пара токенов для входа и строка устройства для нее
+    tokens, session = _issue(user, request)
+    session.save(force_insert=True)
+    return tokens
+
+
+async def astart_session(user, request=None) -> dict:
+    tokens, session = _issue(user, request)
+    await session.asave(force_insert=True)
+    return tokens
+
+
+def rotate_session(refresh) -> dict:
+    # Новая пара для того же устройства; refresh уже с новыми jti и exp
+    access = refresh.access_token
+    if SESSION_CLAIM in refresh:
+        UserSession.objects.filter(pk=refresh[SESSION_CLAIM]).update(
+            last_seen_at=timezone.now(), **_token_fields(refresh, access)
+        )
+    return {'refresh': str(refresh), 'access': str(access)}
+
+
+def forget_session(token) -> None:
+    # Выход с устройства: его токены отзываются отдельно (LogoutSerializer)
+    if SESSION_CLAIM in token:
+        UserSession.objects.filter(pk=token[SESSION_CLAIM]).delete()
+
+
+def active_sessions(user_id):
+    # Одним запросом: сессии прошлых поколений отсекает сравнение с поколением пользователя
+    return (
+        UserSession.objects.filter(user_id=user_id, expires_at__gt=timezone.now())
+        .filter(generation=F('user__token_generation'))
+        .order_by('-last_seen_at')
+    )
+
+
+def end_session(session: UserSession) -> None:
+    # Одно устройство: его текущие токены отзываются до истечения, остальные не трогаем
+    revoke_jti(session.refresh_jti, session.expires_at)
+    revoke_jti(session.access_jti, session.access_expires_at)
+    session.delete()
+
+
+def log_out_everywhere(user_ids=(), emails=()) -> int:
+    """
+    Все токены и сессии пользователей становятся недействительными.
+    Пачками по SESSION_REVOKE_BATCH_SIZE: UPDATE поколения и delete_many версий в кеше.
+    """
+    ids = list(
+        User.objects.filter(Q(pk__in=list(user_ids)) | Q(email__in=list(emails)))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    batch_size = settings.SESSION_REVOKE_BATCH_SIZE
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        User.objects.filter(pk__in=batch).update(token_generation=F('token_generation') + 1)
+        # После коммита: иначе параллельный запрос успел бы закешировать старую версию
+        transaction.on_commit(partial(forget_auth_versions, batch))
+    return len(ids)
+
+
+def purge_sessions(batch_size: int) -> int:
+    # Истекшие сессии и сессии прошлых поколений, порциями по id
+    stale = Q(expires_at__lt=timezone.now()) | Q(generation__lt=F('user__token_generation'))
+    deleted = 0
+    while True:
+        ids = list(UserSession.objects.filter(stale).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += UserSession.objects.filter(pk__in=ids).delete()[0]
@@ -1,13 +1,28 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from .models import Profile
+from .tokens import cache_auth_version, forget_auth_version
+from .cache import invalidate_profile
 
+# Профиль не зависит от полей пользователя, поэтому трогаем его только при создании.
+# Смена пароля, last_login и правки в админке профиль больше не обновляют
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
         Profile.objects.create(user=instance)
-        
+
+# Версия для StatelessJWTAuthentication: обновляем сразу, не дожидаясь истечения кеша
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def update_auth_version(sender, instance, **kwargs):
+    cache_auth_version(instance)
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def delete_auth_version(sender, instance, **kwargs):
+    forget_auth_version(instance.pk)
+
+# Кеш профиля сбрасываем при любом сохранении/удалении профиля
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
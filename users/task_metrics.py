@@ -0,0 +1,62 @@
+"""
+Телеметрия задач celery: ожидание в очереди, время выполнения и повторы (users.metrics).
+
+Приемники сигналов celery подключаются при импорте модуля в UsersConfig.ready, отдельно от
+сигналов моделей. Отдельный воркер сам отдает метрики на CELERY_METRICS_PORT.
+"""
+import time
+from datetime import datetime
+
+from celery.signals import before_task_publish, task_postrun, task_prerun, task_retry, worker_ready
+from django.conf import settings
+from prometheus_client import start_http_server
+
+from .metrics import TASK_QUEUE_SECONDS, TASK_RETRIES, TASK_SECONDS, collect_registry
+
+# Время отправки едет в заголовке сообщения, поэтому ожидание в очереди
+# считается и между процессами (часы узлов должны совпадать)
+ENQUEUED_AT_HEADER = 'enqueued_at'
+_task_started = {}
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    # Перезаписываем: повтор задачи копирует заголовки исходного сообщения
+    if headers is not None:
+        headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+def _ready_at(request):
+    # Задача с eta (повтор с countdown) раньше срока не начнется, это не ожидание в очереди
+    ready_at = getattr(request, ENQUEUED_AT_HEADER, None)
+    if ready_at is not None and request.eta:
+        eta = request.eta if isinstance(request.eta, datetime) else datetime.fromisoformat(request.eta)
+        ready_at = max(ready_at, eta.timestamp())
+    return ready_at
+
+
+@task_prerun.connect
+def observe_task_start(task_id=None, task=None, **kwargs):
+    ready_at = _ready_at(task.request)
+    if ready_at is not None:
+        TASK_QUEUE_SECONDS.labels(task.name).observe(max(time.time() - ready_at, 0.0))
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task_end(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+@worker_ready.connect
+def serve_task_metrics(**kwargs):
+    # Только отдельный воркер: встроенный (CELERY_MODE=thread) пишет в /metrics веб-процесса
+    if settings.CELERY_METRICS_PORT and settings.CELERY_MODE == 'broker':
+        start_http_server(settings.CELERY_METRICS_PORT, registry=collect_registry())
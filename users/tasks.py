@@ -1,14 +1,151 @@
 # tasks.py
+import logging
+from datetime import timedelta
+
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import revocation, sessions
+from .audit import write_events
+from .models import AuthEvent, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+REGISTRATION_SUBJECT = 'Welcome!'
+REGISTRATION_BODY = 'Thank you for registering on our platform.'
+
+
+def queue_email(to_email: str, subject: str, body: str) -> EmailOutbox:
+    # Пишем письмо в outbox в текущей транзакции, воркер будится после коммита
+    message = EmailOutbox.objects.create(to_email=to_email, subject=subject, body=body)
+    transaction.on_commit(_kick_outbox)
+    return message
+
+
+def queue_registration_email(user_email: str) -> EmailOutbox:
+    return queue_email(user_email, REGISTRATION_SUBJECT, REGISTRATION_BODY)
+
+
+def _kick_outbox() -> None:
+    # Брокер недоступен - не страшно, письмо подберет периодический drain из beat.
+    # retry=False: не держим запрос, пока celery переподключается к брокеру
+    try:
+        drain_email_outbox.apply_async(retry=False)
+    except Exception:
+        logger.warning('Could not enqueue drain_email_outbox, leaving it to beat', exc_info=True)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    base = settings.EMAIL_OUTBOX_RETRY_BACKOFF
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_RETRY_BACKOFF_MAX))
+
+
+def _claim_batch(batch_size: int) -> list[EmailOutbox]:
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        # Аренда: если воркер упадет посреди отправки, письма снова станут доступны
+        EmailOutbox.objects.filter(pk__in=[m.pk for m in batch]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return batch
+
+
+def _mark_failed(message: EmailOutbox, error: Exception, now) -> None:
+    message.attempts += 1
+    message.last_error = repr(error)
+    if message.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        message.status = EmailOutbox.STATUS_DEAD
+        logger.error('Email %s to %s moved to dead letter: %r', message.pk, message.to_email, error)
+    else:
+        message.next_attempt_at = now + _retry_delay(message.attempts)
+
+
+@shared_task
+def drain_email_outbox(batch_size=None):
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    sent = 0
+    now = timezone.now()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for message in batch:
+            _mark_failed(message, exc, now)
+    else:
+        # Одно SMTP-соединение на весь батч, но статус ведем по каждому письму
+        try:
+            for message in batch:
+                email = EmailMessage(
+                    message.subject,
+                    message.body,
+                    settings.DEFAULT_FROM_EMAIL,
+                    [message.to_email],
+                    connection=connection,
+                )
+                try:
+                    connection.send_messages([email])
+                except Exception as exc:
+                    _mark_failed(message, exc, now)
+                else:
+                    message.status = EmailOutbox.STATUS_SENT
+                    message.sent_at = timezone.now()
+                    sent += 1
+        finally:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(
+        batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+    # Остались еще письма - сразу берем следующий батч
+    if len(batch) == batch_size:
+        _kick_outbox()
+    return sent
+
 
 @shared_task
 def send_registration_email(user_email):
-    send_mail(
-        'Welcome!',
-        'Thank you for registering on our platform.',
-        settings.DEFAULT_FROM_EMAIL,
-        [user_email],
-        fail_silently=False,
-    )
\ No newline at end of file
+    queue_registration_email(user_email)
+
+
+@shared_task
+def purge_revoked_tokens():
+    return revocation.purge_expired()
+
+
+@shared_task
+def write_audit_events(events):
+    # Пачка из буфера аудита при AUDIT_FLUSH_MODE=celery
+    write_events(events)
+    return len(events)
+
+
+@shared_task
+def purge_audit_events(batch_size=None):
+    # Удаляем порциями по id, чтобы не держать одну долгую транзакцию на всю таблицу
+    batch_size = batch_size or settings.AUDIT_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.AUDIT_RETENTION_DAYS)
+    deleted = 0
+    while True:
+        ids = list(
+            AuthEvent.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += AuthEvent.objects.filter(pk__in=ids).delete()[0]
+
+
+@shared_task
+def purge_sessions(batch_size=None):
+    return sessions.purge_sessions(batch_size or settings.SESSION_PURGE_BATCH_SIZE)
@@ -1,12 +1,80 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from functools import partial
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from asgiref.sync import sync_to_async
+from celery.signals import before_task_publish, task_retry
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
+from prometheus_client import REGISTRY
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from benchmarks.tasks import ping
+from user_auth.celery import app as celery_app, start_local_worker, stop_local_worker
+from user_auth.sentry import SamplingPolicy, parse_route_rates
+from . import audit, checks, hashing
+from .management.commands.startup_profile import parse_importtime
+from .models import AuthEvent, EmailOutbox, Profile, UserSession
+from . import password_validation
+from .password_validation import BreachedPasswordValidator, password_key
+from .renderers import FastJSONRenderer
+from .serializers import ProfileSerializer, UserSerializer, represent_profile, represent_user
+from . import tasks
+from .tasks import drain_email_outbox, purge_audit_events, purge_sessions, send_registration_email
+from .tokens import UserRefreshToken, auth_version
+from .throttling import SharedAnonRateThrottle
 
 User = get_user_model()
 
+# Аудит в тестах без фонового потока: события копятся в буфере и пишутся явным flush()
+_audit_settings = override_settings(AUDIT_FLUSH_MODE='sync', AUDIT_FLUSH_INTERVAL=3600)
+
+
+# Индекс паролей собирается один раз во временный каталог
+_password_index_dir = tempfile.TemporaryDirectory()
+_password_index_settings = override_settings(
+    PASSWORD_INDEX_PATH=os.path.join(_password_index_dir.name, 'passwords.idx'),
+)
+
+
+def setUpModule():
+    _audit_settings.enable()
+    # Задачи уходят в брокер в памяти (как CELERY_MODE=memory), redis тестам не нужен
+    celery_app.conf.update(
+        CELERY_BROKER_URL='memory://', CELERY_RESULT_BACKEND='cache+memory://',
+        CELERY_BROKER_TRANSPORT_OPTIONS={'polling_interval': 0.01},
+    )
+    _password_index_settings.enable()
+    call_command('build_password_index', stdout=StringIO())
+
+
+def tearDownModule():
+    # иначе atexit допишет остаток буфера уже в настоящую БД
+    audit.buffer.clear()
+    _audit_settings.disable()
+    _password_index_settings.disable()
+    _password_index_dir.cleanup()
+
 class UserRegistrationTest(APITestCase):
     def test_registration(self):
         url = reverse('register')
@@ -20,6 +88,21 @@ class UserRegistrationTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(User.objects.count(), 1)
         self.assertEqual(User.objects.get().email, 'testuser@example.com')
+
+    def test_registration_queues_email(self):
+        url = reverse('register')
+        data = {
+            'email': 'testuser@example.com',
+            'name': 'Test User',
+            'password': 'TestPassword123'
+        }
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(EmailOutbox.objects.get().to_email, 'testuser@example.com')
  
 class UserLoginTest(APITestCase):
     def setUp(self):
@@ -40,6 +123,88 @@ class UserLoginTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
         self.assertIn('refresh', response.data)
+
+    def test_login_is_single_query(self):
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'TestPassword123'
+        }
+        # один SELECT пользователя и запись устройства в реестр сессий
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('FROM "users_user"', queries[0]['sql'])
+        self.assertTrue(queries[1]['sql'].startswith('INSERT INTO "users_usersession"'))
+
+    def test_unknown_email_still_hashes(self):
+        data = {
+            'email': 'nobody@example.com',
+            'password': 'TestPassword123'
+        }
+        with mock.patch('users.hashing.make_password', wraps=hashing.make_password) as make_password:
+            response = self.client.post(reverse('login'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        make_password.assert_called_once_with('TestPassword123')
+
+    def test_inactive_user_cannot_login(self):
+        self.user.is_active = False
+        self.user.save()
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'TestPassword123'
+        }
+        response = self.client.post(reverse('login'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_password_rehashed_when_cost_changes(self):
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'TestPassword123'
+        }
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password('TestPassword123')
+            self.user.save()
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = self.client.post(reverse('login'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_rehash_keeps_existing_tokens(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password('TestPassword123')
+            self.user.save()
+        other_device = UserRefreshToken.for_user(self.user)
+        data = {'email': 'testuser@example.com', 'password': 'TestPassword123'}
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.client.post(reverse('login'), data, format='json').status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+        # тот же пароль с новыми параметрами: токены других устройств остаются в силе
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {other_device.access_token}')
+        self.assertEqual(self.client.get(reverse('profile-detail')).status_code, status.HTTP_200_OK)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(other_device)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_django_rehash_keeps_generation(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password('TestPassword123')
+            self.user.save()
+        generation = self.user.token_generation
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertTrue(self.user.check_password('TestPassword123'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertEqual(self.user.token_generation, generation)
     
 class JWTTest(APITestCase):
     def setUp(self):
@@ -64,6 +229,134 @@ class JWTTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         
+class StatelessJWTTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='OldPassword123'
+        )
+        self.refresh = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_profile_read_skips_user_select(self):
+        url = reverse('profile-detail')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'FROM "users_user"' in q['sql']])
+
+    def test_password_change_invalidates_token(self):
+        data = {
+            'old_password': 'OldPassword123',
+            'new_password': 'NewPassword456'
+        }
+        response = self.client.put(reverse('change-password'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('profile-detail'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_new_token_accepted_with_stale_cached_version(self):
+        # другой воркер мог закешировать версию до смены пароля
+        stale_version = auth_version(self.user)
+        self.user.set_password('NewPassword456')
+        self.user.save()
+        cache.set(f'users:auth_version:{self.user.pk}', stale_version)
+
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(reverse('profile-detail'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_token_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse('profile-detail'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class TokenRefreshTest(APITestCase):
+    def setUp(self):
+        # refresh и logout анонимные - не упираемся в общий счетчик троттлинга
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='TestPassword123'
+        )
+        self.refresh = UserRefreshToken.for_user(self.user)
+
+    def test_refresh_rotates_token(self):
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], str(self.refresh))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('profile-detail')).status_code, status.HTTP_200_OK)
+
+        # старый refresh после ротации уже отозван
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_access_and_refresh(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get(reverse('profile-detail')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_with_expired_access_token(self):
+        access = self.refresh.access_token
+        access.set_exp(lifetime=-timedelta(seconds=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_demoted_staff_loses_admin_endpoints(self):
+        self.user.is_staff = True
+        self.user.save()
+        staff = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {staff.access_token}')
+        self.assertEqual(self.client.post(reverse('profile-batch'), {'ids': [self.user.pk]}, format='json').status_code, status.HTTP_200_OK)
+
+        self.user.is_staff = False
+        self.user.save()
+        # токен со старыми правами больше не принимается и не обновляется
+        self.assertEqual(self.client.post(reverse('profile-batch'), {'ids': [self.user.pk]}, format='json').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(staff)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(self.user).access_token}')
+        for name in ('profile-batch', 'session-revoke'):
+            response = self.client.post(reverse(name), {'ids': [self.user.pk]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse('user-directory')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh_rebuilds_claims_from_db(self):
+        User.objects.filter(pk=self.user.pk).update(name='Renamed')
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(UserRefreshToken(response.data['refresh'])['name'], 'Renamed')
+        self.assertEqual(AccessToken(response.data['access'])['name'], 'Renamed')
+
+    def test_password_change_invalidates_refresh(self):
+        self.user.set_password('NewPassword456')
+        self.user.save()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
 class UserProfileTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -99,6 +392,186 @@ class UserProfileTest(APITestCase):
         self.assertEqual(response.data['bio'], 'Updated bio')
         self.assertEqual(response.data['phone_number'], '+1234567890')
         
+class ProfileCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='TestPassword123'
+        )
+        self.refresh = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_cached_profile_read_hits_no_database(self):
+        url = reverse('profile-detail')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('bio', response.data)
+
+    @override_settings(PROFILE_CACHE_ALIAS='local')
+    def test_update_invalidates_cached_profile(self):
+        url = reverse('profile-detail')
+        self.client.get(url)
+        self.client.patch(reverse('profile-update'), {'bio': 'Updated bio'}, format='json')
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['bio'], 'Updated bio')
+
+    def test_profile_save_invalidates_cached_profile(self):
+        url = reverse('profile-detail')
+        self.client.get(url)
+        self.user.profile.location = 'Krasnoyarsk'
+        self.user.profile.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['location'], 'Krasnoyarsk')
+
+class ConditionalProfileTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='TestPassword123'
+        )
+        refresh = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_not_modified_without_loading_profile(self):
+        response = self.client.get(reverse('profile-detail'))
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile-detail'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(reverse('profile-update'), {'bio': 'New bio'}, format='json')
+        response = self.client.get(reverse('profile-detail'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_match_rejects_lost_update(self):
+        etag = self.client.get(reverse('profile-detail'))['ETag']
+        response = self.client.patch(reverse('profile-update'), {'bio': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(reverse('profile-update'), {'bio': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Profile.objects.get(user=self.user).bio, 'First')
+
+class ProfileBatchTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.users = [
+            User.objects.create_user(email=f'user{i}@example.com', name=f'User {i}', password='TestPassword123')
+            for i in range(3)
+        ]
+        staff = User.objects.create_user(
+            email='service@example.com', name='Service', password='TestPassword123', is_staff=True
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(staff).access_token}')
+        self.url = reverse('profile-batch')
+
+    def test_ids_and_emails_in_one_response(self):
+        data = {'ids': [self.users[0].pk, 999999], 'emails': ['user2@EXAMPLE.com', 'missing@example.com']}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.users[0].pk, self.users[2].pk])
+        self.assertIn('bio', response.data['results'][0]['profile'])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_cached_profiles_need_only_the_user_query(self):
+        data = {'ids': [user.pk for user in self.users]}
+        self.client.post(self.url, data, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_cursor_pagination(self):
+        data = {'ids': [user.pk for user in self.users], 'page_size': 2}
+        first = self.client.post(self.url, data, format='json').data
+        second = self.client.post(self.url, {**data, 'cursor': first['next_cursor']}, format='json').data
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, [user.pk for user in self.users])
+        self.assertIsNone(second['next_cursor'])
+
+    @override_settings(PROFILE_BATCH_STREAM_THRESHOLD=1)
+    def test_large_batch_is_streamed(self):
+        Profile.objects.filter(user=self.users[0]).update(bio='Streamed')
+        # пользователи с профилями - одним запросом, без кеша профилей
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'ids': [user.pk for user in self.users]}, format='json')
+        self.assertTrue(response.streaming)
+        # элементы рендерит тот же рендерер, что и обычные ответы (DEFAULT_RENDERER_CLASSES)
+        with mock.patch.object(FastJSONRenderer, 'render', autospec=True, side_effect=FastJSONRenderer.render) as render:
+            body = b''.join(response.streaming_content)
+        self.assertEqual(render.call_count, 3)
+        results = json.loads(body)['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['profile']['bio'], 'Streamed')
+        self.assertEqual(results[0]['email'], self.users[0].email)
+
+    def test_staff_only(self):
+        token = UserRefreshToken.for_user(self.users[0]).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(self.url, {'ids': [self.users[1].pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class UserDirectoryTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.staff = User.objects.create_user(
+            email='admin@example.com', name='Admin', password='TestPassword123', is_staff=True, is_superuser=True
+        )
+        self.alice = User.objects.create_user(email='Alice@example.com', name='Alice', password='TestPassword123')
+        self.bob = User.objects.create_user(email='bob@example.com', name='Bob', password='TestPassword123', is_active=False)
+        User.objects.filter(pk=self.alice.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(self.staff).access_token}')
+        self.url = reverse('user-directory')
+
+    def emails(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [item['email'] for item in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.emails({'email_prefix': 'ALI'}), ['Alice@example.com'])
+        self.assertEqual(self.emails({'email': 'alice@EXAMPLE.com'}), ['Alice@example.com'])
+        self.assertEqual(self.emails({'name_prefix': 'b'}), ['bob@example.com'])
+        self.assertEqual(self.emails({'is_active': 'false'}), ['bob@example.com'])
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.emails({'created_after': since}), ['bob@example.com', 'admin@example.com'])
+        self.assertEqual(self.emails({'created_before': since}), ['Alice@example.com'])
+
+    def test_cursor_pages_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url, {'page_size': 2}).data
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+        self.assertEqual(len(first['results']), 2)
+        self.assertIn('profile', first['results'][0])
+        second = self.client.get(first['next']).data
+        self.assertEqual([item['email'] for item in second['results']], ['Alice@example.com'])
+        self.assertIsNone(second['next'])
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'created_after': '2024-02-01T00:00:00Z', 'created_before': '2024-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(self.alice).access_token}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_changelist_prefix_search(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:users_user_changelist'), {'q': 'ali'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user.email for user in response.context['cl'].result_list], ['Alice@example.com'])
+
+
 class ChangePasswordTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -138,3 +611,813 @@ class ChangePasswordTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('old_password', response.data)
+
+
+class QueryCountTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='OldPassword123'
+        )
+
+    def statements(self, queries):
+        # savepoint-ы появляются из-за транзакции TestCase, их не считаем
+        return [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+
+    def test_register_creates_user_and_profile_together(self):
+        data = {
+            'email': 'newuser@example.com',
+            'name': 'New User',
+            'password': 'TestPassword123'
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = self.statements(queries)
+        # проверка уникальности email, пользователь, профиль, письмо
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(sum('INSERT INTO "users_profile"' in sql for sql in statements), 1)
+
+    def test_change_password_does_not_touch_profile(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(self.user).access_token}')
+        data = {
+            'old_password': 'OldPassword123',
+            'new_password': 'NewPassword456'
+        }
+        with self.assertNumQueries(2):
+            response = self.client.put(reverse('change-password'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_login_rehash_does_not_touch_profile(self):
+        data = {
+            'email': 'testuser@example.com',
+            'password': 'OldPassword123'
+        }
+        # SELECT, UPDATE пароля и запись сессии - профиль не трогается
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            with self.assertNumQueries(3):
+                response = self.client.post(reverse('login'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_create_with_profiles(self):
+        users = [User(email=f'bulk{i}@example.com', name='Bulk') for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.bulk_create_with_profiles(users)
+
+        self.assertEqual(len(self.statements(queries)), 2)
+        self.assertEqual(User.objects.filter(profile__isnull=False, email__startswith='bulk').count(), 5)
+
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        for i in range(3):
+            EmailOutbox.objects.create(to_email=f'user{i}@example.com', subject='Welcome!', body='Hi')
+
+    def test_drain_sends_batch(self):
+        sent = drain_email_outbox(batch_size=10)
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_emails_are_retried_then_dead_lettered(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            drain_email_outbox(batch_size=10)
+            message = EmailOutbox.objects.first()
+            self.assertEqual(message.status, EmailOutbox.STATUS_PENDING)
+            self.assertEqual(message.attempts, 1)
+
+            # повторная попытка только после backoff
+            self.assertEqual(drain_email_outbox(batch_size=10), 0)
+            EmailOutbox.objects.update(next_attempt_at=message.created_at)
+            with self.assertLogs('users.tasks', 'ERROR'):
+                drain_email_outbox(batch_size=10)
+
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_DEAD).count(), 3)
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='TestPassword123'
+        )
+        refresh = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def test_profile_request_is_recorded(self):
+        self.client.get(reverse('profile-detail'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('user_auth_request_duration_seconds_count{method="GET",status="200",view="profile-detail"}', body)
+        self.assertIn('user_auth_db_queries_per_request_count{view="profile-detail"}', body)
+        self.assertIn('user_auth_render_duration_seconds_count{view="profile-detail"}', body)
+        self.assertIn('user_auth_password_hash_duration_seconds_count', body)
+
+    def test_login_records_password_hash_time(self):
+        # Пул процессов по умолчанию: время хеширования пишет веб-процесс, а не процесс пула
+        self.assertEqual(settings.PASSWORD_HASH_POOL, 'process')
+        name = 'user_auth_password_hash_duration_seconds_count'
+        before = REGISTRY.get_sample_value(name) or 0
+        response = self.client.post(
+            reverse('login'), {'email': 'testuser@example.com', 'password': 'TestPassword123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # callback пула может выполниться чуть позже, чем ответ получил результат
+        deadline = time.monotonic() + 5
+        while (REGISTRY.get_sample_value(name) or 0) == before and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(REGISTRY.get_sample_value(name), before)
+
+    def test_metrics_closed_for_external_clients(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class SentrySamplingTest(TestCase):
+    def setUp(self):
+        self.policy = SamplingPolicy(0.2, 0.1, {
+            '/api/users/': (0.5, 0.1),
+            '/api/users/login/': (0.01, 0.0),
+            '/swagger/': (0.0, 0.0),
+        })
+
+    def context(self, path, **extra):
+        return {'wsgi_environ': {'PATH_INFO': path}, **extra}
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self.policy.traces_sampler(self.context('/api/users/login/')), 0.01)
+        self.assertEqual(self.policy.traces_sampler(self.context('/api/users/profile/')), 0.5)
+        self.assertEqual(self.policy.traces_sampler(self.context('/swagger/')), 0.0)
+        self.assertEqual(self.policy.traces_sampler(self.context('/admin/')), 0.2)
+        self.assertEqual(self.policy.profiles_sampler(self.context('/api/users/login/')), 0.0)
+
+    def test_parent_decision_is_kept(self):
+        self.assertEqual(self.policy.traces_sampler(self.context('/swagger/', parent_sampled=True)), 1.0)
+
+    def test_route_rates_from_env(self):
+        routes = parse_route_rates('/api/users/login/=0.05:0.5, /redoc/=0', 0.1)
+        self.assertEqual(routes, {'/api/users/login/': (0.05, 0.5), '/redoc/': (0.0, 0.1)})
+
+class TenPerMinuteThrottle(SharedAnonRateThrottle):
+    rate = '10/minute'
+    now = 30.0
+    timer = staticmethod(lambda: TenPerMinuteThrottle.now)
+
+
+def _worker_hits(request, count, results):
+    # отдельный процесс: свои экземпляры и свой объект кеша, общий только каталог с файлами
+    results.put(sum(TenPerMinuteThrottle().allow_request(request, None) for _ in range(count)))
+
+
+@override_settings(THROTTLE_CACHE_ALIAS='local')
+class SharedThrottleTest(TestCase):
+    def setUp(self):
+        caches['local'].clear()
+        TenPerMinuteThrottle.now = 30.0
+        self.request = SimpleNamespace(user=None, META={'REMOTE_ADDR': '10.0.0.1'})
+
+    def hit(self, count):
+        return sum(TenPerMinuteThrottle().allow_request(self.request, None) for _ in range(count))
+
+    def test_processes_share_one_limit(self):
+        # Несколько процессов с общим хранилищем (файловый кеш) делят один лимит.
+        # Процессы идут по очереди: incr файлового кеша не атомарен, в отличие от redis
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        with override_settings(CACHES={**settings.CACHES, 'shared': shared}, THROTTLE_CACHE_ALIAS='shared'):
+            for _ in range(4):
+                worker = context.Process(target=_worker_hits, args=(self.request, 25, results))
+                worker.start()
+                worker.join()
+                self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(sum(results.get(timeout=5) for _ in range(4)), 10)
+
+    async def test_async_path_shares_counters(self):
+        # async views считают в те же ключи, что и синхронные
+        self.assertEqual(await sync_to_async(self.hit)(6), 6)
+        allowed = [await TenPerMinuteThrottle().aallow_request(self.request, None) for _ in range(6)]
+        self.assertEqual(allowed.count(True), 4)
+        throttle = TenPerMinuteThrottle()
+        self.assertFalse(await throttle.aallow_request(self.request, None))
+        self.assertEqual(throttle.wait(), 30.0)
+
+    def test_previous_window_is_weighted(self):
+        self.assertEqual(self.hit(15), 10)
+
+        # середина следующего окна: половина прошлых запросов еще учитывается
+        TenPerMinuteThrottle.now = 90.0
+        throttle = TenPerMinuteThrottle()
+        self.assertEqual(self.hit(10), 5)
+        self.assertFalse(throttle.allow_request(self.request, None))
+        self.assertEqual(throttle.wait(), 6.0)
+
+
+class SharedCacheCheckTest(TestCase):
+    @override_settings(WEB_CONCURRENCY=3, THROTTLE_CACHE_ALIAS='local')
+    def test_local_throttle_cache_with_several_workers(self):
+        self.assertEqual([e.id for e in checks.check_throttle_cache(None)], ['users.E001'])
+
+    @override_settings(WEB_CONCURRENCY=2, TOKEN_REVOCATION_CACHE_ALIAS='local')
+    def test_local_revocation_cache_with_several_workers(self):
+        # "default" в тестах тоже LocMem: версии токенов проверяются вместе с отзывом
+        ids = [e.id for e in checks.check_revocation_cache(None)]
+        self.assertEqual(ids, ['users.E002', 'users.E003'])
+
+    @override_settings(WEB_CONCURRENCY=2, PROFILE_CACHE_ALIAS='local')
+    def test_local_profile_cache_is_a_warning(self):
+        self.assertEqual([e.id for e in checks.check_profile_cache(None)], ['users.W001'])
+
+    @override_settings(WEB_CONCURRENCY=1, THROTTLE_CACHE_ALIAS='local')
+    def test_local_cache_is_fine_for_one_worker(self):
+        self.assertEqual(checks.check_throttle_cache(None), [])
+
+
+class ImportExportUsersTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(email='existing@example.com', name='Existing', password='TestPassword123')
+        self.hashed = User.objects.get().password
+
+    def write_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_csv_dedupes_and_creates_profiles(self):
+        path = self.write_file('.csv', (
+            'email,name,password_hash,location\n'
+            f'new1@example.com,New One,{self.hashed},Krasnoyarsk\n'
+            f'existing@example.com,Existing,{self.hashed},\n'
+            f'new1@example.com,Duplicate,{self.hashed},\n'
+            f'new2@example.com,New Two,not-a-hash,\n'
+            'new3@example.com,New Three,,\n'
+        ))
+        err = StringIO()
+        call_command('import_users', path, '--chunk-size', '2', stdout=StringIO(), stderr=err)
+
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(err.getvalue(), 'line 5: password_hash: unknown hash format\n')
+        user = User.objects.get(email='new1@example.com')
+        self.assertTrue(user.check_password('TestPassword123'))
+        self.assertEqual(user.profile.location, 'Krasnoyarsk')
+        self.assertFalse(User.objects.get(email='new3@example.com').has_usable_password())
+
+    def test_import_rejects_invalid_rows_with_line_numbers(self):
+        path = self.write_file('.csv', (
+            'email,name,password,phone_number\n'
+            'good@example.com,Good,,\n'
+            'not-an-email,Bad Email,,\n'
+            f'long@example.com,{"x" * 256},,\n'
+            'phone@example.com,Phone,,+1234567890123456\n'
+            ',No Email,,\n'
+        ))
+        err = StringIO()
+        call_command('import_users', path, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)), {'existing@example.com', 'good@example.com'}
+        )
+        lines = err.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines], ['line 3', 'line 4', 'line 5', 'line 6'])
+        self.assertIn('email: Enter a valid email address.', lines[0])
+        self.assertIn('name: Ensure this value has at most 255 characters', lines[1])
+        self.assertIn('phone_number:', lines[2])
+
+    def test_import_jsonl_reports_broken_lines(self):
+        path = self.write_file('.jsonl', '{"email": "ok@example.com", "name": "Ok"}\n\n{broken\n[1, 2]\n')
+        err = StringIO()
+        call_command('import_users', path, stdout=StringIO(), stderr=err)
+
+        self.assertTrue(User.objects.filter(email='ok@example.com').exists())
+        self.assertEqual(err.getvalue().splitlines(), ['line 3: not a JSON object', 'line 4: not a JSON object'])
+
+    def test_export_jsonl_round_trip(self):
+        out = StringIO()
+        call_command('export_users', '--format', 'jsonl', '--include-password-hash', stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0]['email'], 'existing@example.com')
+        self.assertEqual(rows[0]['password_hash'], self.hashed)
+
+        User.objects.all().delete()
+        path = self.write_file('.jsonl', out.getvalue())
+        call_command('import_users', path, stdout=StringIO())
+        self.assertTrue(User.objects.get().check_password('TestPassword123'))
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        # счетчики анонимного троттлинга живут в общем кеше между тестами
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            name='Test User',
+            password='TestPassword123'
+        )
+        refresh = UserRefreshToken.for_user(self.user)
+        self.headers = {'Authorization': f'Bearer {refresh.access_token}'}
+
+    async def test_register_then_login(self):
+        data = {'email': 'new@example.com', 'name': 'New User', 'password': 'TestPassword123'}
+        response = await self.async_client.post(reverse('async-register'), data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['email'], 'new@example.com')
+        self.assertTrue(await EmailOutbox.objects.filter(to_email='new@example.com').aexists())
+
+        response = await self.async_client.post(
+            reverse('async-login'), {'email': 'new@example.com', 'password': 'TestPassword123'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.json())
+
+    async def test_login_invalid_credentials(self):
+        response = await self.async_client.post(
+            reverse('async-login'), {'email': 'testuser@example.com', 'password': 'wrong'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'non_field_errors': ['Invalid credentials']})
+
+    async def test_profile_read_and_update(self):
+        response = await self.async_client.patch(
+            reverse('async-profile-update'), {'bio': 'Async bio'},
+            content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = await self.async_client.get(reverse('async-profile-detail'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['bio'], 'Async bio')
+
+    async def test_profile_update_checks_if_match(self):
+        etag = (await self.async_client.get(reverse('async-profile-detail'), headers=self.headers))['ETag']
+        response = await self.async_client.patch(
+            reverse('async-profile-update'), {'bio': 'First'},
+            content_type='application/json', headers={**self.headers, 'If-Match': etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # второй клиент с тем же устаревшим ETag не затирает первое изменение
+        response = await self.async_client.patch(
+            reverse('async-profile-update'), {'bio': 'Second'},
+            content_type='application/json', headers={**self.headers, 'If-Match': etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = await self.async_client.get(
+            reverse('async-profile-detail'), headers={**self.headers, 'If-None-Match': etag}
+        )
+        self.assertEqual(response.json()['bio'], 'First')
+
+    async def test_profile_requires_token(self):
+        response = await self.async_client.get(reverse('async-profile-detail'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class OpenAPISchemaTest(TestCase):
+    def test_static_schema_is_up_to_date(self):
+        # Упал - значит API поменялся: python manage.py generate_openapi_schema
+        call_command('generate_openapi_schema', '--check', stdout=StringIO())
+
+    def test_check_fails_on_drift(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'openapi.json')
+            with open(path, 'w') as fp:
+                fp.write('{}')
+            with self.assertRaises(CommandError):
+                call_command('generate_openapi_schema', '--check', '--output', path)
+
+
+class StartupProfileTest(TestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |     django.utils\n'
+            'import time:       250 |        350 |   django\n'
+            'import time:        50 |         50 | users\n'
+        )
+        self.assertEqual(parse_importtime(stderr), {'django': 350, 'users': 50})
+
+    def test_api_role_probe(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'startup.json')
+            call_command('startup_profile', '--role', 'api', '--repeat', '1', '--json', path, stdout=StringIO())
+            with open(path) as fp:
+                results = json.load(fp)
+        self.assertGreater(results['api']['ready_ms'], 0)
+        self.assertGreater(results['api']['rss_mb'], 0)
+        self.assertIn('django', results['api']['top_imports_ms'])
+
+
+class FastJSONTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def test_renderer_matches_drf_output(self):
+        data = {
+            'when': timezone.now(),
+            'price': Decimal('1.50'),
+            'message': gettext_lazy('Not found.'),
+            'separator': 'a\u2028b',
+            'unicode': 'привет',
+            1: [None, True, 1.5],
+        }
+        expected = JSONRenderer().render(data)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with override_settings(JSON_BACKEND='json'):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    @override_settings(JSON_BACKEND='msgpack')
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            FastJSONRenderer().render({})
+
+    def test_invalid_json_body(self):
+        response = self.client.post(reverse('login'), '{"email": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data['detail'].startswith('JSON parse error'))
+
+    def test_compiled_representation_matches_serializer(self):
+        user = User.objects.create_user(email='compiled@example.com', name='Compiled', password='TestPassword123')
+        profile = Profile.objects.get(user=user)
+        profile.bio = 'bio'
+        self.assertEqual(represent_user(user), dict(UserSerializer(user).data))
+        self.assertEqual(represent_profile(profile), dict(ProfileSerializer(profile).data))
+
+
+class AuditLogTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        audit.buffer.clear()
+        self.addCleanup(audit.buffer.clear)
+        self.user = User.objects.create_user(email='audit@example.com', name='Audit', password='TestPassword123')
+
+    def test_requests_only_buffer_events(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('login'), {'email': 'audit@example.com', 'password': 'TestPassword123'}, format='json')
+            self.client.post(reverse('login'), {'email': 'audit@example.com', 'password': 'wrong'}, format='json')
+            token = UserRefreshToken.for_user(self.user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(reverse('profile-update'), {'bio': 'audited'}, format='json')
+        self.assertFalse([q for q in queries.captured_queries if 'users_authevent' in q['sql']])
+
+        self.assertEqual(audit.buffer.flush(), 3)
+        events = list(AuthEvent.objects.order_by('id'))
+        self.assertEqual(
+            [event.event_type for event in events], [AuthEvent.LOGIN, AuthEvent.LOGIN_FAILED, AuthEvent.PROFILE_UPDATED]
+        )
+        self.assertEqual(events[0].user_id, self.user.pk)
+        self.assertEqual(events[0].ip, '127.0.0.1')
+        self.assertEqual(events[1].email, 'audit@example.com')
+        self.assertEqual(events[2].data, {'fields': ['bio']})
+
+    @override_settings(AUDIT_BATCH_SIZE=3)
+    def test_full_buffer_is_written_in_one_insert(self):
+        audit.emit(audit.PASSWORD_CHANGED, user_id=1)
+        audit.emit(audit.PASSWORD_CHANGED, user_id=2)
+        with CaptureQueriesContext(connection) as queries:
+            audit.emit(audit.PASSWORD_CHANGED, user_id=3)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(AuthEvent.objects.count(), 3)
+        self.assertEqual(len(audit.buffer), 0)
+
+    def test_drop_policy(self):
+        for policy, expected in (('oldest', ['b', 'c']), ('newest', ['a', 'b'])):
+            with override_settings(AUDIT_MAX_BUFFER=2, AUDIT_DROP_POLICY=policy):
+                for email in 'abc':
+                    audit.emit(audit.LOGIN_FAILED, email=email)
+                self.assertEqual([event['email'] for event in audit.buffer._events], expected)
+                audit.buffer.clear()
+
+    def test_unavailable_database_keeps_events(self):
+        audit.emit(audit.LOGIN, user_id=self.user.pk)
+        with mock.patch('users.audit.write_events', side_effect=OperationalError('down')), \
+                self.assertLogs('users.audit', 'WARNING'):
+            self.assertEqual(audit.buffer.flush(), 0)
+        self.assertEqual(len(audit.buffer), 1)
+        self.assertEqual(audit.buffer.flush(), 1)
+
+    @override_settings(AUDIT_RETENTION_DAYS=30)
+    def test_retention(self):
+        old = timezone.now() - timedelta(days=31)
+        AuthEvent.objects.bulk_create(
+            [AuthEvent(event_type=AuthEvent.LOGIN, created_at=old) for _ in range(3)]
+            + [AuthEvent(event_type=AuthEvent.LOGIN)]
+        )
+        self.assertEqual(purge_audit_events(batch_size=2), 3)
+        self.assertEqual(AuthEvent.objects.count(), 1)
+
+
+class HashingPoolTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(PASSWORD_HASH_SLOTS_DIR=directory.name, PASSWORD_HASH_MAX_PENDING=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(email='hash@example.com', name='Hash', password='OldPassword123')
+
+    def hold_slot(self):
+        slot = hashing.slots.acquire(hashing.HIGH)
+        self.addCleanup(hashing.slots.release, slot)
+
+    def test_saturated_pool_rejects_by_priority(self):
+        self.hold_slot()
+        response = self.client.post(reverse('login'), {'email': 'hash@example.com', 'password': 'OldPassword123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+        # смене пароля достается последний слот
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.put(
+            reverse('change-password'), {'old_password': 'OldPassword123', 'new_password': 'NewPassword456'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_slots_are_released(self):
+        for _ in range(3):
+            hashing.make_password('TestPassword123', priority=hashing.LOW)
+        self.assertEqual(hashing.slots._held, set())
+
+    @override_settings(PASSWORD_HASH_POOL='thread', PASSWORD_HASH_TIMEOUT=0.05)
+    def test_timeout_is_unavailable(self):
+        with self.assertRaises(hashing.HashingUnavailable):
+            hashing.run(time.sleep, 0.5)
+
+
+class PasswordIndexTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = os.path.join(self.directory, 'passwords.idx')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as fp:
+            fp.write(content)
+        return path
+
+    def test_build_from_wordlist_and_sha1_dump(self):
+        # SHA-1 строки 'hunter2' и 'Tr0ub4dor&3' в формате выгрузки HIBP, по возрастанию
+        dump = self.write('pwned.txt', '874572E7A5AE6A49466A6AC578B98ADBA78C6AA6:1\nF3BBBD66A63D4BF1747940578EC3D0103530E21D:5\n')
+        wordlist = self.write('words.txt', 'Winter2024!\n')
+        call_command(
+            'build_password_index', '--output', self.index, '--no-common',
+            '--wordlist', wordlist, '--sha1', dump, '--min-count', '2', stdout=StringIO(),
+        )
+        validator = BreachedPasswordValidator()
+        with override_settings(PASSWORD_INDEX_PATH=self.index):
+            for password in ('hunter2', 'Winter2024!', 'winter2024!'):
+                with self.assertRaises(ValidationError):
+                    validator.validate(password)
+            # ниже --min-count и не из списка Django
+            validator.validate('Tr0ub4dor&3')
+            validator.validate('password')
+
+    def test_rebuilt_index_closes_previous_map(self):
+        wordlist = self.write('words.txt', 'Winter2024!\n')
+        build = partial(
+            call_command, 'build_password_index', '--output', self.index, '--no-common',
+            '--wordlist', wordlist, stdout=StringIO(),
+        )
+        build()
+        with password_validation._lock:
+            old = password_validation.get_index(self.index)
+        time.sleep(0.01)
+        build()
+        with password_validation._lock:
+            new = password_validation.get_index(self.index)
+        self.addCleanup(new.close)
+        self.assertIsNot(new, old)
+        self.assertTrue(old._map.closed)
+        self.assertIn(password_key('winter2024!'), new)
+
+    def test_unsorted_dump_is_rejected(self):
+        dump = self.write('pwned.txt', 'F3BBBD66A63D4BF1747940578EC3D0103530E21D\n874572E7A5AE6A49466A6AC578B98ADBA78C6AA6\n')
+        with self.assertRaises(CommandError):
+            call_command('build_password_index', '--output', self.index, '--sha1', dump, stdout=StringIO())
+        self.assertEqual(os.listdir(self.directory), ['pwned.txt'])
+
+    def test_missing_index_falls_back_to_django_list(self):
+        validator = BreachedPasswordValidator()
+        with override_settings(PASSWORD_INDEX_PATH=self.index), self.assertLogs('users.password_validation', 'WARNING'):
+            with self.assertRaises(ValidationError):
+                validator.validate('password')
+
+    def test_registration_rejects_common_password(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        response = self.client.post(
+            reverse('register'), {'email': 'common@example.com', 'name': 'Common', 'password': 'qwerty123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('This password is too common.', response.json()['password'])
+
+
+class CeleryDispatchTest(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.published = []
+        before_task_publish.connect(self.record, weak=False)
+        self.addCleanup(before_task_publish.disconnect, self.record)
+
+    def record(self, sender=None, **kwargs):
+        self.published.append(sender)
+
+    def test_registration_enqueues_email(self):
+        data = {'email': 'queued@example.com', 'name': 'Queued', 'password': 'TestPassword123'}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('register'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.published, ['users.tasks.drain_email_outbox'])
+        # письмо отправит воркер, а не веб-процесс
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.STATUS_PENDING)
+
+    def test_tasks_are_enqueued_not_run(self):
+        send_registration_email.delay('queued@example.com')
+        with override_settings(AUDIT_FLUSH_MODE='celery'):
+            audit.emit(audit.LOGIN, user_id=1)
+            audit.buffer.flush()
+        self.assertEqual(self.published, ['users.tasks.send_registration_email', 'users.tasks.write_audit_events'])
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertFalse(AuthEvent.objects.exists())
+
+    def test_eager_mode_runs_inline(self):
+        celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+        self.addCleanup(celery_app.conf.update, CELERY_TASK_ALWAYS_EAGER=False)
+        send_registration_email.delay('eager@example.com')
+        self.assertEqual(self.published, [])
+        self.assertEqual(EmailOutbox.objects.get().to_email, 'eager@example.com')
+
+    def test_local_worker(self):
+        start_local_worker()
+        self.addCleanup(stop_local_worker)
+        self.assertEqual(ping.delay().get(timeout=10, interval=0.01), 'pong')
+        self.assertEqual(self.published, ['benchmarks.tasks.ping'])
+
+
+class CeleryTelemetryTest(APITestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_results_are_not_stored_by_default(self):
+        for task in (drain_email_outbox, send_registration_email, tasks.purge_revoked_tokens,
+                     tasks.write_audit_events, purge_audit_events):
+            self.assertTrue(task.ignore_result, task.name)
+        self.assertFalse(ping.ignore_result)
+
+    def test_eager_task_duration(self):
+        celery_app.conf.update(CELERY_TASK_ALWAYS_EAGER=True)
+        self.addCleanup(celery_app.conf.update, CELERY_TASK_ALWAYS_EAGER=False)
+        labels = {'task': 'users.tasks.send_registration_email', 'state': 'SUCCESS'}
+        before = self.sample('user_auth_task_duration_seconds_count', **labels)
+        send_registration_email.delay('eager@example.com')
+        self.assertEqual(self.sample('user_auth_task_duration_seconds_count', **labels), before + 1)
+
+    def test_queue_latency_from_publish_header(self):
+        published = []
+
+        def record(headers=None, **kwargs):
+            published.append(dict(headers))
+
+        before_task_publish.connect(record, weak=False)
+        self.addCleanup(before_task_publish.disconnect, record)
+        start_local_worker()
+        self.addCleanup(stop_local_worker)
+        before = self.sample('user_auth_task_queue_seconds_count', task='benchmarks.tasks.ping')
+        self.assertEqual(ping.delay().get(timeout=10, interval=0.01), 'pong')
+        self.assertIn('enqueued_at', published[0])
+        self.assertEqual(self.sample('user_auth_task_queue_seconds_count', task='benchmarks.tasks.ping'), before + 1)
+
+    def test_retries_counted(self):
+        before = self.sample('user_auth_task_retries_total', task='users.tasks.drain_email_outbox')
+        task_retry.send(sender=drain_email_outbox, request=None, reason='smtp down', einfo=None)
+        self.assertEqual(self.sample('user_auth_task_retries_total', task='users.tasks.drain_email_outbox'), before + 1)
+
+
+class SessionRegistryTest(APITestCase):
+    def setUp(self):
+        # вход и refresh анонимные - не упираемся в общий счетчик троттлинга
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.user = User.objects.create_user(email='testuser@example.com', name='Test User', password='TestPassword123')
+
+    def login(self, email='testuser@example.com', agent='Phone'):
+        response = self.client.post(
+            reverse('login'), {'email': email, 'password': 'TestPassword123'}, format='json', HTTP_USER_AGENT=agent,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get(self, name, tokens):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return self.client.get(reverse(name))
+
+    def refresh(self, tokens):
+        self.client.credentials()
+        return self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+
+    def test_login_and_refresh_keep_one_session(self):
+        phone = self.login()
+        self.login(agent='Laptop')
+        phone = self.refresh(phone).data
+
+        sessions = self.get('session-list', phone).json()
+        self.assertEqual([s['user_agent'] for s in sessions], ['Phone', 'Laptop'])
+        self.assertEqual([s['current'] for s in sessions], [True, False])
+        self.assertEqual(UserSession.objects.count(), 2)
+
+    def test_end_one_session(self):
+        phone, laptop = self.login(), self.login(agent='Laptop')
+        laptop_id = UserSession.objects.get(user_agent='Laptop').pk
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {phone['access']}")
+        response = self.client.delete(reverse('session-detail', args=[laptop_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.get('profile-detail', laptop).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh(laptop).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get('profile-detail', phone).status_code, status.HTTP_200_OK)
+
+    def test_logout_everywhere(self):
+        phone, laptop = self.login(), self.login(agent='Laptop')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {phone['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('logout-all'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        for tokens in (phone, laptop):
+            self.assertEqual(self.get('profile-detail', tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(self.refresh(tokens).status_code, status.HTTP_401_UNAUTHORIZED)
+        tablet = self.login(agent='Tablet')
+        self.assertEqual([s['user_agent'] for s in self.get('session-list', tablet).json()], ['Tablet'])
+
+    def test_password_change_ends_other_sessions(self):
+        phone, laptop = self.login(), self.login(agent='Laptop')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {phone['access']}")
+        data = {'old_password': 'TestPassword123', 'new_password': 'NewPassword456'}
+        self.assertEqual(self.client.put(reverse('change-password'), data, format='json').status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.get('profile-detail', laptop).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh(laptop).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_generation, 1)
+
+    def test_generation_check_is_a_cache_hit(self):
+        tokens = self.login()
+        self.get('profile-detail', tokens)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('profile-detail', tokens)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries if 'FROM "users_user"' in q['sql']])
+
+    def test_admin_bulk_revoke(self):
+        users = [User.objects.create_user(email=f'bulk{i}@example.com', name='Bulk', password='x') for i in range(50)]
+        tokens = {user.pk: UserRefreshToken.for_user(user).access_token for user in users}
+        admin = User.objects.create_user(email='admin@example.com', name='Admin', password='x', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(admin).access_token}')
+
+        data = {'ids': [user.pk for user in users[:40]] + [10**6], 'emails': [user.email for user in users[30:]]}
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('session-revoke'), data, format='json')
+        self.assertEqual(response.json(), {'users': 50})
+        # выборка id и один UPDATE на пачку, без запроса на каждого пользователя
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "users_user"')]), 1)
+
+        for user in users[:3]:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens[user.pk]}')
+            self.assertEqual(self.client.get(reverse('profile-detail')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_revoke_staff_only(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = self.client.post(reverse('session-revoke'), {'ids': [self.user.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_purge_sessions(self):
+        self.login()
+        self.login(agent='Laptop')
+        UserSession.objects.filter(user_agent='Laptop').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_sessions(), 1)
+        User.objects.filter(pk=self.user.pk).update(token_generation=1)
+        self.assertEqual(purge_sessions(), 1)
+        self.assertFalse(UserSession.objects.exists())
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import throttling
+
+
+class SlidingWindowThrottleMixin:
+    """
+    Скользящее окно на двух счетчиках: текущее окно и вес предыдущего.
+    Счетчики атомарно инкрементируются в общем кеше (redis), поэтому лимит
+    действует на весь кластер, а не на каждый воркер. На ключ - два целых числа.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        current_key, previous_key = self._window_keys()
+        # храним два окна, чтобы предыдущее было доступно для взвешивания
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.current = self.cache.incr(current_key)
+        except ValueError:
+            # ключ успел истечь между add и incr
+            self.cache.set(current_key, 1, self.duration * 2)
+            self.current = 1
+        self.previous = self.cache.get(previous_key, 0)
+
+        if self._over_limit():
+            # отклоненные запросы в лимит не засчитываем
+            self.cache.decr(current_key)
+            self.current -= 1
+            return self.throttle_failure()
+        return True
+
+    async def aallow_request(self, request, view):
+        # То же через async API кеша - для async views, чтобы не блокировать цикл событий
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        current_key, previous_key = self._window_keys()
+        await self.cache.aadd(current_key, 0, self.duration * 2)
+        try:
+            self.current = await self.cache.aincr(current_key)
+        except ValueError:
+            await self.cache.aset(current_key, 1, self.duration * 2)
+            self.current = 1
+        self.previous = await self.cache.aget(previous_key, 0)
+
+        if self._over_limit():
+            await self.cache.adecr(current_key)
+            self.current -= 1
+            return self.throttle_failure()
+        return True
+
+    def _window_keys(self) -> tuple[str, str]:
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        return f'{self.key}:{window}', f'{self.key}:{window - 1}'
+
+    def _over_limit(self) -> bool:
+        self.elapsed = self.now % self.duration
+        estimated = self.previous * (1 - self.elapsed / self.duration) + self.current
+        return estimated > self.num_requests
+
+    def wait(self):
+        remaining = self.duration - self.elapsed
+        if self.current >= self.num_requests or not self.previous:
+            return remaining
+        # сколько ждать, пока вес предыдущего окна не освободит место под запрос
+        free_at = (1 - (self.num_requests - self.current - 1) / self.previous) * self.duration
+        return max(0.0, min(remaining, free_at - self.elapsed))
+
+
+class SharedAnonRateThrottle(SlidingWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class SharedUserRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
+    pass
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+AUTH_VERSION_CLAIM = 'ver'
+# id устройства (users.sessions): переходит из refresh в access и в следующие refresh
+SESSION_CLAIM = 'sid'
+# Все, что ClaimsUser берет из токена для проверки прав, должно входить в версию:
+# иначе снятые права продолжали бы действовать до истечения токена
+VERSION_FIELDS = ('is_active', 'is_staff', 'is_superuser', 'token_generation')
+# Поля пользователя для claims (UserRefreshToken.for_user и обновление токенов)
+CLAIM_FIELDS = ('id', 'email', 'name', *VERSION_FIELDS)
+
+
+def auth_version(user) -> str:
+    # Меняется при смене пароля, деактивации, смене прав и "выйти везде" -
+    # старые токены перестают приниматься. Хеша пароля здесь нет: смену пароля отмечает
+    # token_generation, а перехеширование того же пароля при входе токены не трогает
+    value = f'{user.is_active}:{user.is_staff}:{user.is_superuser}:{user.token_generation}'
+    return salted_hmac('users.tokens.auth_version', value).hexdigest()[:16]
+
+
+def _auth_version_key(user_id) -> str:
+    return f'users:auth_version:{user_id}'
+
+
+def cache_auth_version(user) -> None:
+    cache.set(_auth_version_key(user.pk), auth_version(user), settings.JWT_AUTH_VERSION_CACHE_TIMEOUT)
+
+
+def forget_auth_version(user_id) -> None:
+    cache.delete(_auth_version_key(user_id))
+
+
+def forget_auth_versions(user_ids) -> None:
+    # Для массового отзыва: одна операция с кешем на пачку пользователей
+    cache.delete_many([_auth_version_key(user_id) for user_id in user_ids])
+
+
+def get_auth_version(user_id, refresh: bool = False) -> str | None:
+    version = None if refresh else cache.get(_auth_version_key(user_id))
+    if version is None:
+        user = User.objects.filter(pk=user_id).only(*VERSION_FIELDS).first()
+        if user is None:
+            return None
+        version = auth_version(user)
+        cache.set(_auth_version_key(user_id), version, settings.JWT_AUTH_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+async def aget_auth_version(user_id, refresh: bool = False) -> str | None:
+    version = None if refresh else await cache.aget(_auth_version_key(user_id))
+    if version is None:
+        user = await User.objects.filter(pk=user_id).only(*VERSION_FIELDS).afirst()
+        if user is None:
+            return None
+        version = auth_version(user)
+        await cache.aset(_auth_version_key(user_id), version, settings.JWT_AUTH_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def auth_version_matches(user_id, version: str) -> bool:
+    # Несовпадение перепроверяем по БД: локальный кеш воркера мог не увидеть
+    # смену пароля в другом процессе, и тогда отклонялись бы уже новые токены
+    return get_auth_version(user_id) == version or get_auth_version(user_id, refresh=True) == version
+
+
+async def aauth_version_matches(user_id, version: str) -> bool:
+    return (
+        await aget_auth_version(user_id) == version
+        or await aget_auth_version(user_id, refresh=True) == version
+    )
+
+
+def set_user_claims(token, user) -> None:
+    token['email'] = user.email
+    token['name'] = user.name
+    token['is_active'] = user.is_active
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    token[AUTH_VERSION_CLAIM] = auth_version(user)
+
+
+class UserRefreshToken(RefreshToken):
+    # Кладем в токен все, что нужно защищенным эндпоинтам, чтобы не ходить за пользователем в БД
+    @classmethod
+    def for_user(cls, user) -> 'UserRefreshToken':
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterView, LoginView, ChangePasswordView, UpdateProfileView, ProfileDetailView
+from .views import RegisterView, LoginView, RefreshTokenView, LogoutView, ChangePasswordView, UpdateProfileView, ProfileDetailView, ProfileBatchView, UserDirectoryView, SessionListView, SessionDetailView, LogoutEverywhereView, SessionRevokeView
 
 def trigger_error(request):
     division_by_zero = 1 / 0
@@ -7,8 +7,16 @@ def trigger_error(request):
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('token/refresh/', RefreshTokenView.as_view(), name='token-refresh'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('profile/change-password/', ChangePasswordView.as_view(), name='change-password'),
     path('profile/', ProfileDetailView.as_view(), name='profile-detail'),
     path('profile/update/', UpdateProfileView.as_view(), name='profile-update'),
+    path('profiles/batch/', ProfileBatchView.as_view(), name='profile-batch'),
+    path('directory/', UserDirectoryView.as_view(), name='user-directory'),
+    path('sessions/', SessionListView.as_view(), name='session-list'),
+    path('sessions/logout-all/', LogoutEverywhereView.as_view(), name='logout-all'),
+    path('sessions/revoke/', SessionRevokeView.as_view(), name='session-revoke'),
+    path('sessions/<str:pk>/', SessionDetailView.as_view(), name='session-detail'),
     path('sentry-debug/', trigger_error),
 ]
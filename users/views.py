@@ -1,23 +1,36 @@
-from rest_framework import generics
+import json
+from functools import partial
+from time import perf_counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from .serializers import RegisterSerializer, LoginSerializer, ChangePasswordSerializer, ProfileSerializer, UpdateProfileSerializer
-from .models import Profile
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
+from .serializers import RegisterSerializer, LoginSerializer, RefreshSerializer, LogoutSerializer, ChangePasswordSerializer, ProfileSerializer, UpdateProfileSerializer, ProfileBatchSerializer, DirectoryFilterSerializer, DirectoryUserSerializer, SessionSerializer, SessionRevokeSerializer, encode_cursor, represent_profile, represent_user
+from . import audit
+from .sessions import active_sessions, end_session, log_out_everywhere
+from .models import Profile, User, UserSession
+from .cache import get_profile_data, get_profile_data_many, get_profile_updated_at, invalidate_profile
+from .preconditions import PreconditionFailed, profile_validators, set_profile_validators
+from .docs import auth_header, empty_body, swagger_schema
+from .metrics import RENDER_SECONDS, view_label
 from .serializers import RegisterSerializer, UserSerializer
 
-swg_tmp = swagger_auto_schema(
-        manual_parameters=[
-            openapi.Parameter('Authorization', openapi.IN_HEADER, description="Bearer {JWT token}", type=openapi.TYPE_STRING)
-        ]
-    )
+swg_tmp = swagger_schema(lambda openapi: {'manual_parameters': [auth_header(openapi)]})
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
     
-    @swagger_auto_schema(
+    @swagger_schema(lambda openapi: dict(
         request_body=RegisterSerializer,
         responses={
             201: UserSerializer,
@@ -60,7 +73,7 @@ class RegisterView(generics.CreateAPIView):
             }
         }
         
-    )
+    ))
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
     
@@ -102,14 +115,97 @@ class LoginView(generics.GenericAPIView):
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        # Аудит - только в буфер процесса, в БД событие уйдет пачкой позже
+        if not serializer.is_valid():
+            email = request.data.get('email', '') if isinstance(request.data, dict) else ''
+            audit.emit(audit.LOGIN_FAILED, request, email=email)
+            raise ValidationError(serializer.errors)
+        audit.emit(audit.LOGIN, request, user_id=serializer.user.pk)
         return Response(serializer.validated_data)
     
+class RefreshTokenView(generics.GenericAPIView):
+    """
+    Обновление пары токенов.
+
+    Принимает refresh-токен и возвращает новую пару. Старый refresh-токен
+    после этого отозван: повторный запрос с ним вернет 401.
+
+    Пример запроса:
+    ```
+    POST /api/token/refresh/
+    {
+        "refresh": "jwt_refresh_token_here"
+    }
+    ```
+
+    Пример ответа:
+    ```
+    {
+        "refresh": "new_jwt_refresh_token_here",
+        "access": "new_jwt_access_token_here"
+    }
+    ```
+
+    Коды ответов:
+    - 200: Выдана новая пара токенов.
+    - 401: Токен недействителен, истек или уже отозван.
+    """
+    serializer_class = RefreshSerializer
+    permission_classes = [AllowAny]
+    # истекший access-токен в заголовке не должен мешать обновлению
+    authentication_classes = []
+
+    def get_authenticate_header(self, request):
+        # без этого DRF превращает 401 в 403
+        return 'Bearer realm="api"'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data)
+
+
+class LogoutView(generics.GenericAPIView):
+    """
+    Выход пользователя.
+
+    Отзывает переданный refresh-токен и, если в заголовке Authorization
+    действующий access-токен того же пользователя, его тоже.
+
+    Пример запроса:
+    ```
+    POST /api/logout/
+    {
+        "refresh": "jwt_refresh_token_here"
+    }
+    ```
+
+    Коды ответов:
+    - 204: Токены отозваны.
+    - 401: Токен недействителен или истек.
+    """
+    serializer_class = LogoutSerializer
+    permission_classes = [AllowAny]
+    # клиент выходит как раз тогда, когда access-токен истек: заголовок не проверяется
+    authentication_classes = []
+
+    def get_authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class ChangePasswordView(generics.UpdateAPIView):
     """
     Смена пароля пользователя.
 
     Этот эндпоинт позволяет аутентифицированным пользователям изменить свой текущий пароль.
+    Все токены, выданные до смены, включая токен этого запроса, перестают действовать:
+    после смены нужно войти заново.
 
     Параметры запроса:
     - `old_password`: Текущий пароль пользователя (обязательный).
@@ -133,6 +229,10 @@ class ChangePasswordView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated]
     def get_object(self):
         return self.request.user
+
+    def perform_update(self, serializer):
+        user = serializer.save()
+        audit.emit(audit.PASSWORD_CHANGED, self.request, user_id=user.pk)
     
     
     @swg_tmp
@@ -167,8 +267,12 @@ class ProfileDetailView(generics.RetrieveAPIView):
     }
     ```
 
+    Ответ содержит ETag и Last-Modified. Запрос с If-None-Match или If-Modified-Since
+    вернет 304 без тела, если профиль не менялся.
+
     Коды ответов:
     - 200: Успешно получен профиль пользователя.
+    - 304: Профиль не изменился.
     - 401: Пользователь не авторизован.
     - 404: Профиль не найден.
     """
@@ -176,9 +280,21 @@ class ProfileDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        user = self.request.user
-        profile, created = Profile.objects.get_or_create(user=user)
+        # user_id из токена: модель пользователя для этого не нужна
+        profile, created = Profile.objects.get_or_create(user_id=self.request.user.pk)
         return profile
+
+    def retrieve(self, request, *args, **kwargs):
+        # Сначала только валидатор: на 304 профиль не загружается и не сериализуется
+        updated_at = get_profile_updated_at(request.user.pk)
+        if updated_at is not None:
+            not_modified = get_conditional_response(request, **profile_validators(request.user.pk, updated_at))
+            if not_modified is not None:
+                return not_modified
+        # Готовый ответ из кеша, в БД идем только на промахе
+        response = Response(get_profile_data(request.user.pk))
+        set_profile_validators(response, request.user.pk, updated_at or get_profile_updated_at(request.user.pk))
+        return response
     
     @swg_tmp
     def get(self, request, *args, **kwargs):
@@ -207,21 +323,356 @@ class UpdateProfileView(generics.UpdateAPIView):
     }
     ```
 
+    Заголовок If-Match с ETag из GET /api/profile/ защищает от потерянных обновлений:
+    если профиль успели изменить, вернется 412.
+
     Коды ответов:
     - 200: Профиль успешно обновлен.
     - 400: Ошибка валидации данных.
     - 401: Пользователь не авторизован.
+    - 412: Профиль изменен другим запросом (If-Match не совпал).
     """
     
     serializer_class = UpdateProfileSerializer
     permission_classes = [IsAuthenticated]
 
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().update(request, *args, **kwargs)
+        profile = self.profile
+        set_profile_validators(response, profile.user_id, profile.updated_at)
+        return response
+
     def get_object(self):
-        return self.request.user.profile
+        # Строка заблокирована до конца транзакции: между проверкой If-Match и записью
+        # ее никто не изменит, поэтому потерянное обновление получит 412
+        profile, created = Profile.objects.select_for_update().get_or_create(user_id=self.request.user.pk)
+        failed = get_conditional_response(self.request, **profile_validators(profile.user_id, profile.updated_at))
+        if failed is not None:
+            raise PreconditionFailed()
+        self.profile = profile
+        return profile
+
+    def perform_update(self, serializer):
+        serializer.save()
+        # Еще раз после коммита: читатель мог закешировать старую строку, пока транзакция не завершилась
+        transaction.on_commit(partial(invalidate_profile, self.request.user.pk))
+        transaction.on_commit(partial(
+            audit.emit, audit.PROFILE_UPDATED, self.request, user_id=self.request.user.pk,
+            fields=sorted(serializer.validated_data),
+        ))
     
     @swg_tmp
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
     @swg_tmp
     def patch(self, request, *args, **kwargs):
-        return super().patch(request, *args, **kwargs)
\ No newline at end of file
+        return super().patch(request, *args, **kwargs)
+
+
+def stream_batch(request, items, next_cursor):
+    # Тот же JSON и тот же рендерер, что у обычного ответа, но по одному элементу за раз.
+    # Время рендера - одно наблюдение на ответ, как у TimedJSONRenderer
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    rendering = 0.0
+    yield b'{"results":['
+    for index, item in enumerate(items):
+        started = perf_counter()
+        chunk = renderer.render(item)
+        rendering += perf_counter() - started
+        yield (b',' if index else b'') + chunk
+    yield b'],"next_cursor":' + json.dumps(next_cursor).encode() + b'}'
+    RENDER_SECONDS.labels(view_label(request)).observe(rendering)
+
+
+class ProfileBatchView(generics.GenericAPIView):
+    """
+    Пакетное чтение профилей для внутренних сервисов (только is_staff).
+
+    Принимает до PROFILE_BATCH_MAX_KEYS id и email и возвращает пользователей
+    с профилями одним ответом, по возрастанию id. Если есть `next_cursor`,
+    тот же запрос с `cursor` вернет следующую страницу.
+
+    Пример запроса:
+    ```
+    POST /api/profiles/batch/
+    {
+        "ids": [1, 2, 3],
+        "emails": ["user@example.com"],
+        "page_size": 100
+    }
+    ```
+
+    Пример ответа:
+    ```
+    {
+        "results": [
+            {"id": 1, "email": "user@example.com", "name": "dmitry", ..., "profile": {"bio": "...", ...}}
+        ],
+        "next_cursor": "MQ=="
+    }
+    ```
+
+    Коды ответов:
+    - 200: Профили найдены (неизвестные id и email просто пропускаются).
+    - 400: Ошибка валидации (пустой запрос, слишком много ключей, неверный курсор).
+    - 401: Пользователь не авторизован.
+    - 403: Пользователь не сотрудник.
+    """
+    serializer_class = ProfileBatchSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        page_size = params.get('page_size') or settings.PROFILE_BATCH_PAGE_SIZE
+
+        # Один узкий запрос за страницу; следующая продолжает по PK после курсора.
+        # Страница, которая может уйти потоком, берет профили тем же запросом (JOIN),
+        # маленькая - из кеша профилей
+        joined = page_size > settings.PROFILE_BATCH_STREAM_THRESHOLD
+        fields = ['id', 'email', 'name', 'created_at', 'updated_at']
+        queryset = User.objects.filter(Q(pk__in=params['ids']) | Q(email__in=params['emails']))
+        if joined:
+            queryset = queryset.select_related('profile')
+            fields += [f'profile__{field}' for field in ProfileSerializer.Meta.fields]
+        users = list(queryset.filter(pk__gt=params.get('cursor', 0)).order_by('pk').only(*fields)[:page_size + 1])
+        next_cursor = encode_cursor(users[page_size - 1].pk) if len(users) > page_size else None
+        users = users[:page_size]
+
+        if joined:
+            items = ({'id': user.pk, **represent_user(user), 'profile': _joined_profile(user)} for user in users)
+        else:
+            # Профили из кеша, промахи - одним запросом
+            profiles = get_profile_data_many([user.pk for user in users])
+            items = ({'id': user.pk, **represent_user(user), 'profile': profiles.get(user.pk)} for user in users)
+        if len(users) > settings.PROFILE_BATCH_STREAM_THRESHOLD:
+            return StreamingHttpResponse(stream_batch(request, items, next_cursor), content_type='application/json')
+        return Response({'results': list(items), 'next_cursor': next_cursor})
+
+
+def _joined_profile(user) -> dict | None:
+    # У пользователя без строки профиля - None, как у промаха в get_profile_data_many
+    profile = getattr(user, 'profile', None)
+    return represent_profile(profile) if profile is not None else None
+
+
+class DirectoryPagination(CursorPagination):
+    # Курсор вместо OFFSET: страница стоит одинаково в начале и в конце списка,
+    # и COUNT(*) по всей таблице не нужен. Порядок совпадает с индексами по created_at, id
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        # Настройки читаем на каждый запрос, а не при импорте класса
+        self.page_size = settings.DIRECTORY_PAGE_SIZE
+        self.max_page_size = settings.DIRECTORY_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+
+class UserDirectoryView(generics.ListAPIView):
+    """
+    Справочник пользователей с профилями (только is_staff).
+
+    Список идет от новых к старым и листается курсором: ссылки на соседние страницы
+    приходят в `next` и `previous`. Фильтры можно сочетать:
+    - `created_after`, `created_before`: диапазон даты регистрации (ISO 8601).
+    - `is_active`: true или false.
+    - `email`: точный email без учета регистра.
+    - `email_prefix`, `name_prefix`: начало email или имени без учета регистра.
+    - `page_size`: размер страницы, не больше DIRECTORY_MAX_PAGE_SIZE.
+
+    Пример запроса:
+    ```
+    GET /api/users/directory/?email_prefix=dmi&is_active=true&page_size=20
+    ```
+
+    Пример ответа:
+    ```
+    {
+        "next": "http://example.com/api/users/directory/?cursor=cD0yMDI0...&email_prefix=dmi",
+        "previous": null,
+        "results": [
+            {"id": 1, "email": "dmitry@example.com", "name": "dmitry", "is_active": true, ..., "profile": {"bio": "...", ...}}
+        ]
+    }
+    ```
+
+    Коды ответов:
+    - 200: Список пользователей.
+    - 400: Ошибка валидации фильтров.
+    - 401: Пользователь не авторизован.
+    - 403: Пользователь не сотрудник.
+    """
+    serializer_class = DirectoryUserSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = DirectoryPagination
+
+    def get_queryset(self):
+        # dict(): иначе BooleanField примет отсутствующий is_active за false, как чекбокс формы
+        filters = DirectoryFilterSerializer(data=self.request.query_params.dict())
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        queryset = User.objects.select_related('profile').only(
+            'id', 'email', 'name', 'is_active', 'created_at', *(f'profile__{field}' for field in ProfileSerializer.Meta.fields)
+        )
+        if 'created_after' in params:
+            queryset = queryset.filter(created_at__gte=params['created_after'])
+        if 'created_before' in params:
+            queryset = queryset.filter(created_at__lt=params['created_before'])
+        if 'is_active' in params:
+            queryset = queryset.filter(is_active=params['is_active'])
+        # Сравнение с lower(...) попадает в функциональные индексы из миграции 0006
+        if 'email' in params or 'email_prefix' in params:
+            queryset = queryset.alias(email_lower=Lower('email'))
+            if 'email' in params:
+                queryset = queryset.filter(email_lower=params['email'])
+            if 'email_prefix' in params:
+                queryset = queryset.filter(email_lower__startswith=params['email_prefix'])
+        if 'name_prefix' in params:
+            queryset = queryset.alias(name_lower=Lower('name')).filter(name_lower__startswith=params['name_prefix'])
+        return queryset
+
+    @swagger_schema(lambda openapi: dict(
+        query_serializer=DirectoryFilterSerializer,
+        manual_parameters=[
+            auth_header(openapi),
+        ],
+    ))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class SessionListView(generics.ListAPIView):
+    """
+    Активные сессии (устройства) текущего пользователя.
+
+    Сессия появляется при входе и продлевается при каждом обновлении токенов.
+    После смены пароля или выхода везде прежние сессии в списке не показываются.
+
+    Пример ответа:
+    ```
+    [
+        {
+            "id": "3f2a9c...",
+            "ip": "203.0.113.5",
+            "user_agent": "Mozilla/5.0 ...",
+            "created_at": "2024-09-01T12:34:56Z",
+            "last_seen_at": "2024-09-01T13:04:56Z",
+            "expires_at": "2024-09-02T13:04:56Z",
+            "current": true
+        }
+    ]
+    ```
+
+    Коды ответов:
+    - 200: Список сессий, сначала недавно активные.
+    - 401: Пользователь не авторизован.
+    """
+    serializer_class = SessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # drf_yasg строит схему без запроса
+        if getattr(self, 'swagger_fake_view', False):
+            return UserSession.objects.none()
+        return active_sessions(self.request.user.pk)
+
+    @swg_tmp
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class SessionDetailView(generics.DestroyAPIView):
+    """
+    Завершение одной сессии текущего пользователя.
+
+    Текущие access- и refresh-токены этого устройства отзываются сразу,
+    остальные сессии продолжают работать.
+
+    Коды ответов:
+    - 204: Сессия завершена.
+    - 401: Пользователь не авторизован.
+    - 404: Сессия не найдена или уже завершена.
+    """
+    serializer_class = SessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # drf_yasg строит схему без запроса
+        if getattr(self, 'swagger_fake_view', False):
+            return UserSession.objects.none()
+        return active_sessions(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        end_session(instance)
+
+    @swg_tmp
+    def delete(self, request, *args, **kwargs):
+        return super().delete(request, *args, **kwargs)
+
+
+class LogoutEverywhereView(generics.GenericAPIView):
+    """
+    Выход на всех устройствах.
+
+    Все токены пользователя, включая токен этого запроса, перестают приниматься,
+    а все его сессии завершаются.
+
+    Коды ответов:
+    - 204: Все сессии завершены.
+    - 401: Пользователь не авторизован.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_schema(lambda openapi: dict(
+        request_body=empty_body(),
+        responses={204: 'No Content'},
+        manual_parameters=[
+            auth_header(openapi),
+        ],
+    ))
+    def post(self, request, *args, **kwargs):
+        log_out_everywhere([request.user.pk])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SessionRevokeView(generics.GenericAPIView):
+    """
+    Массовый выход пользователей на всех устройствах (только is_staff).
+
+    Принимает до SESSION_REVOKE_MAX_USERS id и email. Токены и сессии всех
+    найденных пользователей перестают действовать сразу, за одну операцию.
+
+    Пример запроса:
+    ```
+    POST /api/users/sessions/revoke/
+    {
+        "ids": [1, 2, 3],
+        "emails": ["user@example.com"]
+    }
+    ```
+
+    Пример ответа:
+    ```
+    {
+        "users": 4
+    }
+    ```
+
+    Коды ответов:
+    - 200: Сколько пользователей разлогинено (неизвестные id и email пропускаются).
+    - 400: Ошибка валидации (пустой запрос или слишком много ключей).
+    - 401: Пользователь не авторизован.
+    - 403: Пользователь не сотрудник.
+    """
+    serializer_class = SessionRevokeSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        return Response({'users': log_out_everywhere(params['ids'], params['emails'])})